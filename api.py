@@ -0,0 +1,320 @@
+# api.py
+
+"""HTTP API for Metamorphosis Studio.
+Exposes the diagram, document, translation and summarization features to
+machine clients without going through the Streamlit UI.  The endpoints reuse
+the same prompt builders (`services.prompts`), `GeminiClient` and diagram
+helpers as the tabs.
+
+Run with:
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+
+Authentication: pass the Gemini key in the `X-Gemini-Api-Key` header, or set
+`GEMINI_API_KEY` (single key) or `GEMINI_API_KEYS` (key pool) in the server
+environment.
+Tuning: `API_MAX_CONCURRENCY` (default 16) bounds in-flight upstream calls per
+worker and `API_QUEUE_TIMEOUT` (seconds, default 10) bounds how long a request
+may wait for a slot before getting a 503.
+"""
+
+import asyncio
+import base64
+import os
+import time
+import uuid
+from typing import List, Optional
+
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from services import diagram_scale, errors, long_document, prompts
+from services.gemini_client import GeminiClient
+from services.key_pool import get_key_pool
+from services.model_router import get_router
+from services.hedging import get_hedger
+from services.context_cache import get_context_cache
+from services.llm_backend import get_llm_backend
+from services.image_pipeline import get_image_pipeline
+from services.prompt_cache import get_prompt_cache
+from services.single_flight import get_single_flight
+from services import scheduler
+from services.translation_memory import CHUNK_CHARS, get_translation_memory, translate_with_memory
+from services.metrics import MetricsRegistry
+from ui import helpers
+
+MAX_CONCURRENCY = int(os.environ.get("API_MAX_CONCURRENCY", "16"))
+QUEUE_TIMEOUT = float(os.environ.get("API_QUEUE_TIMEOUT", "10"))
+
+app = FastAPI(title="Metamorphosis Studio API", version="1.0")
+metrics = MetricsRegistry()
+_slots = asyncio.Semaphore(MAX_CONCURRENCY)
+_in_flight = 0
+
+
+# ---------------------------------------------------------------------------
+# Request models
+# ---------------------------------------------------------------------------
+
+class DiagramRequest(BaseModel):
+    description: str
+    diagram_type: str = "Flowchart"
+    ref_date: Optional[str] = None
+    theme: str = "default"
+    render: bool = False
+    format: str = Field("png", pattern="^(png|svg)$")
+    page: int = Field(0, ge=0, description="Page to render when a large diagram is split")
+
+
+class DocumentRequest(BaseModel):
+    details: str
+    doc_type: str = "BRD"
+    style: str = "Professional"
+    language: str = "English"
+    include_toc: bool = True
+    author: Optional[str] = None
+    version: Optional[str] = None
+    context: Optional[str] = None
+    stream: bool = False
+    long_form: bool = False
+
+
+class TranslateRequest(BaseModel):
+    text: str
+    direction: str = "English → Bangla"
+    formality: str = "Neutral"
+    preserve_format: bool = True
+    stream: bool = False
+
+
+class SummarizeRequest(BaseModel):
+    text: str
+    compression: int = Field(50, ge=10, le=90)
+    format: str = "Paragraph"
+    stream: bool = False
+
+
+class DiagramResponse(BaseModel):
+    code: str
+    errors: List[str]
+    llm_fixed: bool
+    image_base64: Optional[str] = None
+    complexity: dict = {}
+    pages: Optional[List[str]] = None  # Page sources when the diagram was split for rendering
+
+
+class TextResponse(BaseModel):
+    content: str
+
+
+# ---------------------------------------------------------------------------
+# Middleware & plumbing
+# ---------------------------------------------------------------------------
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """
+    Attach a request ID and record per-endpoint latency.  Latency is recorded
+    once the body has been sent, so streamed responses count their full
+    duration rather than the time to the first byte.
+    """
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    request.state.request_id = request_id
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    name = f"{request.method} {route.path if route else request.url.path}"
+    body = response.body_iterator
+
+    async def timed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            metrics.record(name, (time.perf_counter() - started) * 1000, ok=response.status_code < 500)
+
+    response.body_iterator = timed_body()
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+async def _acquire_slot():
+    """Wait for a concurrency slot, failing fast with 503 when the server is saturated."""
+    global _in_flight
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout=QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Server busy, retry later.", headers={"Retry-After": "1"})
+    _in_flight += 1
+
+
+def _release_slot():
+    global _in_flight
+    _in_flight -= 1
+    _slots.release()
+
+
+def _client(api_key):
+    key = api_key or os.environ.get("GEMINI_API_KEY")
+    if not key and get_key_pool() is None:
+        raise HTTPException(status_code=401, detail="Missing Gemini API key (X-Gemini-Api-Key header).")
+    return GeminiClient(user_api_key=key)
+
+
+def _raise_for_error(text):
+    """Map an error result (see `services.errors`) to an HTTP error; content passes through."""
+    if not GeminiClient.is_error_response(text):
+        return
+    if text.kind == errors.BUSY:
+        # Not admitted by the upstream scheduler (see `services.scheduler`)
+        raise HTTPException(status_code=503, detail=text, headers={"Retry-After": "5"})
+    raise HTTPException(status_code=429 if text.kind == errors.QUOTA else 502, detail=text)
+
+
+async def _generate(client, prompt, route=None, cached_prefix=None):
+    """Run a blocking generation in a worker thread under the concurrency limit."""
+    await _acquire_slot()
+    try:
+        res = await asyncio.to_thread(client.generate_content, prompt, route=route, cached_prefix=cached_prefix)
+    finally:
+        _release_slot()
+    _raise_for_error(res)
+    return res
+
+
+async def _stream(client, prompt, route=None, cached_prefix=None):
+    """
+    Stream chunks from a blocking generator without blocking the event loop.
+    The concurrency slot is taken inside the body, so a response that is never
+    iterated (e.g. the client went away first) cannot leak it; once streaming
+    has started, "busy" can only be reported in the body.
+    """
+    async def body():
+        try:
+            await _acquire_slot()
+        except HTTPException as e:
+            yield e.detail
+            return
+        chunks = client.generate_content_stream(prompt, route=route, cached_prefix=cached_prefix)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            _release_slot()
+
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Per-endpoint latency percentiles plus the current concurrency usage."""
+    return {
+        "endpoints": metrics.snapshot(),
+        "concurrency": {"limit": MAX_CONCURRENCY, "in_flight": _in_flight},
+        "models": get_router().stats(),
+        "hedging": get_hedger().stats(),
+        "translation_memory": get_translation_memory().stats(),
+        "context_cache": get_context_cache().stats() if get_context_cache() else None,
+        "llm_backend": get_llm_backend().stats(),
+        "image_pipeline": get_image_pipeline().stats(),
+        "prompt_cache": get_prompt_cache().stats() if get_prompt_cache() else None,
+        "single_flight": get_single_flight().stats() if get_single_flight() else None,
+        "scheduler": scheduler.all_stats(),
+    }
+
+
+@app.post("/v1/diagram", response_model=DiagramResponse)
+async def diagram(req: DiagramRequest, x_gemini_api_key: Optional[str] = Header(None)):
+    client = _client(x_gemini_api_key)
+    rules, prompt = prompts.build_diagram_prompt_parts(req.description, req.diagram_type, req.ref_date)
+    res = await _generate(client, prompt, "diagram", cached_prefix=rules)
+
+    await _acquire_slot()
+    try:
+        result = await asyncio.to_thread(helpers.repair_mermaid_code, client, res)
+        complexity = diagram_scale.analyze_diagram(result["code"])
+        pages = diagram_scale.split_diagram(result["code"]) if diagram_scale.is_oversized(complexity) else []
+        image = None
+        if req.render:
+            code = pages[min(req.page, len(pages) - 1)]["code"] if pages else result["code"]
+            image = await asyncio.to_thread(helpers.get_mermaid_img, code, req.format, req.theme)
+    finally:
+        _release_slot()
+    return DiagramResponse(
+        code=result["code"],
+        errors=result["errors"],
+        llm_fixed=result["llm_fixed"],
+        image_base64=base64.b64encode(image).decode("ascii") if image else None,
+        complexity=complexity,
+        pages=[page["code"] for page in pages] if len(pages) > 1 else None,
+    )
+
+
+@app.post("/v1/document", response_model=TextResponse)
+async def document(req: DocumentRequest, x_gemini_api_key: Optional[str] = Header(None)):
+    client = _client(x_gemini_api_key)
+    include_meta = bool(req.author or req.version)
+    if req.long_form:
+        # Outline first, then the sections concurrently (not streamed)
+        await _acquire_slot()
+        try:
+            result = await asyncio.to_thread(
+                long_document.generate_long_document, client, req.details, req.doc_type, req.style, req.language,
+                req.include_toc, include_meta, req.author or "", req.version or "1.0", req.context,
+            )
+        finally:
+            _release_slot()
+        if isinstance(result, str):
+            _raise_for_error(result)
+        elif len(result["errors"]) == len(result["outline"]):
+            # Nothing was written; report why instead of an empty skeleton
+            _raise_for_error(next(iter(result["errors"].values()))[1])
+        return TextResponse(content=result["content"])
+    context_prefix, prompt = prompts.build_document_prompt_parts(
+        req.details, req.doc_type, req.style, req.language, req.include_toc,
+        include_meta, req.author or "", req.version or "1.0", req.context,
+    )
+    if req.stream:
+        return await _stream(client, prompt, "document", cached_prefix=context_prefix)
+    return TextResponse(content=await _generate(client, prompt, "document", cached_prefix=context_prefix))
+
+
+@app.post("/v1/translate", response_model=TextResponse)
+async def translate(req: TranslateRequest, x_gemini_api_key: Optional[str] = Header(None)):
+    client = _client(x_gemini_api_key)
+    if req.stream:
+        prompt = prompts.build_translation_prompt(req.text, req.direction, req.formality, req.preserve_format)
+        return await _stream(client, prompt, "translate")
+
+    # Non-streaming translations go through the segment translation memory, in concurrent chunks
+    await _acquire_slot()
+    try:
+        result = await asyncio.to_thread(
+            translate_with_memory, client, req.text, req.direction, req.formality, req.preserve_format,
+            chunk_chars=CHUNK_CHARS,
+        )
+    finally:
+        _release_slot()
+    _raise_for_error(result["text"])
+    return TextResponse(content=result["text"])
+
+
+@app.post("/v1/summarize", response_model=TextResponse)
+async def summarize(req: SummarizeRequest, x_gemini_api_key: Optional[str] = Header(None)):
+    client = _client(x_gemini_api_key)
+    prompt = prompts.build_summary_prompt(req.text, req.compression, req.format)
+    if req.stream:
+        return await _stream(client, prompt, "summarize")
+    return TextResponse(content=await _generate(client, prompt, "summarize"))
@@ -9,7 +9,6 @@ from fpdf import FPDF
 from docx import Document
 import io
 from PIL import Image
-from datetime import datetime
 import ui.tabs as ui
 
 # --- PAGE CONFIGURATION ---
@@ -20,11 +19,7 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize session state for history and favorites
-if 'history' not in st.session_state:
-    st.session_state.history = {}
-if 'favorites' not in st.session_state:
-    st.session_state.favorites = []
+# Initialize session state (history and favorites are persisted by services.store)
 if 'user_prefs' not in st.session_state:
     st.session_state.user_prefs = {
         'theme': 'gradient',
@@ -89,29 +84,6 @@ if 'CODE_FRAMEWORKS' not in st.session_state:
 
 # --- HELPER FUNCTIONS ---
 
-def add_to_history(feature, content, title="Untitled"):
-    """Add item to history"""
-    if feature not in st.session_state.history:
-        st.session_state.history[feature] = []
-    
-    st.session_state.history[feature].insert(0, {
-        'title': title,
-        'content': content,
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M")
-    })
-    
-    # Keep only last 10 items
-    st.session_state.history[feature] = st.session_state.history[feature][:10]
-
-def save_to_favorites(content, feature, title):
-    """Save item to favorites"""
-    st.session_state.favorites.append({
-        'feature': feature,
-        'title': title,
-        'content': content,
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M")
-    })
-
 def get_mermaid_img(code, format="png"):
     state = {
         "code": code,
@@ -378,6 +350,7 @@ st.markdown("---")
 
 # Render the application tabs
 ui.render_tabs()
+ui.render_history_panel()
 
 # --- FOOTER ---
 st.markdown("---")
@@ -0,0 +1,5 @@
+# benchmarks/__init__.py
+
+"""Micro-benchmarks for the per-rerun helpers in `ui/helpers.py`.
+Run with `python -m benchmarks.bench_helpers`; see the Readme for options.
+"""
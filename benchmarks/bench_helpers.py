@@ -0,0 +1,213 @@
+# benchmarks/bench_helpers.py
+
+"""Benchmark the Mermaid and export helpers over synthetic corpora.
+
+    python -m benchmarks.bench_helpers                       # full run
+    python -m benchmarks.bench_helpers --quick               # skip the largest inputs
+    python -m benchmarks.bench_helpers --baseline old.json   # exit 1 on regressions
+    python -m benchmarks.bench_helpers --filter fix_mermaid
+
+Each case is timed until `--min-time` seconds have been spent (at least
+`--min-repeat` and at most `--max-repeat` runs); min, median and p95 are
+written to `--out` as JSON.  Within a size ladder, larger sizes are skipped
+once a run exceeds `--case-budget` seconds, so a pathological regex cannot
+stall the suite.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks import corpora
+from services import image_pipeline
+from ui import helpers
+
+DEFAULT_OUT = os.path.join("benchmarks", "results", "latest.json")
+QUICK_MAX_DIAGRAM_LINES = 1000
+QUICK_MAX_DOCUMENT_BYTES = 64 * 1024
+QUICK_MAX_IMAGE_SIDE = 1024
+
+
+class Case:
+    """One benchmark: `func(*args)` timed under `name`, part of the size ladder `group`."""
+
+    def __init__(self, name, group, size, func, *args):
+        self.name = name
+        self.group = group
+        self.size = size
+        self.func = func
+        self.args = args
+
+
+def build_cases(quick=False):
+    """Benchmark cases in ascending size within each group, so budgets can cut a ladder short."""
+    diagram_lines = [n for n in corpora.DIAGRAM_LINES if not quick or n <= QUICK_MAX_DIAGRAM_LINES]
+    document_sizes = [n for n in corpora.DOCUMENT_BYTES if not quick or n <= QUICK_MAX_DOCUMENT_BYTES]
+    image_sides = [n for n in corpora.IMAGE_SIDES if not quick or n <= QUICK_MAX_IMAGE_SIDE]
+
+    cases = []
+    for kind, generate in corpora.DIAGRAMS.items():
+        for lines in diagram_lines:
+            code = generate(lines)
+            cases += [
+                Case(f"fix_mermaid_syntax/{kind}/{lines}", f"fix/{kind}", lines, helpers.fix_mermaid_syntax, code),
+                Case(f"validate_mermaid_syntax/{kind}/{lines}", f"validate/{kind}", lines,
+                     helpers.validate_mermaid_syntax, code),
+                Case(f"sanitize_mermaid_code/{kind}/{lines}", f"sanitize/{kind}", lines,
+                     helpers.sanitize_mermaid_code, corpora.llm_response(code)),
+            ]
+    for size in document_sizes:
+        text = corpora.document(size)
+        cases += [
+            Case(f"create_pdf/{size}", "pdf", size, helpers.create_pdf, text),
+            Case(f"create_docx/{size}", "docx", size, helpers.create_docx, text),
+        ]
+    for side in image_sides:
+        image = corpora.png(side)
+        cases.append(Case(f"convert_to_jpg/{side}", "jpg", side, helpers.convert_to_jpg, image))
+        cases.append(Case(f"thumbnail/{side}", "thumb", side, image_pipeline.derive, image, "thumb"))
+        cases.append(Case(f"create_pdf_image/{side}", "pdf_image", side, helpers.create_pdf, "Diagram", image))
+    for n in corpora.PATHOLOGICAL_SIZES:
+        inputs = corpora.pathological(n)
+        cases += [
+            Case(f"pathological/fix_mermaid_syntax/unbalanced_mindmap/{n}", "patho/fix/mindmap", n,
+                 helpers.fix_mermaid_syntax, inputs["unbalanced_mindmap"]),
+            Case(f"pathological/fix_mermaid_syntax/unbalanced_bracket/{n}", "patho/fix/bracket", n,
+                 helpers.fix_mermaid_syntax, inputs["unbalanced_bracket"]),
+            Case(f"pathological/validate_mermaid_syntax/unbalanced_mindmap/{n}", "patho/validate/mindmap", n,
+                 helpers.validate_mermaid_syntax, inputs["unbalanced_mindmap"]),
+            Case(f"pathological/sanitize_mermaid_code/unclosed_fence/{n}", "patho/sanitize/fence", n,
+                 helpers.sanitize_mermaid_code, inputs["unclosed_fence"]),
+        ]
+    return cases
+
+
+def time_case(case, min_time=0.2, min_repeat=3, max_repeat=200):
+    """Per-run wall times in seconds."""
+    times = []
+    started = time.perf_counter()
+    while len(times) < max_repeat:
+        t0 = time.perf_counter()
+        case.func(*case.args)
+        times.append(time.perf_counter() - t0)
+        if len(times) >= min_repeat and time.perf_counter() - started >= min_time:
+            break
+    return times
+
+
+def summarize(times):
+    ordered = sorted(times)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "runs": len(times),
+        "min_ms": round(ordered[0] * 1000, 4),
+        "median_ms": round(statistics.median(ordered) * 1000, 4),
+        "p95_ms": round(p95 * 1000, 4),
+    }
+
+
+def run(cases, min_time=0.2, min_repeat=3, max_repeat=200, case_budget=5.0, log=print):
+    """{case name: summary}; cases in a group after one that blew `case_budget` are marked skipped."""
+    results, blown = {}, set()
+    for case in cases:
+        if case.group in blown:
+            results[case.name] = {"skipped": "a smaller size exceeded the case budget"}
+            log(f"{case.name:<70} skipped")
+            continue
+        case.func(*case.args)  # Warm-up: imports, regex compilation, font loading
+        times = time_case(case, min_time, min_repeat, max_repeat)
+        summary = summarize(times)
+        summary["size"] = case.size
+        results[case.name] = summary
+        if max(times) > case_budget:
+            blown.add(case.group)
+        log(f"{case.name:<70} median {summary['median_ms']:>10.3f} ms   p95 {summary['p95_ms']:>10.3f} ms")
+    return results
+
+
+def compare(results, baseline, max_regression=0.25, noise_floor_ms=0.05):
+    """
+    Cases whose median got slower than the baseline by more than
+    `max_regression` (a fraction) and by more than `noise_floor_ms`.
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or "median_ms" not in before or "median_ms" not in current:
+            continue
+        old, new = before["median_ms"], current["median_ms"]
+        if new - old > noise_floor_ms and new > old * (1 + max_regression):
+            regressions.append({"case": name, "baseline_ms": old, "current_ms": new,
+                                "change": round(new / old - 1, 3) if old else None})
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Mermaid and export helpers.")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=float(os.environ.get("BENCH_MAX_REGRESSION", "0.25")),
+                        help="Allowed slowdown of a case's median as a fraction (default 0.25)")
+    parser.add_argument("--noise-floor-ms", type=float, default=0.05,
+                        help="Ignore slowdowns smaller than this many milliseconds")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds to spend timing each case")
+    parser.add_argument("--min-repeat", type=int, default=3)
+    parser.add_argument("--max-repeat", type=int, default=200)
+    parser.add_argument("--case-budget", type=float, default=5.0,
+                        help="Skip larger sizes of a case once one run takes longer than this (seconds)")
+    parser.add_argument("--quick", action="store_true", help="Skip the largest diagrams, documents and images")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    args = parser.parse_args(argv)
+
+    cases = build_cases(args.quick)
+    if args.filter:
+        cases = [c for c in cases if args.filter in c.name]
+    results = run(cases, args.min_time, args.min_repeat, args.max_repeat, args.case_budget)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "git_revision": _git_revision(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get("results", {}), args.max_regression, args.noise_floor_ms)
+        report["baseline"] = {"path": args.baseline, "meta": baseline.get("meta"),
+                              "max_regression": args.max_regression, "regressions": regressions}
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.out}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) over {args.max_regression:.0%}:")
+        for r in regressions:
+            print(f"  {r['case']}: {r['baseline_ms']} ms -> {r['current_ms']} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
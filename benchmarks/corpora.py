@@ -0,0 +1,132 @@
+# benchmarks/corpora.py
+
+"""Synthetic, deterministic inputs for the helper benchmarks.
+Every generator takes a size and returns the same output for the same size,
+so results from different runs and machines are comparable.
+"""
+
+import io
+import random
+
+from PIL import Image
+
+DIAGRAM_LINES = (10, 100, 1000, 10000)
+DOCUMENT_BYTES = (1024, 64 * 1024, 1024 * 1024, 5 * 1024 * 1024)
+IMAGE_SIDES = (256, 1024, 2048)
+PATHOLOGICAL_SIZES = (50, 100, 200)
+
+_WORDS = (
+    "metamorphosis diagram service request response cache session render export document "
+    "translation quiz analysis project pipeline gateway database user admin report module"
+).split()
+
+
+def _rng(size):
+    return random.Random(f"metamorphosis-bench-{size}")
+
+
+def _label(rng, words=3):
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def flowchart(lines):
+    """`flowchart TD` with `lines` edges, including the labels `fix_mermaid_syntax` rewrites."""
+    rng = _rng(lines)
+    out = ["flowchart TD"]
+    for i in range(1, lines):
+        kind = i % 5
+        if kind == 0:
+            # Parentheses inside square brackets get quoted by the fixer
+            out.append(f"    N{i}[{_label(rng)} (v{i})] --> N{i + 1}")
+        elif kind == 1:
+            out.append(f"    N{i}{{{_label(rng, 2)}?}} -->|{_label(rng, 1)}| N{i + 1}")
+        elif kind == 2:
+            out.append(f"    N{i}(({_label(rng, 2)})) --> N{i + 1}")
+        elif kind == 3:
+            out.append(f'    N{i}["{_label(rng)}"] -.-> N{i + 1}')
+        else:
+            out.append(f"    N{i}({_label(rng)}, step {i}) --> N{i + 1}")
+    return "\n".join(out)
+
+
+def sequence(lines):
+    rng = _rng(lines)
+    actors = ["User", "App", "API", "DB"]
+    out = ["sequenceDiagram"] + [f"    participant {a}" for a in actors]
+    while len(out) < lines:
+        a, b = rng.sample(actors, 2)
+        out.append(f"    {a}->>{b}: {_label(rng)} ({len(out)})")
+    return "\n".join(out[:lines])
+
+
+def mindmap(lines):
+    rng = _rng(lines)
+    out = ["mindmap", "  root((Metamorphosis))"]
+    while len(out) < lines:
+        depth = 2 + len(out) % 4
+        out.append("  " * depth + f"{_label(rng, 2)} (item {len(out)})")
+    return "\n".join(out[:lines])
+
+
+def gantt(lines):
+    rng = _rng(lines)
+    out = ["gantt", "    title Release plan", "    dateFormat YYYY-MM-DD"]
+    while len(out) < lines:
+        n = len(out)
+        if n % 10 == 3:
+            out.append(f"    section Phase {n // 10}")
+        else:
+            out.append(f"    {_label(rng, 2)} :t{n}, 2024-01-{1 + n % 28:02d}, {1 + n % 9}d")
+    return "\n".join(out[:lines])
+
+
+DIAGRAMS = {"flowchart": flowchart, "sequence": sequence, "mindmap": mindmap, "gantt": gantt}
+
+
+def llm_response(code):
+    """`code` wrapped the way the model answers, for `sanitize_mermaid_code`."""
+    return f"Here is the diagram you asked for:\n\n```mermaid\n{code}\n```\n\nLet me know if you need changes."
+
+
+def document(size):
+    """Markdown-ish text of about `size` bytes: headings, paragraphs and bullet lists."""
+    rng = _rng(size)
+    parts, total, section = [], 0, 0
+    while total < size:
+        if total == 0 or rng.random() < 0.1:
+            section += 1
+            block = f"## Section {section}: {_label(rng).title()}\n"
+        elif rng.random() < 0.3:
+            block = "\n".join(f"- {_label(rng, 6)}" for _ in range(rng.randint(2, 5))) + "\n"
+        else:
+            sentences = (_label(rng, rng.randint(6, 16)).capitalize() + "." for _ in range(rng.randint(3, 7)))
+            block = " ".join(sentences) + "\n"
+        parts.append(block + "\n")
+        total += len(block) + 1
+    return "".join(parts)[:size]
+
+
+def png(side):
+    """PNG bytes of a `side` x `side` RGBA image with some structure, like a rendered diagram."""
+    image = Image.new("RGBA", (side, side), (255, 255, 255, 0))
+    pixels = image.load()
+    step = max(1, side // 32)
+    for y in range(0, side, step):
+        for x in range(side):
+            pixels[x, y] = (40, 90, 160, 255)
+            pixels[y, x] = (200, 80, 40, 255)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def pathological(n):
+    """
+    Inputs that make the helper regexes backtrack: long runs of unbalanced
+    parentheses and commas inside node labels.
+    """
+    return {
+        "unbalanced_mindmap": "mindmap\n  root((" + "(a," * n + "\n",
+        "unbalanced_bracket": "flowchart TD\n  A[" + "(x" * n + "\n",
+        "unclosed_fence": "```mermaid\n" + "A --> B\n" * n,
+    }
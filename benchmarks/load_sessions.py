@@ -0,0 +1,317 @@
+# benchmarks/load_sessions.py
+
+"""Concurrent-session load test for the Streamlit app.
+
+    python -m benchmarks.load_sessions --levels 1,4,8,16 --iterations 3
+
+Each simulated user is an `AppTest` session running in its own thread and
+repeating a fixed scenario: an idle rerun (slider change), a summary, a
+translation and a diagram generation that is polled until its background job
+finishes.  Gemini runs on the mock LLM backend (`services/llm_backend.py`)
+and the Kroki renderer is replaced by a local fake, both with configurable
+latency, so nothing leaves the machine.
+
+For every concurrency level the report gives rerun latency percentiles
+(overall and per step), throughput, peak RSS and peak thread count.  Results
+go to `benchmarks/results/load.json` unless `--out` is given.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from benchmarks import corpora
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+DEFAULT_OUT = os.path.join("benchmarks", "results", "load.json")
+
+SUMMARY_TEXT = corpora.document(4 * 1024)
+TRANSLATION_TEXT = corpora.document(2 * 1024)
+DIAGRAM_DESCRIPTION = "User signs in, the gateway checks the session, the service loads the report from the database."
+
+
+def _rss_bytes():
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ResourceSampler:
+    """Background thread tracking peak RSS and thread count while a level runs."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="load-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, _rss_bytes())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def share_apptest_runtime():
+    """
+    Let `AppTest` sessions run concurrently.  Each `AppTest.run()` installs its
+    own mock `Runtime` singleton and `global.appTest` config patch and removes
+    them when it returns, which breaks any run still in flight on another
+    thread, and compiles the script afresh (concurrent `ast.parse` calls are
+    not safe on every Python).  Install all three once for the whole process,
+    as a real server does.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+    from streamlit.testing.v1.util import build_mock_config_get_option
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    config.get_option = build_mock_config_get_option({"global.appTest": True})
+
+    class _RuntimeSlot:
+        """Stands in for `Runtime` inside `app_test`: per-run installs and resets are ignored."""
+
+        def __setattr__(self, name, value):
+            pass
+
+    app_test.Runtime = _RuntimeSlot()
+    app_test.patch_config_options = lambda options: contextlib.nullcontext()
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+
+def install_fake_renderer(latency_ms):
+    """Replace the Kroki call with a local fake that sleeps and returns a fixed image."""
+    from benchmarks.corpora import png
+    from services.llm_backend import parse_latency
+    from ui import helpers
+
+    low, high = parse_latency(latency_ms)
+    image = png(512)
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg" width="512" height="512"><rect width="512" height="512"/></svg>'
+    rng = random.Random(0)
+    rng_lock = threading.Lock()
+
+    def fake_kroki_img(code, format="png", timeout=None):
+        with rng_lock:
+            delay = rng.uniform(low, high)
+        time.sleep(delay / 1000)
+        return svg if format == "svg" else image
+
+    helpers.get_kroki_img = fake_kroki_img
+
+
+class Session:
+    """One simulated user; every `AppTest.run()` is timed and tagged with the scenario step."""
+
+    def __init__(self, index, timeout, poll_interval, job_timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.samples = []  # (step, seconds)
+        self.jobs = []  # seconds from submit to result, per background job
+        self.errors = []
+        self.actions = 0
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.at.session_state["api_key"] = f"load-test-{index}"
+
+    def _run(self, step, widget=None):
+        started = time.perf_counter()
+        (widget.run() if widget is not None else self.at.run())
+        self.samples.append((step, time.perf_counter() - started))
+        for exception in self.at.exception:
+            self.errors.append(f"{step}: {exception.value}")
+
+    def _button(self, label):
+        return next(b for b in self.at.button if b.label == label)
+
+    def scenario(self, iteration):
+        at = self.at
+        at.slider(key="sum_compression").set_value(30 + 10 * (iteration % 5))
+        self._run("idle")
+
+        at.text_area(key="sum_text").input(f"{SUMMARY_TEXT}\n(session {self.index}, pass {iteration})")
+        self._run("summarize", self._button("🔍 Summarize").click())
+
+        at.text_area(key="trans_text").input(f"{TRANSLATION_TEXT}\n(session {self.index}, pass {iteration})")
+        self._run("translate", self._button("🚀 Translate").click())
+
+        at.text_area(key="diagram_code").input(f"{DIAGRAM_DESCRIPTION} (session {self.index}, pass {iteration})")
+        submitted = time.perf_counter()
+        self._run("diagram_submit", self._button("🎨 Generate").click())
+        while "diagram_job" in at.session_state:
+            if time.perf_counter() - submitted > self.job_timeout:
+                self.errors.append("diagram: job did not finish in time")
+                break
+            time.sleep(self.poll_interval)
+            self._run("diagram_poll")
+        self.jobs.append(time.perf_counter() - submitted)
+        self.actions += 4
+
+    def run(self, iterations):
+        try:
+            self._run("load")
+            for iteration in range(iterations):
+                self.scenario(iteration)
+        except Exception as e:
+            self.errors.append(f"session {self.index}: {type(e).__name__}: {e}")
+
+
+def _latency_summary(seconds):
+    from services.metrics import percentile
+
+    ms = [s * 1000 for s in seconds]
+    return {
+        "count": len(ms),
+        "p50_ms": round(percentile(ms, 50), 1),
+        "p90_ms": round(percentile(ms, 90), 1),
+        "p95_ms": round(percentile(ms, 95), 1),
+        "p99_ms": round(percentile(ms, 99), 1),
+        "max_ms": round(max(ms), 1) if ms else 0.0,
+    }
+
+
+def run_level(users, iterations, timeout=120, poll_interval=0.25, job_timeout=120):
+    """Run `users` concurrent sessions and summarize them."""
+    sessions = [Session(i, timeout, poll_interval, job_timeout) for i in range(users)]
+    threads = [threading.Thread(target=s.run, args=(iterations,), name=f"load-session-{s.index}") for s in sessions]
+    with ResourceSampler() as sampler:
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+    samples = [sample for s in sessions for sample in s.samples]
+    steps = {}
+    for step, seconds in samples:
+        steps.setdefault(step, []).append(seconds)
+    errors = [e for s in sessions for e in s.errors]
+    actions = sum(s.actions for s in sessions)
+    return {
+        "users": users,
+        "wall_s": round(wall, 2),
+        "reruns": len(samples),
+        "actions": actions,
+        "reruns_per_s": round(len(samples) / wall, 2),
+        "actions_per_s": round(actions / wall, 2),
+        "rerun_latency": _latency_summary([seconds for _, seconds in samples]),
+        "steps": {step: _latency_summary(values) for step, values in sorted(steps.items())},
+        "diagram_job": _latency_summary([j for s in sessions for j in s.jobs]),
+        "peak_rss_mb": round(sampler.peak_rss / 2**20, 1),
+        "peak_threads": sampler.peak_threads,
+        "errors": len(errors),
+        "error_samples": errors[:10],
+    }
+
+
+def _print_level(result):
+    latency = result["rerun_latency"]
+    print(
+        f"{result['users']:>5} users  {result['reruns']:>5} reruns in {result['wall_s']:>7.2f}s  "
+        f"{result['reruns_per_s']:>6.2f} reruns/s  {result['actions_per_s']:>6.2f} actions/s  "
+        f"p50 {latency['p50_ms']:>7.1f}  p95 {latency['p95_ms']:>7.1f}  p99 {latency['p99_ms']:>7.1f} ms  "
+        f"RSS {result['peak_rss_mb']:>7.1f} MB  threads {result['peak_threads']:>4}  errors {result['errors']}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test app.py with concurrent simulated sessions.")
+    parser.add_argument("--levels", default="1,4,8,16", help="Comma-separated numbers of concurrent sessions")
+    parser.add_argument("--iterations", type=int, default=3, help="Scenario passes per session")
+    parser.add_argument("--llm-latency-ms", default="300-1200", help="Mock Gemini latency, `800` or `200-1500`")
+    parser.add_argument("--llm-errors", default="", help="Mock error injection, e.g. `429:0.05`")
+    parser.add_argument("--render-latency-ms", default="200-800", help="Fake renderer latency")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="Seconds between reruns while a job runs")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-rerun AppTest timeout in seconds")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="Where to write the JSON report")
+    parser.add_argument("--data-dir", help="History and blob storage (default: a fresh temporary directory)")
+    args = parser.parse_args(argv)
+    levels = [int(n) for n in args.levels.split(",") if n.strip()]
+
+    # The services read their configuration at import time, so set it up first
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="metamorphosis-load-")
+    os.environ["METAMORPHOSIS_LLM_BACKEND"] = "mock"
+    os.environ["MOCK_LLM_LATENCY_MS"] = args.llm_latency_ms
+    os.environ["MOCK_LLM_ERRORS"] = args.llm_errors
+    os.environ.setdefault("MOCK_LLM_SEED", "0")
+    os.environ["METAMORPHOSIS_DB"] = os.path.join(data_dir, "metamorphosis.db")
+    os.environ["METAMORPHOSIS_BLOBS"] = os.path.join(data_dir, "blobs")
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    share_apptest_runtime()
+    install_fake_renderer(args.render_latency_ms)
+
+    # One warm-up session so imports and first-run caches don't count against level 1
+    warmup = Session(-1, args.timeout, args.poll_interval, args.timeout)
+    warmup.run(1)
+    if warmup.errors:
+        print(f"❌ Warm-up session failed: {warmup.errors[0]}")
+        return 1
+
+    results = []
+    for users in levels:
+        result = run_level(users, args.iterations, args.timeout, args.poll_interval, args.timeout)
+        _print_level(result)
+        results.append(result)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "iterations": args.iterations,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_errors": args.llm_errors,
+            "render_latency_ms": args.render_latency_ms,
+            "data_dir": data_dir,
+        },
+        "levels": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} levels to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
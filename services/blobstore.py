@@ -0,0 +1,241 @@
+# services/blobstore.py
+
+"""Content-addressed blob store for large artifacts.
+Generated documents, rendered images and export bytes are written once to
+local disk (zlib-compressed when it helps), addressed by their SHA-256.
+Session state only keeps the hash.  Small alias files map derived keys
+(e.g. "render:<code hash>") to blob hashes so expensive work survives reruns.
+
+`SessionCache` keeps a bounded, per-session in-memory LRU of recently used
+blobs in front of the disk store and drops the caches of idle sessions, so
+memory stays flat as the number of sessions grows.
+
+On disk, blobs and aliases not written or reused for `BLOB_MAX_AGE_SECONDS`
+(default 7 days) are deleted by a background sweep that runs at startup and
+then every `BLOB_PRUNE_INTERVAL` seconds (default 3600; 0 disables it).
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+BLOB_ROOT = os.environ.get("METAMORPHOSIS_BLOBS", os.path.join("data", "blobs"))
+SESSION_CACHE_BYTES = int(os.environ.get("SESSION_CACHE_BYTES", str(8 * 1024 * 1024)))
+SESSION_IDLE_SECONDS = int(os.environ.get("SESSION_IDLE_SECONDS", "900"))
+BLOB_MAX_AGE_SECONDS = int(os.environ.get("BLOB_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+BLOB_PRUNE_INTERVAL = int(os.environ.get("BLOB_PRUNE_INTERVAL", "3600"))
+
+_RAW = b"R"
+_ZLIB = b"Z"
+
+
+def blob_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    def __init__(self, root=BLOB_ROOT, compress_level=6):
+        self.root = root
+        self.compress_level = compress_level
+        os.makedirs(os.path.join(root, "aliases"), exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def _alias_path(self, name):
+        return os.path.join(self.root, "aliases", hashlib.sha256(name.encode("utf-8")).hexdigest())
+
+    def put(self, data):
+        """Store bytes (or text, encoded as UTF-8) and return their hash."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        digest = blob_hash(data)
+        path = self._path(digest)
+        if os.path.exists(path):
+            _touch(path)  # Reused content is kept by the prune sweep
+            return digest
+        compressed = zlib.compress(data, self.compress_level)
+        # Already-compressed formats (PNG, JPEG, DOCX) are stored as-is
+        payload = _ZLIB + compressed if len(compressed) < len(data) * 0.9 else _RAW + data
+        _atomic_write(path, payload)
+        return digest
+
+    def get(self, digest):
+        """Return the stored bytes, or None if unknown."""
+        try:
+            with open(self._path(digest), "rb") as f:
+                payload = f.read()
+        except (OSError, TypeError):
+            return None
+        if payload[:1] == _ZLIB:
+            return zlib.decompress(payload[1:])
+        return payload[1:]
+
+    def exists(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def set_alias(self, name, digest):
+        _atomic_write(self._alias_path(name), digest.encode("ascii"))
+
+    def get_alias(self, name):
+        """Blob hash stored under `name`, or None if missing or the blob is gone."""
+        path = self._alias_path(name)
+        try:
+            with open(path, "rb") as f:
+                digest = f.read().decode("ascii")
+        except OSError:
+            return None
+        if not self.exists(digest):
+            return None
+        _touch(path)
+        _touch(self._path(digest))
+        return digest
+
+    def prune(self, max_age_seconds):
+        """Delete blobs and aliases not modified within `max_age_seconds`. Returns the count removed."""
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for dirpath, _dirs, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def start_pruning(self, max_age_seconds=BLOB_MAX_AGE_SECONDS, interval=BLOB_PRUNE_INTERVAL):
+        """Prune now and then every `interval` seconds on a daemon thread (no-op if `interval` is 0)."""
+        if interval <= 0:
+            return None
+
+        def sweep():
+            while True:
+                self.prune(max_age_seconds)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=sweep, name="blob-prune", daemon=True)
+        thread.start()
+        return thread
+
+
+class SessionCache:
+    def __init__(self, store, max_bytes=SESSION_CACHE_BYTES, idle_seconds=SESSION_IDLE_SECONDS):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._sessions = {}  # session_id -> [OrderedDict(digest -> bytes), total_bytes, last_seen]
+        self._lock = threading.Lock()
+
+    def get(self, session_id, digest):
+        """Bytes for `digest`, served from the session's LRU when possible."""
+        with self._lock:
+            entry = self._touch(session_id)
+            data = entry[0].get(digest)
+            if data is not None:
+                entry[0].move_to_end(digest)
+                return data
+        data = self.store.get(digest)
+        if data is not None:
+            self._remember(session_id, digest, data)
+        return data
+
+    def put(self, session_id, data):
+        """Write through to the store and keep a hot copy for the session."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        digest = self.store.put(data)
+        self._remember(session_id, digest, data)
+        return digest
+
+    def _remember(self, session_id, digest, data):
+        if len(data) > self.max_bytes:
+            return  # Too large to cache; always read from disk
+        with self._lock:
+            entry = self._touch(session_id)
+            lru = entry[0]
+            if digest in lru:
+                lru.move_to_end(digest)
+                return
+            lru[digest] = data
+            entry[1] += len(data)
+            while entry[1] > self.max_bytes and lru:
+                _old_digest, old_data = lru.popitem(last=False)
+                entry[1] -= len(old_data)
+
+    def _touch(self, session_id):
+        now = time.time()
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            self._evict_idle(now)
+            entry = self._sessions[session_id] = [OrderedDict(), 0, now]
+        entry[2] = now
+        return entry
+
+    def _evict_idle(self, now):
+        for session_id in [s for s, e in self._sessions.items() if now - e[2] > self.idle_seconds]:
+            del self._sessions[session_id]
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict_idle(time.time())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(e[1] for e in self._sessions.values()),
+                "max_bytes_per_session": self.max_bytes,
+            }
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _atomic_write(path, payload):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+_store = None
+_cache = None
+_lock = threading.Lock()
+
+
+def get_blob_store():
+    """Process-wide blob store."""
+    global _store
+    with _lock:
+        if _store is None:
+            _store = BlobStore()
+            _store.start_pruning()
+        return _store
+
+
+def get_session_cache():
+    """Process-wide per-session cache in front of the blob store."""
+    global _cache
+    store = get_blob_store()
+    with _lock:
+        if _cache is None:
+            _cache = SessionCache(store)
+        return _cache
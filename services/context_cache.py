@@ -0,0 +1,230 @@
+# services/context_cache.py
+
+"""Server-side context caching for stable prompt prefixes.
+Callers pass the stable part of a prompt (the Mermaid rules, an uploaded
+document) as `cached_prefix`.  The registry maps (key, model, prefix hash) to
+a Gemini cached-content handle, refreshes its TTL while it is in use and
+recreates it once it has expired, so repeat requests only send the variable
+suffix.
+
+`GEMINI_CONTEXT_CACHE` selects the backend: `gemini` (default), `local` (an
+in-memory stand-in that exercises the registry offline while prompts are
+sent inline) or `off`.  `GEMINI_CONTEXT_CACHE_TTL` sets the TTL in seconds
+(default 600).  Prefixes below the model's minimum cacheable size are always
+sent inline.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from datetime import timedelta
+
+import google.ai.generativelanguage as glm
+from google.protobuf import field_mask_pb2
+
+from services.llm_backend import MODE as LLM_MODE
+
+BACKEND = os.environ.get("GEMINI_CONTEXT_CACHE", "gemini").lower()
+TTL_SECONDS = int(os.environ.get("GEMINI_CONTEXT_CACHE_TTL", "600"))
+REFRESH_MARGIN_SECONDS = 60  # Extend the TTL when less than this is left
+FAILURE_BACKOFF_SECONDS = 3600  # Don't retry creating a cache that failed (e.g. unsupported tier)
+
+# Minimum cacheable prompt size per model, in tokens
+MIN_TOKENS = {"gemini-2.5-pro": 4096}
+DEFAULT_MIN_TOKENS = 1024
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+class GeminiCacheBackend:
+    """Cached contents on the Gemini API, one cache-service client per key."""
+
+    server_side = True
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _client(self, api_key):
+        with self._lock:
+            if api_key not in self._clients:
+                self._clients[api_key] = glm.CacheServiceClient(client_options={"api_key": api_key})
+            return self._clients[api_key]
+
+    def create(self, api_key, model_name, prefix, ttl):
+        cached = self._client(api_key).create_cached_content(cached_content=glm.CachedContent(
+            model=f"models/{model_name}",
+            system_instruction=glm.Content(parts=[glm.Part(text=prefix)]),
+            ttl=timedelta(seconds=ttl),
+        ))
+        return cached.name
+
+    def refresh(self, api_key, handle, ttl):
+        self._client(api_key).update_cached_content(
+            cached_content=glm.CachedContent(name=handle, ttl=timedelta(seconds=ttl)),
+            update_mask=field_mask_pb2.FieldMask(paths=["ttl"]),
+        )
+
+    def delete(self, api_key, handle):
+        self._client(api_key).delete_cached_content(name=handle)
+
+
+class LocalCacheBackend:
+    """In-memory stand-in with the same lifecycle; the prefix is still sent inline."""
+
+    server_side = False
+
+    def __init__(self):
+        self.contents = {}
+        self._lock = threading.Lock()
+
+    def create(self, api_key, model_name, prefix, ttl):
+        handle = "cachedContents/local-" + hashlib.sha256(f"{model_name}\n{prefix}".encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            self.contents[handle] = (prefix, time.time() + ttl)
+        return handle
+
+    def refresh(self, api_key, handle, ttl):
+        with self._lock:
+            if handle not in self.contents:
+                raise KeyError(handle)
+            prefix, _ = self.contents[handle]
+            self.contents[handle] = (prefix, time.time() + ttl)
+
+    def delete(self, api_key, handle):
+        with self._lock:
+            self.contents.pop(handle, None)
+
+
+class _Entry:
+    __slots__ = ("handle", "expires_at")
+
+    def __init__(self, handle, expires_at):
+        self.handle = handle
+        self.expires_at = expires_at
+
+
+class ContextCache:
+    def __init__(self, backend, ttl=TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self._entries = {}
+        self._pending = set()  # Keys with a create / refresh in progress
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "creates": 0, "refreshes": 0, "failures": 0, "too_small": 0,
+            "prompt_tokens": 0, "cached_tokens": 0,
+        }
+
+    def handle(self, api_key, model_name, prefix):
+        """
+        Cached-content name to send with a request whose prompt starts with
+        `prefix`, or None if the prefix has to be sent inline.
+        """
+        if not api_key or not prefix:
+            return None
+        if estimate_tokens(prefix) < MIN_TOKENS.get(model_name, DEFAULT_MIN_TOKENS):
+            self._count("too_small")
+            return None
+        key = self._key(api_key, model_name, prefix)
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.time()
+            if entry is not None and entry.expires_at > now + REFRESH_MARGIN_SECONDS:
+                if entry.handle is not None:
+                    self._stats["hits"] += 1
+                return self._bind(entry.handle)
+            if key in self._pending:
+                # Another session is creating or refreshing this cache; don't block on its network call
+                if entry is not None and entry.handle is not None and entry.expires_at > now:
+                    self._stats["hits"] += 1
+                    return self._bind(entry.handle)
+                return None
+            self._pending.add(key)
+        # Network calls run outside the lock so other sessions are never held up by them
+        try:
+            handle = self._refresh_or_create(key, api_key, model_name, prefix, entry)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+        return self._bind(handle) if handle is not None else None
+
+    def _refresh_or_create(self, key, api_key, model_name, prefix, entry):
+        """Extend `entry`'s TTL or create a new cache, then publish it.  Returns the handle or None."""
+        now = time.time()
+        if entry is not None and entry.handle is not None and entry.expires_at > now:
+            try:
+                self.backend.refresh(api_key, entry.handle, self.ttl)
+            except Exception:
+                pass  # Gone server-side: create a new one below
+            else:
+                with self._lock:
+                    self._entries[key] = _Entry(entry.handle, now + self.ttl)
+                    self._stats["refreshes"] += 1
+                    self._stats["hits"] += 1
+                return entry.handle
+        try:
+            handle = self.backend.create(api_key, model_name, prefix, self.ttl)
+        except Exception:
+            with self._lock:
+                self._entries[key] = _Entry(None, now + FAILURE_BACKOFF_SECONDS)
+                self._stats["failures"] += 1
+            return None
+        with self._lock:
+            self._entries[key] = _Entry(handle, now + self.ttl)
+            self._stats["creates"] += 1
+        return handle
+
+    def invalidate(self, api_key, model_name, prefix):
+        """Forget a handle the API rejected so the next call recreates it."""
+        with self._lock:
+            self._entries.pop(self._key(api_key, model_name, prefix), None)
+
+    def record_usage(self, usage):
+        """Add a response's `usage_metadata` token counts to the stats."""
+        if usage is None:
+            return
+        with self._lock:
+            self._stats["prompt_tokens"] += getattr(usage, "prompt_token_count", 0) or 0
+            self._stats["cached_tokens"] += getattr(usage, "cached_content_token_count", 0) or 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["backend"] = type(self.backend).__name__
+            stats["entries"] = sum(1 for e in self._entries.values() if e.handle is not None)
+            prompt = stats["prompt_tokens"]
+            stats["cached_token_share"] = round(stats["cached_tokens"] / prompt, 3) if prompt else 0.0
+            return stats
+
+    def _bind(self, handle):
+        # The local stand-in has nothing server-side to reference
+        return handle if self.backend.server_side else None
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _key(api_key, model_name, prefix):
+        digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        return (hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16], model_name, digest)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_context_cache():
+    """Process-wide context cache registry, or None when `GEMINI_CONTEXT_CACHE=off`."""
+    global _cache
+    with _cache_lock:
+        if _cache is None and BACKEND != "off":
+            # Recorded and replayed prompts must be complete, so non-live LLM backends cache locally
+            local = BACKEND == "local" or LLM_MODE != "live"
+            _cache = ContextCache(LocalCacheBackend() if local else GeminiCacheBackend())
+        return _cache
@@ -0,0 +1,278 @@
+# services/diagram_batch.py
+
+"""Batch pipeline for directories of Mermaid sources (.mmd).
+
+Runs the same chain the Diagram Generator uses
+(`sanitize_mermaid_code` -> `fix_mermaid_syntax` -> `validate_mermaid_syntax`
+-> `get_mermaid_img`) over a whole corpus:
+
+* the CPU-bound lint/fix stage runs in a process pool,
+* the network-bound render stage runs in a bounded thread pool,
+* files whose content (and render options) did not change since the last run
+  are skipped using a content-hash manifest stored next to the outputs,
+* outputs a re-rendered diagram no longer produces (its single image after it
+  was split into pages, or the other way round) are deleted,
+* a JSON report with errors, fixes and timings per file is written at the end.
+
+Usage:
+    python -m services.diagram_batch diagrams/ --out rendered/ --format svg
+"""
+
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+MANIFEST_NAME = ".diagram_batch_manifest.json"
+
+
+def content_hash(text, format="png", theme="default"):
+    """Hash of the source plus the options that influence the rendered output."""
+    digest = hashlib.sha256()
+    digest.update(f"{format}:{theme}\n".encode("utf-8"))
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def line_fixes(before, after):
+    """
+    Changed lines between two versions of a source, as {"line", "before",
+    "after"} (1-based line in `before`).  Lines that were added or removed are
+    reported as one entry per block, with an empty side.
+    """
+    old, new = before.split("\n"), after.split("\n")
+    fixes = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == "equal":
+            continue
+        if tag == "replace" and i2 - i1 == j2 - j1:
+            fixes.extend(
+                {"line": i1 + n + 1, "before": old[i1 + n], "after": new[j1 + n]} for n in range(i2 - i1)
+            )
+        else:
+            fixes.append({"line": i1 + 1, "before": "\n".join(old[i1:i2]), "after": "\n".join(new[j1:j2])})
+    return fixes
+
+
+def lint_source(rel_path, text):
+    """Sanitize, auto-fix and validate one Mermaid source (runs in a worker process)."""
+    from services import diagram_scale
+    from ui import helpers
+
+    started = time.perf_counter()
+    code = helpers.sanitize_mermaid_code(text)
+    fixed = helpers.fix_mermaid_syntax(code)
+    errors = helpers.validate_mermaid_syntax(fixed)
+    fixes = line_fixes(code, fixed)
+    return {
+        "file": rel_path,
+        "code": helpers.finalize_mermaid_code(fixed),
+        "errors": errors,
+        "fixes": fixes,
+        "complexity": diagram_scale.analyze_diagram(fixed),
+        "lint_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def render_source(code, out_path, format="png", theme="default"):
+    """
+    Render one diagram and write it to `out_path`.  Oversized diagrams are
+    split and written page by page as `name.p1.png`, `name.p2.png`, ...
+    Returns (ok, elapsed_ms, written paths).
+    """
+    from services import diagram_scale
+    from services.scheduler import BATCH, call_context
+    from ui import helpers
+
+    started = time.perf_counter()
+    pages = diagram_scale.split_diagram(code)
+    stem, ext = os.path.splitext(out_path)
+    paths = [out_path] if len(pages) == 1 else [f"{stem}.p{n}{ext}" for n in range(1, len(pages) + 1)]
+    ok = True
+    for page, path in zip(pages, paths):
+        # Batch renders queue behind interactive previews for the render slots
+        with call_context(priority=BATCH, session="batch"):
+            img = helpers.get_mermaid_img(page["code"], format, theme)
+        if not img:
+            ok = False
+            break
+        with open(path, "wb") as f:
+            f.write(img)
+    return ok, round((time.perf_counter() - started) * 1000, 2), paths
+
+
+def _load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _remove_stale_outputs(previous, current, format):
+    """Delete the earlier outputs of a source that its latest render did not write again."""
+    for path in set(previous) - set(current):
+        # Outputs of another format are not this run's to replace
+        if path.endswith(f".{format}"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def find_sources(src_dir, extensions=(".mmd", ".mermaid")):
+    """Return sorted relative paths of all Mermaid sources below `src_dir`."""
+    found = []
+    for root, _dirs, files in os.walk(src_dir):
+        for name in files:
+            if name.lower().endswith(extensions):
+                found.append(os.path.relpath(os.path.join(root, name), src_dir))
+    return sorted(found)
+
+
+def run_batch(src_dir, out_dir, format="png", theme="default", workers=None,
+              render_concurrency=4, force=False, render=True):
+    """Process every source in `src_dir` and return the report dict."""
+    os.makedirs(out_dir, exist_ok=True)
+    previous_manifest = _load_manifest(out_dir)  # Still used to find stale outputs when forced
+    manifest = {} if force else dict(previous_manifest)
+    started = time.perf_counter()
+
+    entries = {}
+    pending = []
+    for rel_path in find_sources(src_dir):
+        with open(os.path.join(src_dir, rel_path), "r", encoding="utf-8") as f:
+            text = f.read()
+        digest = content_hash(text, format, theme)
+        out_path = os.path.join(out_dir, os.path.splitext(rel_path)[0] + f".{format}")
+        entries[rel_path] = {"file": rel_path, "hash": digest, "output": out_path}
+        previous = manifest.get(rel_path, {})
+        outputs = previous.get("pages") or [out_path]
+        if previous.get("hash") == digest and (not render or all(os.path.exists(p) for p in outputs)):
+            entries[rel_path].update(status="skipped", errors=previous.get("errors", []), fixes=previous.get("fixes", []))
+            if previous.get("pages"):
+                entries[rel_path]["pages"] = previous["pages"]
+            continue
+        pending.append((rel_path, text))
+
+    # Stage 1: CPU-bound lint/fix in a process pool
+    linted = []
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            paths, texts = zip(*pending)
+            linted = list(pool.map(lint_source, paths, texts))
+    for result in linted:
+        entries[result["file"]].update(
+            status="linted",
+            errors=result["errors"],
+            fixes=result["fixes"],
+            complexity=result["complexity"],
+            timings={"lint_ms": result["lint_ms"]},
+        )
+
+    # Stage 2: I/O-bound rendering with bounded concurrency
+    if render and linted:
+        with ThreadPoolExecutor(max_workers=max(1, render_concurrency)) as pool:
+            futures = {}
+            for result in linted:
+                out_path = entries[result["file"]]["output"]
+                os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+                futures[result["file"]] = pool.submit(render_source, result["code"], out_path, format, theme)
+            for rel_path, future in futures.items():
+                try:
+                    ok, render_ms, paths = future.result()
+                    if len(paths) > 1:
+                        entries[rel_path]["pages"] = paths
+                except Exception as e:
+                    ok, render_ms = False, None
+                    entries[rel_path]["render_error"] = str(e)
+                entries[rel_path]["status"] = "rendered" if ok else "failed"
+                entries[rel_path]["timings"]["render_ms"] = render_ms
+                if ok and rel_path in previous_manifest:
+                    out_path = entries[rel_path]["output"]
+                    _remove_stale_outputs(previous_manifest[rel_path].get("pages") or [out_path], paths, format)
+
+    for rel_path, entry in entries.items():
+        if entry["status"] in ("rendered", "linted"):
+            manifest[rel_path] = {"hash": entry["hash"], "errors": entry["errors"], "fixes": entry["fixes"]}
+            if entry.get("pages"):
+                manifest[rel_path]["pages"] = entry["pages"]
+        elif entry["status"] == "failed":
+            manifest.pop(rel_path, None)
+    # Forget sources that were deleted since the last run
+    for rel_path in list(manifest):
+        if rel_path not in entries:
+            del manifest[rel_path]
+    _save_manifest(out_dir, manifest)
+
+    statuses = [e["status"] for e in entries.values()]
+    return {
+        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "source_dir": os.path.abspath(src_dir),
+        "output_dir": os.path.abspath(out_dir),
+        "format": format,
+        "theme": theme,
+        "summary": {
+            "total": len(entries),
+            "rendered": statuses.count("rendered"),
+            "linted": statuses.count("linted"),
+            "skipped": statuses.count("skipped"),
+            "failed": statuses.count("failed"),
+            "with_errors": sum(1 for e in entries.values() if e["errors"]),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        },
+        "files": [entries[k] for k in sorted(entries)],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lint, auto-fix and render a directory of Mermaid diagrams.")
+    parser.add_argument("src", help="Directory containing .mmd sources")
+    parser.add_argument("--out", default="rendered", help="Output directory for images (default: rendered)")
+    parser.add_argument("--format", choices=["png", "svg"], default="png")
+    parser.add_argument("--theme", choices=["default", "dark", "forest", "neutral"], default="default")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for the lint/fix stage (default: CPU count)")
+    parser.add_argument("--render-concurrency", type=int, default=4, help="Concurrent render requests (default: 4)")
+    parser.add_argument("--report", default=None, help="Report path (default: <out>/report.json)")
+    parser.add_argument("--force", action="store_true", help="Ignore the manifest and reprocess every file")
+    parser.add_argument("--lint-only", action="store_true", help="Skip the render stage")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.src):
+        parser.error(f"not a directory: {args.src}")
+
+    report = run_batch(
+        args.src, args.out, format=args.format, theme=args.theme, workers=args.workers,
+        render_concurrency=args.render_concurrency, force=args.force, render=not args.lint_only,
+    )
+    report_path = args.report or os.path.join(args.out, "report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    summary = report["summary"]
+    print(
+        f"{summary['total']} files: {summary['rendered']} rendered, {summary['skipped']} skipped, "
+        f"{summary['failed']} failed, {summary['with_errors']} with validation errors "
+        f"({summary['elapsed_ms']} ms). Report: {report_path}"
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,438 @@
+# services/diagram_scale.py
+
+"""Complexity analysis and paging for large Mermaid diagrams.
+`analyze_diagram` counts nodes, edges and depth before anything is rendered.
+Diagrams above `DIAGRAM_MAX_NODES` nodes or `DIAGRAM_MAX_CHARS` characters
+(Mermaid refuses sources over 50,000 characters) are split by `split_diagram`
+into pages along subgraphs (flowcharts), sections (Gantt), top-level blocks
+(sequence), entities (ER) or first-level branches (mindmap), so every page
+renders on its own.  Render timeouts grow with diagram size, and SVG output is
+minified and can be gzipped (`.svgz`) for download.
+"""
+
+import gzip
+import os
+import re
+from collections import defaultdict, deque
+
+MAX_NODES = int(os.environ.get("DIAGRAM_MAX_NODES", "120"))
+MAX_CHARS = int(os.environ.get("DIAGRAM_MAX_CHARS", "40000"))
+RENDER_TIMEOUT = float(os.environ.get("DIAGRAM_RENDER_TIMEOUT", "15"))  # Seconds for a small diagram
+RENDER_TIMEOUT_PER_ELEMENT = 0.05  # Extra seconds per node or edge
+RENDER_TIMEOUT_MAX = 120
+
+_FLOW_KEYWORDS = ("subgraph", "end", "classdef", "class", "style", "linkstyle", "click", "direction", "%%")
+_FLOW_LINK = re.compile(r"\s*(?:<?(?:-{2,}|={2,}|-\.+-)[>ox]?|<?-\.+->|~~~)(?:\|[^|]*\|)?\s*")
+_FLOW_TEXT_LINK = re.compile(r"\s*(?:--|==|-\.)\s+[^->=.][^>]*?\s*(?:-{2,}|={2,}|\.-)[>ox]?\s*")
+_NODE_ID = re.compile(r"^\s*([\w.-]+?)(?=\s*(?:\[|\(|\{|>|:::|$))")
+_SEQ_MESSAGE = re.compile(r"^\s*([^\s:>-][^:>-]*?)\s*(?:-{1,2}>>?|-{1,2}[x)]|<<-{1,2}>>)\s*[+-]?\s*([^:]+?)\s*:")
+_SEQ_PARTICIPANT = re.compile(r"^\s*(?:participant|actor)\s+(\S+)", re.IGNORECASE)
+_SEQ_BLOCKS = ("loop", "alt", "opt", "par", "critical", "break", "rect", "box")
+_ER_RELATION = re.compile(r"^\s*([\w-]+)\s+[|}o]{1,2}(?:--|\.\.)[|{o]{1,2}\s+([\w-]+)")
+_ER_ENTITY = re.compile(r"^\s*([\w-]+)\s*\{")
+_GANTT_META = ("title", "dateformat", "axisformat", "tickinterval", "excludes", "includes", "todaymarker", "weekday")
+
+_SVG_COMMENT = re.compile(rb"<!--.*?-->", re.DOTALL)
+_SVG_LINE_BREAK = re.compile(rb">\s*\n\s*<")
+_SVG_TAG = re.compile(rb"<[^<>]+>")
+_SVG_LONG_NUMBER = re.compile(rb"(\d+\.\d\d)\d+")
+
+
+def diagram_type(code):
+    """Mermaid diagram keyword (`flowchart`, `sequencediagram`, ...), lower-cased; "" if unknown."""
+    for line in code.split("\n"):
+        stripped = line.strip()
+        if stripped and not stripped.startswith("%%"):
+            keyword = stripped.split()[0].lower()
+            return "flowchart" if keyword == "graph" else keyword
+    return ""
+
+
+def _body(code):
+    """Lines after the diagram keyword line (and any leading directives)."""
+    lines = code.split("\n")
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped and not stripped.startswith("%%"):
+            return lines[:i + 1], lines[i + 1:]
+    return lines, []
+
+
+def _flow_nodes(segment):
+    """Node IDs in one side of a flowchart link (`A & B[Label]`)."""
+    ids = []
+    for part in segment.split(" & "):
+        match = _NODE_ID.match(part)
+        if match:
+            ids.append(match.group(1))
+    return ids
+
+
+def _flow_statement(line):
+    """(node ids, edges) declared by one flowchart statement."""
+    stripped = line.strip()
+    if not stripped or stripped.lower().split()[0] in _FLOW_KEYWORDS or stripped.startswith("%%"):
+        return [], []
+    nodes, edges = [], []
+    for statement in stripped.split(";"):
+        sides = _FLOW_LINK.split(_FLOW_TEXT_LINK.sub(" --> ", statement))
+        groups = [_flow_nodes(side) for side in sides if side.strip()]
+        for group in groups:
+            nodes.extend(group)
+        for left, right in zip(groups, groups[1:]):
+            edges.extend((a, b) for a in left for b in right)
+    return nodes, edges
+
+
+def _longest_path(nodes, edges):
+    """Longest path (in nodes) through the acyclic part of the graph."""
+    incoming = defaultdict(int)
+    outgoing = defaultdict(list)
+    for a, b in edges:
+        outgoing[a].append(b)
+        incoming[b] += 1
+    depth = {n: 1 for n in nodes}
+    queue = deque(n for n in nodes if not incoming[n])
+    while queue:
+        node = queue.popleft()
+        for nxt in outgoing[node]:
+            depth[nxt] = max(depth.get(nxt, 1), depth[node] + 1)
+            incoming[nxt] -= 1
+            if not incoming[nxt]:
+                queue.append(nxt)
+    return max(depth.values(), default=0)
+
+
+def analyze_diagram(code):
+    """
+    Complexity of a Mermaid diagram: {"type", "nodes", "edges", "depth",
+    "nesting", "groups", "lines", "chars"}.  `depth` is the longest chain
+    (flowchart path, mindmap level, Gantt `after` chain); `nesting` is the
+    deepest subgraph/block nesting; `groups` counts subgraphs, sections,
+    entities or first-level branches, i.e. the units pages are split along.
+    """
+    kind = diagram_type(code)
+    _, body = _body(code)
+    nodes, edges, depth, nesting, groups = set(), [], 0, 0, 0
+    level = 0
+
+    if kind == "mindmap":
+        indents = sorted({len(line) - len(line.lstrip()) for line in body if line.strip()})
+        levels = [indents.index(len(line) - len(line.lstrip())) for line in body if line.strip()]
+        nodes = set(range(len(levels)))
+        edges = [(0, i) for i in range(1, len(levels))]
+        depth = max(levels, default=-1) + 1
+        groups = levels.count(1)
+    elif kind == "sequencediagram":
+        for line in body:
+            stripped = line.strip()
+            first = stripped.split()[0].lower() if stripped else ""
+            if first in _SEQ_BLOCKS:
+                level += 1
+                nesting = max(nesting, level)
+                groups += level == 1
+            elif first == "end":
+                level = max(0, level - 1)
+            elif (match := _SEQ_PARTICIPANT.match(line)):
+                nodes.add(match.group(1))
+            elif (match := _SEQ_MESSAGE.match(line)):
+                nodes.update((match.group(1), match.group(2)))
+                edges.append((match.group(1), match.group(2)))
+        depth = len(edges)
+    elif kind == "erdiagram":
+        for line in body:
+            if (match := _ER_RELATION.match(line)):
+                nodes.update(match.groups())
+                edges.append(match.groups())
+            elif (match := _ER_ENTITY.match(line)):
+                nodes.add(match.group(1))
+                groups += 1
+        depth = _longest_path(nodes, edges)
+    elif kind == "gantt":
+        for line in body:
+            stripped = line.strip()
+            first = stripped.split()[0].lower() if stripped else ""
+            if first == "section":
+                groups += 1
+            elif ":" in stripped and first not in _GANTT_META and not stripped.startswith("%%"):
+                fields = [f.strip() for f in stripped.split(":", 1)[1].split(",")]
+                task_id = next((f for f in fields if re.fullmatch(r"[A-Za-z_][\w-]*", f)
+                                and f not in ("crit", "active", "done", "milestone")), f"task{len(nodes)}")
+                nodes.add(task_id)
+                for field in fields:
+                    if field.startswith("after "):
+                        for dep in field.split()[1:]:
+                            edges.append((dep, task_id))
+        depth = _longest_path(nodes, edges)
+    else:
+        for line in body:
+            first = line.strip().split()[0].lower() if line.strip() else ""
+            if first == "subgraph":
+                level += 1
+                nesting = max(nesting, level)
+                groups += 1
+            elif first == "end":
+                level = max(0, level - 1)
+            statement_nodes, statement_edges = _flow_statement(line)
+            nodes.update(statement_nodes)
+            edges.extend(statement_edges)
+        depth = _longest_path(nodes, edges)
+
+    return {
+        "type": kind or "unknown",
+        "nodes": len(nodes),
+        "edges": len(edges),
+        "depth": depth,
+        "nesting": nesting,
+        "groups": groups,
+        "lines": sum(1 for line in code.split("\n") if line.strip()),
+        "chars": len(code),
+    }
+
+
+def is_oversized(stats, max_nodes=None, max_chars=None):
+    """True if the diagram has more than `max_nodes` nodes (or twice as many edges) or `max_chars` characters."""
+    max_nodes = max_nodes or MAX_NODES
+    return (stats["nodes"] > max_nodes or stats["edges"] > 2 * max_nodes
+            or stats["chars"] > (max_chars or MAX_CHARS))
+
+
+def render_timeout(stats):
+    """Seconds to allow a remote render, growing with the number of nodes and edges."""
+    return min(RENDER_TIMEOUT_MAX, RENDER_TIMEOUT + RENDER_TIMEOUT_PER_ELEMENT * (stats["nodes"] + stats["edges"]))
+
+
+# ---------------------------------------------------------------------------
+# Paging
+# ---------------------------------------------------------------------------
+
+def _blocks(lines, openers):
+    """
+    Group lines into top-level units: a block from an opener keyword to its
+    matching `end` stays together, every other line is a unit of its own.
+    """
+    units, current, level = [], [], 0
+    for line in lines:
+        first = line.strip().split()[0].lower() if line.strip() else ""
+        if level == 0 and first not in openers:
+            if line.strip():
+                units.append([line])
+            continue
+        current.append(line)
+        if first in openers:
+            level += 1
+        elif first == "end":
+            level -= 1
+            if level == 0:
+                units.append(current)
+                current = []
+    if current:
+        units.append(current)
+    return units
+
+
+def _pack(units, cost, limit, max_chars):
+    """Greedily group consecutive units into pages of at most `limit` cost and `max_chars` characters."""
+    pages, current, used, chars = [], [], set(), 0
+    for unit in units:
+        unit_cost = cost(unit)
+        unit_chars = sum(len(line) + 1 for line in unit)
+        if current and (len(used | unit_cost) > limit or chars + unit_chars > max_chars):
+            pages.append(current)
+            current, used, chars = [], set(), 0
+        current.append(unit)
+        used |= unit_cost
+        chars += unit_chars
+    if current:
+        pages.append(current)
+    return pages
+
+
+def _label(unit):
+    """Title of a subgraph, section or block unit, or "" for plain statements."""
+    first = unit[0].strip()
+    for keyword in ("subgraph", "section") + _SEQ_BLOCKS:
+        if first.lower().startswith(keyword + " "):
+            return first
+    return ""
+
+
+def _page_dicts(header, pages):
+    result = []
+    for n, page in enumerate(pages, 1):
+        named = [label for label in (_label(unit) for unit in page) if label]
+        label = f"Page {n}/{len(pages)}"
+        if named:
+            label += f": {named[0]}" + (f" (+{len(named) - 1} more)" if len(named) > 1 else "")
+        lines = header + [line for unit in page for line in unit]
+        result.append({"label": label, "code": "\n".join(lines)})
+    return result
+
+
+def _flow_pages(code, limit, max_chars):
+    head, body = _body(code)
+    # Styling lines apply to every page; linkStyle indexes would no longer match and are dropped
+    shared = [l for l in body if l.strip().lower().split()[0:1] in (["classdef"], ["direction"])]
+    rest = [l for l in body if l not in shared and not l.strip().lower().startswith("linkstyle")]
+    units = []
+    for unit in _blocks(rest, ("subgraph",)):
+        unit_nodes = {n for line in unit for n in _flow_statement(line)[0]}
+        if len(unit_nodes) > limit and unit[0].strip().lower().startswith("subgraph"):
+            # An oversized subgraph is split into consecutive parts under the same title
+            inner = _pack(_blocks(unit[1:-1], ("subgraph",)),
+                          lambda u: {n for line in u for n in _flow_statement(line)[0]}, limit, max_chars)
+            for n, part in enumerate(inner, 1):
+                title = unit[0].rstrip() + (f" part {n}" if len(inner) > 1 else "")
+                units.append([title] + [line for u in part for line in u] + [unit[-1]])
+        else:
+            units.append(unit)
+
+    pages = _pack(units, lambda u: {n for line in u for n in _flow_statement(line)[0]}, limit, max_chars)
+
+    # Nodes first defined on another page are repeated with their label and marked as off-page
+    definitions = {}
+    for line in body:
+        for part in _FLOW_LINK.split(_FLOW_TEXT_LINK.sub(" --> ", line.strip())):
+            match = _NODE_ID.match(part)
+            if match and match.group(1) not in definitions and part.strip() != match.group(1):
+                definitions[match.group(1)] = part.strip()
+    result = []
+    for page in pages:
+        lines = [line for unit in page for line in unit]
+        defined = set()
+        referenced = []
+        for line in lines:
+            for part in _FLOW_LINK.split(_FLOW_TEXT_LINK.sub(" --> ", line.strip())):
+                match = _NODE_ID.match(part)
+                if not match or line.strip().lower().split()[0] in _FLOW_KEYWORDS:
+                    continue
+                if part.strip() != match.group(1):
+                    defined.add(match.group(1))
+                elif match.group(1) not in referenced:
+                    referenced.append(match.group(1))
+        stubs = [f"    {definitions[n]}:::offpage" for n in referenced if n not in defined and n in definitions]
+        extra = ["    classDef offpage stroke-dasharray:4 4"] + stubs if stubs else []
+        result.append(page + ([extra] if extra else []))
+    return _page_dicts(head + shared, result)
+
+
+def _gantt_pages(code, limit, max_chars):
+    head, body = _body(code)
+    meta = []
+    for line in body:
+        if line.strip().lower().startswith("section"):
+            break
+        meta.append(line)
+    sections, current = [], []
+    for line in body[len(meta):]:
+        if line.strip().lower().startswith("section") and current:
+            sections.append(current)
+            current = []
+        if line.strip():
+            current.append(line)
+    if current:
+        sections.append(current)
+    # Sections are the unit; the cost of a page is its task count
+    pages = _pack(sections, lambda unit: {(id(unit), i) for i, line in enumerate(unit) if ":" in line}, limit, max_chars)
+    return _page_dicts(head + meta, pages)
+
+
+def _sequence_pages(code, limit, max_chars):
+    head, body = _body(code)
+    shared = [l for l in body if _SEQ_PARTICIPANT.match(l) or l.strip().lower() in ("autonumber",)]
+    rest = [l for l in body if l not in shared]
+    # Each message counts once, so pages hold at most `limit` messages
+    pages = _pack(_blocks(rest, _SEQ_BLOCKS),
+                  lambda unit: {(id(unit), i) for i, line in enumerate(unit) if _SEQ_MESSAGE.match(line)},
+                  limit, max_chars)
+    return _page_dicts(head + shared, pages)
+
+
+def _er_pages(code, limit, max_chars):
+    head, body = _body(code)
+    units, current = [], []
+    for line in body:
+        if current:
+            current.append(line)
+            if line.strip().startswith("}"):
+                units.append(current)
+                current = []
+        elif _ER_ENTITY.match(line):
+            current = [line]
+            if "}" in line:
+                units.append(current)
+                current = []
+        elif line.strip():
+            units.append([line])
+    if current:
+        units.append(current)
+
+    def entities(unit):
+        match = _ER_RELATION.match(unit[0]) or _ER_ENTITY.match(unit[0])
+        return set(match.groups()) if match else set()
+
+    return _page_dicts(head, _pack(units, entities, limit, max_chars))
+
+
+def _mindmap_pages(code, limit, max_chars):
+    head, body = _body(code)
+    lines = [line for line in body if line.strip()]
+    if not lines:
+        return _page_dicts(head, [[lines]])
+    root, children = lines[0], lines[1:]
+    root_indent = len(root) - len(root.lstrip())
+    branch_indent = min((len(l) - len(l.lstrip()) for l in children), default=root_indent)
+    branches = []
+    for line in children:
+        if len(line) - len(line.lstrip()) == branch_indent or not branches:
+            branches.append([line])
+        else:
+            branches[-1].append(line)
+    pages = _pack(branches, lambda unit: {(id(unit), i) for i in range(len(unit))}, limit, max_chars)
+    result = _page_dicts(head + [root], pages)
+    for page, units in zip(result, pages):
+        page["label"] += ": " + units[0][0].strip()
+    return result
+
+
+_SPLITTERS = {
+    "flowchart": _flow_pages,
+    "gantt": _gantt_pages,
+    "sequencediagram": _sequence_pages,
+    "erdiagram": _er_pages,
+    "mindmap": _mindmap_pages,
+}
+
+
+def split_diagram(code, max_nodes=None, max_chars=None):
+    """
+    Pages of an oversized diagram as [{"label", "code"}].  Diagrams that fit,
+    and diagram types that cannot be split, come back as a single page.
+    """
+    max_nodes, max_chars = max_nodes or MAX_NODES, max_chars or MAX_CHARS
+    splitter = _SPLITTERS.get(diagram_type(code))
+    if splitter is None or not is_oversized(analyze_diagram(code), max_nodes, max_chars):
+        return [{"label": "Full diagram", "code": code}]
+    pages = splitter(code, max_nodes, max_chars)
+    return pages if len(pages) > 1 else [{"label": "Full diagram", "code": code}]
+
+
+# ---------------------------------------------------------------------------
+# SVG output
+# ---------------------------------------------------------------------------
+
+def minify_svg(svg):
+    """
+    Smaller SVG bytes: comments and indentation between tags are removed and
+    attribute numbers are rounded to two decimals.  Text content is untouched.
+    """
+    if not svg:
+        return svg
+    svg = _SVG_COMMENT.sub(b"", svg)
+    svg = _SVG_LINE_BREAK.sub(b"><", svg)
+    return _SVG_TAG.sub(lambda m: _SVG_LONG_NUMBER.sub(rb"\1", m.group(0)), svg).strip()
+
+
+def compress_svg(svg):
+    """Gzipped SVG (`.svgz`), which browsers and editors open directly."""
+    return gzip.compress(svg, compresslevel=9, mtime=0)
@@ -0,0 +1,104 @@
+# services/diagram_set.py
+
+"""Several diagrams of one context from a single generation call.
+The Mermaid rules and the context are sent once, asking for one fenced block
+per diagram type; the blocks are then matched back to the requested types and
+validated, repaired and (optionally) pre-rendered concurrently.  Compared with
+one generation per type this saves the repeated rules prompt and the wait for
+all but one generation call.
+
+`DIAGRAM_SET_CONCURRENCY` (default 4) bounds parallel repair/render work.
+"""
+
+import os
+import re
+
+from services import diagram_scale, prompts
+from services.errors import ErrorText
+from services.gemini_client import GeminiClient
+from services.jobs import fan_out
+
+DIAGRAM_SET_CONCURRENCY = int(os.environ.get("DIAGRAM_SET_CONCURRENCY", "4"))
+
+# Diagram Generator type -> Mermaid keyword as returned by `diagram_scale.diagram_type`
+TYPE_KEYWORDS = {
+    "Flowchart": "flowchart",
+    "Sequence": "sequencediagram",
+    "ER Diagram": "erdiagram",
+    "Gantt": "gantt",
+    "Mindmap": "mindmap",
+}
+
+_BLOCK = re.compile(r"(?:^#+[ \t]*([^\n]*?)[ \t]*\n\s*)?```mermaid\s+(.*?)\s*```", re.MULTILINE | re.DOTALL)
+
+
+def split_blocks(raw_text):
+    """(heading or None, code) for every ```mermaid block in an LLM response, in order."""
+    return [(heading or None, code) for heading, code in _BLOCK.findall(raw_text)]
+
+
+def assign_blocks(blocks, diagram_types):
+    """
+    {diagram type: code}.  A block is matched by its heading first, then by
+    its Mermaid keyword, then by position among the blocks still unclaimed.
+    """
+    unclaimed = list(blocks)
+    assigned = {}
+
+    def claim(kind, test):
+        for block in unclaimed:
+            if test(block):
+                assigned[kind] = block[1]
+                unclaimed.remove(block)
+                return
+
+    for kind in diagram_types:
+        claim(kind, lambda b: b[0] is not None and b[0].strip().lower() == kind.lower())
+    for kind in diagram_types:
+        if kind not in assigned:
+            claim(kind, lambda b: diagram_scale.diagram_type(b[1]) == TYPE_KEYWORDS.get(kind))
+    for kind in diagram_types:
+        if kind not in assigned and unclaimed:
+            assigned[kind] = unclaimed.pop(0)[1]
+    return assigned
+
+
+def generate_diagram_set(client, description, diagram_types, ref_date=None, render=None, route="diagram",
+                         on_progress=None, check=None, concurrency=DIAGRAM_SET_CONCURRENCY):
+    """
+    Generate every type in `diagram_types` for `description` with one LLM call.
+    `render(code)`, if given, is called for each repaired diagram so its image
+    is cached by the time the results are shown.  `check()` is called between
+    steps to support cancellation.  Returns {"diagrams": [{"type", "code",
+    "errors", "llm_fixed", "rendered"}], "missing": [types]} or an error string.
+    """
+    from ui import helpers
+
+    rules, prompt = prompts.build_diagram_set_prompt_parts(description, diagram_types, ref_date)
+    res = client.generate_content(prompt, route=route, cached_prefix=rules)
+    if GeminiClient.is_error_response(res):
+        return res
+    assigned = assign_blocks(split_blocks(res), diagram_types)
+    if not assigned:
+        return ErrorText("❌ The response did not contain any Mermaid code blocks.")
+
+    def build(kind):
+        result = helpers.repair_mermaid_code(client, assigned[kind])
+        result["type"] = kind
+        result["rendered"] = bool(render(result["code"])) if render else False
+        return result
+
+    finished = []
+
+    def progress(kind, _result):
+        finished.append(kind)
+        if on_progress:
+            on_progress(len(finished), len(assigned), kind)
+
+    if on_progress:
+        on_progress(0, len(assigned), None)
+    done = fan_out(build, assigned, concurrency, on_result=progress, check=check)
+    return {
+        "diagrams": [done[kind] for kind in diagram_types if kind in done],
+        "missing": [kind for kind in diagram_types if kind not in done],
+    }
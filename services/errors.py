@@ -0,0 +1,29 @@
+# services/errors.py
+
+"""Typed error results.
+Services return a warning/error message in place of generated text, so the UI
+can show it as-is.  Such messages are `ErrorText`: a `str` that carries a
+`kind`, so callers recognise them by type rather than by searching the text
+for ❌/⚠️, which generated content may legitimately contain.
+"""
+
+ERROR = "error"  # Upstream, parsing or other failure
+QUOTA = "quota"  # The key's quota is exhausted
+BUSY = "busy"    # Not admitted by the upstream scheduler
+
+
+class ErrorText(str):
+    """An error message returned instead of content; `kind` is ERROR, QUOTA or BUSY."""
+
+    def __new__(cls, text, kind=ERROR):
+        self = super().__new__(cls, text)
+        self.kind = kind
+        return self
+
+    def __reduce__(self):
+        return ErrorText, (str(self), self.kind)
+
+
+def is_error(value):
+    """True if `value` is an error message returned in place of content."""
+    return isinstance(value, ErrorText)
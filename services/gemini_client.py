@@ -1,53 +1,321 @@
 # services/gemini_client.py
 
 """Service layer for Gemini API interactions.
-Handles API key management (default vs user-provided), error handling (quota limits),
-and provides a unified interface for content generation.
+Handles API key management (user-provided key or a shared key pool), error
+handling (quota limits), and provides a unified interface for content generation.
 """
 
-import google.generativeai as genai
-import streamlit as st
+import hashlib
+import threading
+import time
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from google.api_core import exceptions
 
+from services.key_pool import get_key_pool
+from services.model_router import get_router
+from services.hedging import HEDGE_ENABLED, get_hedger, hedge_delay
+from services.context_cache import get_context_cache
+from services.errors import QUOTA, ErrorText
+from services.llm_backend import get_llm_backend
+from services.prompt_cache import get_prompt_cache
+from services.single_flight import flight_key, get_single_flight
+from services.scheduler import BUSY_MESSAGE, SchedulerBusy, context_priority, context_session, get_scheduler
+
+# Routes whose result must come from the caller's own upstream call (e.g. checking a key)
+NO_COALESCE_ROUTES = {"verify"}
+
+
+def _is_quota_error(e):
+    return isinstance(e, exceptions.ResourceExhausted) or "429" in str(e) or "quota" in str(e).lower()
+
+
+def _current_session(api_key=None):
+    """Fair-share identity for the scheduler: the Streamlit session, else the call context or key."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx:
+        return ctx.session_id
+    if context_session():
+        return context_session()
+    return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12] if api_key else None
+
 
 class GeminiClient:
-    def __init__(self, user_api_key=None):
-        """Initialize with user key."""
+    def __init__(self, user_api_key=None, request_timeout=None, key_pool=None, hedge=None,
+                 priority=None, session_id=None):
+        """
+        Initialize with the user's key. Without one, fall back to the shared key
+        pool when `GEMINI_API_KEYS` is configured. `request_timeout` (seconds)
+        bounds each upstream call. `hedge` enables hedged requests (defaults to
+        `GEMINI_HEDGING`). `priority` and `session_id` place calls in the
+        upstream scheduler (see `services.scheduler`); `on_wait(position)` is
+        called while a call is queued for a slot.  Set `deadline` (a
+        `time.time()` value, e.g. `Job.deadline`) to bound every later call by
+        the time left when it starts.
+        """
         self.api_key = user_api_key
-        self.is_default = False # No default key anymore
-        if self.api_key:
-            self._configure()
+        self.request_timeout = request_timeout
+        self.priority = priority
+        self.session_id = session_id or _current_session(user_api_key)
+        self.on_wait = None
+        self.deadline = None
+        self.hedge = HEDGE_ENABLED if hedge is None else hedge
+        self.key_pool = None if user_api_key else (key_pool or get_key_pool())
+        self.is_default = self.key_pool is not None
 
-    def _configure(self):
-        """Configure the genai library."""
+    def generate_content(self, prompt, model_name=None, route=None, generation_config=None, cached_prefix=None):
+        """
+        Generate content with robust error handling.
+        `route` names the feature / call type (see `services.model_router.ROUTES`);
+        the model is picked by the router unless `model_name` is given explicitly.
+        `generation_config` is passed through, e.g. for JSON structured output.
+        `cached_prefix` is a stable leading part of the prompt that may be served
+        from server-side context caching (see `services.context_cache`).
+        Responses of routes with a prompt cache threshold are reused for
+        near-duplicate requests (see `services.prompt_cache`), and identical
+        concurrent calls share one upstream request (see `services.single_flight`).
+        """
+        prompt_cache = self._prompt_cache()
+        cached = prompt_cache.get(route, prompt, cached_prefix, generation_config, self.cache_owner()) if prompt_cache else None
+        if cached is not None:
+            return cached
+        single_flight = get_single_flight()
+        if single_flight is None or route in NO_COALESCE_ROUTES:
+            return self._generate(prompt, model_name, route, generation_config, cached_prefix, prompt_cache)
+        # Only calls paid for by the same key (or the shared pool) share a result
+        return single_flight.do(
+            f"llm:{route or 'default'}",
+            flight_key(self.key_identity(), route, model_name, generation_config, cached_prefix or "", prompt),
+            lambda: self._generate(prompt, model_name, route, generation_config, cached_prefix, prompt_cache),
+            accept=lambda text: not self.is_error_response(text),
+        )
+
+    def _generate(self, prompt, model_name, route, generation_config, cached_prefix, prompt_cache):
+        """One upstream generation with routing, hedging and error handling."""
+        if self._deadline_passed():
+            return ErrorText("❌ Error: The time limit was reached before this step could start.")
+        router = get_router()
+        model_name = model_name or router.choose(route)
+        started = time.perf_counter()
         try:
-            genai.configure(api_key=self.api_key)
+            with get_scheduler("gemini").slot(self.priority, self.session_id, self.on_wait):
+                started = time.perf_counter()
+                if self.hedge:
+                    text, answered_by = self._generate_hedged(prompt, model_name, route, generation_config, cached_prefix)
+                else:
+                    text, answered_by = self._generate_with_keys(prompt, model_name, generation_config, cached_prefix), model_name
+        except SchedulerBusy:
+            return BUSY_MESSAGE
         except Exception as e:
-            # Configuration might fail if key is invalid format, but we handle calls later
-            pass
+            # Catch-all for other errors, might be invalid key or other API issues
+            if _is_quota_error(e):
+                return self._handle_quota_error()  # A key's quota says nothing about the model's health
+            router.record(route, model_name, (time.perf_counter() - started) * 1000, ok=False)
+            return ErrorText(f"❌ Error: {str(e)}")
+        router.record(route, answered_by, (time.perf_counter() - started) * 1000)
+        if prompt_cache and text:
+            prompt_cache.put(route, prompt, text, cached_prefix, generation_config, self.cache_owner())
+        return text
 
-    def generate_content(self, prompt, model_name="gemini-2.5-flash"):
-        """Generate content with robust error handling."""
+    def generate_content_stream(self, prompt, model_name=None, route=None, cached_prefix=None):
+        """Yield response text chunks as they arrive; errors are yielded as a single message."""
+        prompt_cache = self._prompt_cache()
+        cached = prompt_cache.get(route, prompt, cached_prefix, owner=self.cache_owner()) if prompt_cache else None
+        if cached is not None:
+            yield cached
+            return
+        router = get_router()
+        model_name = model_name or router.choose(route)
+        scheduler = get_scheduler("gemini")
+        try:
+            ticket = scheduler.acquire(self.priority or context_priority(), self.session_id, self.on_wait)
+        except SchedulerBusy:
+            yield BUSY_MESSAGE
+            return
+        api_key = self._acquire_key()
+        started = time.perf_counter()
         try:
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(prompt)
-            return response.text
-        except exceptions.ResourceExhausted:
-            return self._handle_quota_error()
+            if api_key is None and self.key_pool:
+                raise exceptions.ResourceExhausted("All pooled API keys are exhausted.")
+            model, contents, _ = self._prepare(api_key, model_name, prompt, cached_prefix)
+            usage, parts = None, []
+            for chunk in model.generate_content(contents, stream=True, request_options=self._request_options()):
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = getattr(chunk, "text", "")
+                if text:
+                    parts.append(text)
+                    yield text
+            self._record_usage(usage, cached_prefix)
+            if prompt_cache and parts:
+                prompt_cache.put(route, prompt, "".join(parts), cached_prefix, owner=self.cache_owner())
+            self._report(api_key, started)
+            router.record(route, model_name, (time.perf_counter() - started) * 1000)
         except Exception as e:
-            # Catch-all for other errors, might be invalid key or other API issues
-            if "429" in str(e) or "quota" in str(e).lower():
-                return self._handle_quota_error()
-            return f"❌ Error: {str(e)}"
+            self._report(api_key, started, error=e)
+            if not _is_quota_error(e):
+                router.record(route, model_name, (time.perf_counter() - started) * 1000, ok=False)
+            if isinstance(e, exceptions.NotFound) and cached_prefix and get_context_cache():
+                get_context_cache().invalidate(api_key, model_name, cached_prefix)
+            if _is_quota_error(e):
+                yield self._handle_quota_error()
+            else:
+                yield ErrorText(f"❌ Error: {str(e)}")
+        finally:
+            scheduler.release(ticket)
+
+    def _generate_with_keys(self, prompt, model_name, generation_config=None, cached_prefix=None,
+                            used_keys=None, stop=None):
+        """
+        Call the model, retrying on the next pooled key when one is rate limited.
+        Keys in `used_keys` are skipped and every key tried is added to it; once
+        `stop` is set (another hedged call answered) no further attempt is made.
+        """
+        attempts = len(self.key_pool) if self.key_pool else 1
+        for _ in range(attempts):
+            if stop is not None and stop.is_set():
+                raise RuntimeError("Superseded by a hedged call that already answered.")
+            api_key = self._acquire_key(exclude=used_keys if used_keys is not None else ())
+            if api_key is None and self.key_pool:
+                break
+            if used_keys is not None:
+                used_keys.add(api_key)
+            started = time.perf_counter()
+            try:
+                model, contents, handle = self._prepare(api_key, model_name, prompt, cached_prefix)
+                try:
+                    response = model.generate_content(
+                        contents, generation_config=generation_config, request_options=self._request_options(),
+                    )
+                except exceptions.NotFound:
+                    if handle is None:
+                        raise
+                    # The cached content expired or was deleted server-side: send the prefix inline once
+                    get_context_cache().invalidate(api_key, model_name, cached_prefix)
+                    response = self._model(api_key, model_name).generate_content(
+                        cached_prefix + prompt, generation_config=generation_config,
+                        request_options=self._request_options(),
+                    )
+                text = response.text
+            except Exception as e:
+                self._report(api_key, started, error=e)
+                if self.key_pool and _is_quota_error(e):
+                    continue
+                raise
+            self._report(api_key, started)
+            self._record_usage(getattr(response, "usage_metadata", None), cached_prefix)
+            return text
+        raise exceptions.ResourceExhausted("All pooled API keys are exhausted.")
+
+    def _generate_hedged(self, prompt, model_name, route, generation_config=None, cached_prefix=None):
+        """
+        Send a duplicate if the call outlives the route's recent latency percentile.
+        With several pooled keys the duplicate uses the same model on a key the
+        primary has not used, otherwise it goes to the next faster model, which
+        may reuse the primary's key.  A single key already on the fastest model
+        is not hedged.  Returns (text, name of the model that answered).
+        """
+        router = get_router()
+        if self.key_pool and len(self.key_pool) > 1:
+            backup_model = model_name
+        else:
+            backup_model = router.faster_model(model_name)
+            if backup_model == model_name:
+                return self._generate_with_keys(prompt, model_name, generation_config, cached_prefix), model_name
+        used_keys, answered = set(), threading.Event()
+        # Quota is per key and model, so only a duplicate of the same model has to avoid the primary's keys
+        backup_keys = used_keys if backup_model == model_name else set()
+        try:
+            return get_hedger().run(
+                route,
+                lambda: (self._generate_with_keys(prompt, model_name, generation_config, cached_prefix,
+                                                  used_keys, answered), model_name),
+                lambda: (self._generate_with_keys(prompt, backup_model, generation_config, cached_prefix,
+                                                  backup_keys, answered), backup_model),
+                hedge_delay(router.route_stats(route, model_name)),
+            )
+        finally:
+            answered.set()  # The losing call makes no further attempts
+
+    def _acquire_key(self, exclude=()):
+        if self.key_pool:
+            return self.key_pool.acquire(exclude)
+        return self.api_key
+
+    def _report(self, api_key, started, error=None):
+        if not self.key_pool or api_key is None:
+            return
+        self.key_pool.report(
+            api_key,
+            ok=error is None,
+            rate_limited=error is not None and _is_quota_error(error),
+            latency_ms=(time.perf_counter() - started) * 1000,
+        )
+
+    def _prepare(self, api_key, model_name, prompt, cached_prefix=None):
+        """
+        (model, contents, handle) for one call.  When `cached_prefix` has cached
+        content, the model is bound to its `handle`; otherwise the prefix is sent inline.
+        """
+        if not cached_prefix:
+            return self._model(api_key, model_name), prompt, None
+        context_cache = get_context_cache()
+        handle = context_cache.handle(api_key, model_name, cached_prefix) if context_cache else None
+        if handle is None:
+            return self._model(api_key, model_name), cached_prefix + prompt, None
+        return self._model(api_key, model_name, cached_content=handle), prompt, handle
+
+    @staticmethod
+    def _record_usage(usage, cached_prefix):
+        context_cache = get_context_cache()
+        if cached_prefix and context_cache:
+            context_cache.record_usage(usage)
+
+    def _model(self, api_key, model_name, cached_content=None):
+        # Live Gemini, or a record / replay / mock stand-in (see `services.llm_backend`)
+        return get_llm_backend().model(api_key, model_name, cached_content)
+
+    def _request_options(self):
+        timeout = self.request_timeout
+        if self.deadline is not None:
+            left = max(1.0, self.deadline - time.time())
+            timeout = min(timeout, left) if timeout else left
+        if timeout:
+            return {"timeout": timeout}
+        return None
+
+    def _deadline_passed(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def key_identity(self):
+        """Stable, non-secret identity of whoever pays for calls: a hash of the user's key, or the shared pool."""
+        if self.key_pool:
+            return "pool"
+        if self.api_key:
+            return "key:" + hashlib.sha256(self.api_key.encode("utf-8")).hexdigest()[:16]
+        return "none"
+
+    def cache_owner(self):
+        """Whose cached responses this client may see: the user's key, or the session for pooled users."""
+        return self.session_id if self.key_pool else self.key_identity()
+
+    def _prompt_cache(self):
+        # Pooled calls without a session (e.g. anonymous API requests) have no owner to scope to
+        return get_prompt_cache() if self.cache_owner() else None
+
+    @staticmethod
+    def is_error_response(text):
+        """True if `text` is one of the warning/error messages returned instead of content."""
+        return isinstance(text, ErrorText)
 
     def _handle_quota_error(self):
         """Return the Bengali instruction message for quota limits."""
-        return (
+        return ErrorText(
             "⚠️ **API Quota Limit Exceeded**\\n\\n"
             "Your API key has reached its usage limit. Please check your quota or use a different API key.\\n\\n"
             "**Bengali Instruction:**\\n"
             "আপনার API কী-এর সীমা শেষ হয়ে গেছে। অনুগ্রহ করে নতুন API কী ব্যবহার করুন।\\n"
-            "নতুন API কী পেতে ভিজিট করুন: [Google AI Studio](https://aistudio.google.com/)"
+            "নতুন API কী পেতে ভিজিট করুন: [Google AI Studio](https://aistudio.google.com/)",
+            QUOTA,
         )
 
     @staticmethod
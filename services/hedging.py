@@ -0,0 +1,139 @@
+# services/hedging.py
+
+"""Hedged requests to cut tail latency.
+If a call has not completed after a high percentile of the route's recent
+latency, a duplicate is sent (to a pooled key the first call has not used, or
+to a faster model); the first result wins.  The loser is abandoned, not
+cancelled: a request already sent runs to completion and counts against its
+key's quota, but its result is discarded and it makes no further attempts,
+such as retries on other keys.  Hedging is opt-in (`GeminiClient(hedge=True)` or
+`GEMINI_HEDGING=1`) and each feature has a budget capping the share of
+requests that may be duplicated.
+"""
+
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+HEDGE_ENABLED = os.environ.get("GEMINI_HEDGING", "0") == "1"
+HEDGE_PERCENTILE = float(os.environ.get("GEMINI_HEDGE_PERCENTILE", "95"))
+MIN_SAMPLES = 10
+DEFAULT_DELAY_SECONDS = 15.0  # Used until a route has enough latency samples
+MIN_DELAY_SECONDS = 1.0
+
+# Maximum share of a feature's requests that may be hedged
+HEDGE_BUDGETS = {
+    "default": 0.10,
+    "document": 0.05,
+    "code": 0.05,
+    "verify": 0.0,
+}
+BUDGET_BURST = 3.0
+
+
+class HedgeBudget:
+    def __init__(self, ratio):
+        """Token bucket: every request earns `ratio` tokens, every hedge spends one."""
+        self.ratio = ratio
+        self.tokens = min(1.0, BUDGET_BURST) if ratio > 0 else 0.0
+
+    def earn(self):
+        self.tokens = min(BUDGET_BURST, self.tokens + self.ratio)
+
+    def spend(self):
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class Hedger:
+    def __init__(self, budgets=None, max_workers=32):
+        self.budgets = dict(HEDGE_BUDGETS if budgets is None else budgets)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def run(self, route, primary, backup, delay):
+        """
+        Call `primary()`; if it hasn't finished after `delay` seconds and the
+        route's budget allows, also call `backup()` and return whichever
+        finishes first. Exceptions from the winner propagate only if both fail.
+        """
+        route = route or "default"
+        self._count(route, "requests")
+        first = self._executor.submit(primary)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            self._count(route, "unhedged")
+            return first.result()
+        if not self._spend(route):
+            self._count(route, "budget_denied")
+            return first.result()
+
+        self._count(route, "hedges")
+        second = self._executor.submit(backup)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()  # Running calls are abandoned; their result is ignored
+                    self._count(route, "hedge_wins" if future is second else "primary_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _spend(self, route):
+        with self._lock:
+            bucket = self._bucket(route)
+            return bucket.spend()
+
+    def _bucket(self, route):
+        if route not in self._buckets:
+            self._buckets[route] = HedgeBudget(self.budgets.get(route, self.budgets["default"]))
+        return self._buckets[route]
+
+    def _count(self, route, name):
+        with self._lock:
+            stats = self._stats.setdefault(route, {
+                "requests": 0, "unhedged": 0, "hedges": 0,
+                "hedge_wins": 0, "primary_wins": 0, "budget_denied": 0,
+            })
+            stats[name] += 1
+            if name == "requests":
+                self._bucket(route).earn()
+
+    def stats(self):
+        """Per-route counters, including how often the duplicate won."""
+        with self._lock:
+            rows = {}
+            for route, stats in self._stats.items():
+                row = dict(stats)
+                row["hedge_rate"] = round(stats["hedges"] / stats["requests"], 3) if stats["requests"] else 0.0
+                row["hedge_win_rate"] = round(stats["hedge_wins"] / stats["hedges"], 3) if stats["hedges"] else 0.0
+                rows[route] = row
+            return rows
+
+
+def hedge_delay(latency_stats):
+    """Seconds to wait before hedging: the configured percentile of recent latency."""
+    if latency_stats.window_size() < MIN_SAMPLES:
+        return DEFAULT_DELAY_SECONDS
+    return max(MIN_DELAY_SECONDS, latency_stats.percentile(HEDGE_PERCENTILE) / 1000.0)
+
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger():
+    """Process-wide hedger shared by all sessions."""
+    global _hedger
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger()
+        return _hedger
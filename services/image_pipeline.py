@@ -0,0 +1,188 @@
+# services/image_pipeline.py
+
+"""Background pipeline for images derived from a diagram render.
+One rendered PNG is decoded once on a small shared thread pool and turned
+into a JPG, a WebP and a thumbnail.  Results go to the blob store under
+`derived:<variant>:<png hash>`, so each render is converted only once per
+process lifetime and the UI just serves the stored bytes.  Thumbnails are
+downscaled with `Image.reduce` (or `Image.draft` for JPEG sources) before
+the final resample.
+
+`IMAGE_WORKERS` (default 2) sizes the pool, `JPEG_QUALITY` (default 95) and
+`WEBP_QUALITY` (default 90) set the encoders and `THUMBNAIL_SIZE` (default
+256) the thumbnail's longest side.
+"""
+
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from PIL import Image
+
+from services.blobstore import blob_hash, get_blob_store
+
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+JPEG_QUALITY = int(os.environ.get("JPEG_QUALITY", "95"))
+WEBP_QUALITY = int(os.environ.get("WEBP_QUALITY", "90"))
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", "256"))
+
+VARIANTS = ("jpg", "webp", "thumb")
+MIME_TYPES = {"jpg": "image/jpeg", "webp": "image/webp", "thumb": "image/webp"}
+
+
+def _flatten(image):
+    """RGB copy with any transparency composited onto white (JPEG has no alpha)."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, "white")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def to_jpg(image, quality=JPEG_QUALITY):
+    output = io.BytesIO()
+    _flatten(image).save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def to_webp(image, quality=WEBP_QUALITY):
+    output = io.BytesIO()
+    image.convert("RGBA" if "A" in image.getbands() else "RGB").save(output, format="WEBP", quality=quality, method=4)
+    return output.getvalue()
+
+
+def to_thumbnail(image, size=THUMBNAIL_SIZE):
+    """WebP thumbnail whose longest side is at most `size` pixels."""
+    # Integer box reduction first (cheap), then a high-quality resample of the small image
+    factor = max(1, max(image.size) // (2 * size))
+    small = image.reduce(factor) if factor > 1 else image.copy()
+    small.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return to_webp(_flatten(small), quality=80)
+
+
+_ENCODERS = {"jpg": to_jpg, "webp": to_webp, "thumb": to_thumbnail}
+
+
+def open_image(data, variants=VARIANTS):
+    """Decode image bytes; a JPEG that is only needed for a thumbnail is decoded at reduced size."""
+    image = Image.open(io.BytesIO(data))
+    if image.format == "JPEG" and set(variants) == {"thumb"}:
+        image.draft("RGB", (2 * THUMBNAIL_SIZE, 2 * THUMBNAIL_SIZE))
+    image.load()
+    return image
+
+
+def derive(data, variant):
+    """Bytes of one derived variant of `data` (synchronous)."""
+    return _ENCODERS[variant](open_image(data, (variant,)))
+
+
+class ImagePipeline:
+    def __init__(self, store=None, workers=IMAGE_WORKERS):
+        self.store = store or get_blob_store()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="image-pipeline")
+        self._pending = {}  # source hash -> Future
+        self._thumbnail_keys = {}  # source hash -> thumbnail keys to alias when its build finishes
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "built": 0, "reused": 0, "failed": 0}
+
+    @staticmethod
+    def alias(digest, variant):
+        return f"derived:{variant}:{digest}"
+
+    @staticmethod
+    def thumbnail_alias(key):
+        return f"thumb:{key}"
+
+    def submit(self, data, thumbnail_key=None):
+        """
+        Queue the missing variants of `data` and return its hash (use it with
+        `get`).  With `thumbnail_key` the thumbnail is also stored under that
+        key, e.g. the content hash of a history item.
+        """
+        digest = blob_hash(data)
+        missing = [v for v in VARIANTS if self.store.get_alias(self.alias(digest, v)) is None]
+        if not missing:
+            if thumbnail_key:
+                self.store.set_alias(self.thumbnail_alias(thumbnail_key), self.store.get_alias(self.alias(digest, "thumb")))
+            self._count("reused")
+            return digest
+        with self._lock:
+            if thumbnail_key:
+                # Also covers a build already pending for the same image under another key
+                self._thumbnail_keys.setdefault(digest, set()).add(thumbnail_key)
+            if digest not in self._pending:
+                self._stats["submitted"] += 1
+                future = self._pool.submit(self._build, data, digest, missing)
+                self._pending[digest] = future
+                future.add_done_callback(lambda _f: self._forget(digest))
+        return digest
+
+    def _build(self, data, digest, variants):
+        try:
+            image = open_image(data, variants)
+            for variant in variants:
+                self.store.set_alias(self.alias(digest, variant), self.store.put(_ENCODERS[variant](image)))
+            self._count("built")
+        except Exception:
+            self._count("failed")
+            raise
+        finally:
+            # Later submits see the stored variants and alias their keys themselves
+            with self._lock:
+                keys = self._thumbnail_keys.pop(digest, ())
+                self._pending.pop(digest, None)
+        thumb = self.store.get_alias(self.alias(digest, "thumb"))
+        for key in keys:
+            self.store.set_alias(self.thumbnail_alias(key), thumb)
+
+    def _forget(self, digest):
+        with self._lock:
+            self._pending.pop(digest, None)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, digest, variant, wait=None):
+        """
+        Stored bytes for `variant` of the source with hash `digest`, or None
+        if they are not ready.  `wait` seconds are spent waiting for a pending
+        build first.
+        """
+        name = self.alias(digest, variant)
+        stored = self.store.get_alias(name)
+        if stored is None and wait:
+            with self._lock:
+                future = self._pending.get(digest)
+            if future is not None:
+                try:
+                    future.result(timeout=wait)
+                except (FutureTimeout, Exception):
+                    return None
+                stored = self.store.get_alias(name)
+        return self.store.get(stored) if stored else None
+
+    def thumbnail(self, key):
+        """Thumbnail stored under `thumbnail_key`, or None."""
+        stored = self.store.get_alias(self.thumbnail_alias(key))
+        return self.store.get(stored) if stored else None
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "pending": len(self._pending)}
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_image_pipeline():
+    """Process-wide derived-image pipeline."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = ImagePipeline()
+        return _pipeline
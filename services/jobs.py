@@ -0,0 +1,219 @@
+# services/jobs.py
+
+"""Background job execution for long generations.
+Long LLM flows run on a bounded, process-wide thread pool instead of the
+Streamlit script thread.  The UI keeps only the job ID in session state and
+polls for progress; jobs can be cancelled and carry a hard deadline.
+
+Cancellation and timeouts are cooperative: a job function receives its `Job`
+and should set `client.deadline = job.deadline`, so every upstream call it
+makes is bounded by the time left when that call starts, and call
+`job.check()` between steps, so a stuck or abandoned call never pins a
+worker thread past its deadline.
+"""
+
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+MAX_WORKERS = int(os.environ.get("JOB_WORKERS", "8"))
+MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "64"))
+DEFAULT_TIMEOUT = float(os.environ.get("JOB_TIMEOUT", "180"))
+RETENTION_SECONDS = 600
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it was cancelled or ran past its deadline."""
+
+
+class JobQueueFull(RuntimeError):
+    """Raised by `JobManager.submit` when too many jobs are pending."""
+
+
+class Job:
+    def __init__(self, label, timeout, key=None):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.key = key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Queued..."
+        self.result = None
+        self.partial = None
+        self.error = None
+        self.created = time.time()
+        self.deadline = self.created + timeout
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def is_active(self):
+        self._check_deadline()
+        return self.status in ACTIVE_STATES
+
+    def update(self, progress, message=None):
+        """Report progress (0..1) from inside the job; also checks for cancellation."""
+        self.check()
+        with self._lock:
+            self.progress = max(0.0, min(1.0, progress))
+            if message:
+                self.message = message
+
+    def publish(self, partial):
+        """Expose an intermediate result (e.g. the sections written so far) to pollers."""
+        self.check()
+        with self._lock:
+            self.partial = partial
+
+    def remaining(self):
+        """Seconds left before the hard deadline (at least 1, for use as a request timeout)."""
+        return max(1.0, self.deadline - time.time())
+
+    def check(self):
+        """Raise `JobCancelled` if the job was cancelled or its deadline passed."""
+        self._check_deadline()
+        if self._cancel.is_set():
+            raise JobCancelled(self.status)
+
+    def cancel(self):
+        self._finish(CANCELLED, error="Cancelled by user.")
+
+    def _check_deadline(self):
+        if self.status in ACTIVE_STATES and time.time() > self.deadline:
+            self._finish(TIMED_OUT, error="Timed out waiting for the model. Please try again.")
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            if self.status not in ACTIVE_STATES:
+                return False
+            self.status = status
+            self.result = result
+            self.error = error
+            self.progress = 1.0 if status == DONE else self.progress
+            self.finished = time.time()
+            if status != DONE:
+                self._cancel.set()
+            return True
+
+
+def fan_out(fn, items, concurrency, on_result=None, check=None):
+    """
+    Run `fn(item)` for every item on a bounded pool and return {item: result}.
+    `check()` (e.g. `Job.check`) runs before each item starts and
+    `on_result(item, result)` on the calling thread as items finish.  Workers
+    run in a copy of the caller's context (see `services.scheduler.call_context`).
+    If the caller is interrupted, e.g. by `JobCancelled`, work not yet started
+    is cancelled and the exception propagates.
+    """
+    items = list(items)
+
+    def run(item):
+        if check:
+            check()
+        return fn(item)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as pool:
+        futures = {pool.submit(contextvars.copy_context().run, run, item): item for item in items}
+        try:
+            for future in as_completed(futures):
+                item = futures[future]
+                results[item] = future.result()
+                if on_result:
+                    on_result(item, results[item])
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return results
+
+
+class JobManager:
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._max_pending = max_pending
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, label="Job", timeout=DEFAULT_TIMEOUT, key=None, **kwargs):
+        """
+        Run `fn(job, *args, **kwargs)` in the background and return the job ID.
+        If `key` is given and an active job with the same key exists, its ID is
+        returned instead of starting duplicate work.
+        """
+        with self._lock:
+            self._prune()
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and job.is_active:
+                        return job.id
+            if sum(1 for j in self._jobs.values() if j.is_active) >= self._max_pending:
+                raise JobQueueFull("Too many background jobs are running. Please try again shortly.")
+            job = Job(label, timeout, key)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job:
+            job.cancel()
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            job._check_deadline()
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def _run(self, job, fn, args, kwargs):
+        job._check_deadline()
+        with job._lock:
+            if job.status != QUEUED:
+                return  # Cancelled or expired while queued
+            job.status = RUNNING
+            job.message = "Working..."
+        try:
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            return
+        except Exception as e:
+            job._finish(FAILED, error=f"❌ Error: {str(e)}")
+            return
+        job._finish(DONE, result=result)
+
+    def _prune(self):
+        cutoff = time.time() - RETENTION_SECONDS
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Process-wide job manager shared by all sessions."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
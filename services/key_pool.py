@@ -0,0 +1,126 @@
+# services/key_pool.py
+
+"""Quota-aware pool of Gemini API keys for shared/team deployments.
+Each key has a per-window request budget.  Requests are routed to the
+healthiest key (most remaining quota, fewest recent 429s, lowest latency),
+and keys that hit a 429 are quarantined until their quota window resets.
+
+Enable by setting `GEMINI_API_KEYS` to a comma-separated list of keys;
+`GEMINI_KEY_RPM` sets the per-key requests-per-minute budget (default 10).
+"""
+
+import os
+import threading
+import time
+
+QUOTA_WINDOW_SECONDS = 60
+MAX_QUARANTINE_SECONDS = 15 * 60
+
+
+class KeyState:
+    def __init__(self, key, budget):
+        self.key = key
+        self.budget = budget
+        self.window_start = time.time()
+        self.used = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.consecutive_429 = 0
+        self.quarantined_until = 0.0
+        self.latency_ms = None  # Exponential moving average
+
+    def remaining(self, now):
+        if now - self.window_start >= QUOTA_WINDOW_SECONDS:
+            self.window_start = now
+            self.used = 0
+        return max(0, self.budget - self.used)
+
+    def score(self, now):
+        """Higher is healthier: remaining quota first, then 429 history, then latency."""
+        return (self.remaining(now), -self.consecutive_429, -(self.latency_ms or 0.0))
+
+
+class KeyPool:
+    def __init__(self, keys, requests_per_minute=10):
+        if not keys:
+            raise ValueError("KeyPool needs at least one API key.")
+        self._states = {key: KeyState(key, requests_per_minute) for key in dict.fromkeys(keys)}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._states)
+
+    def acquire(self, exclude=()):
+        """
+        Reserve one request on the healthiest available key not in `exclude`;
+        None if every such key is exhausted.
+        """
+        with self._lock:
+            now = time.time()
+            available = [
+                s for s in self._states.values()
+                if s.key not in exclude and s.quarantined_until <= now and s.remaining(now) > 0
+            ]
+            if not available:
+                return None
+            best = max(available, key=lambda s: s.score(now))
+            best.used += 1
+            best.requests += 1
+            return best.key
+
+    def report(self, key, ok=True, rate_limited=False, latency_ms=None):
+        """Record the outcome of a request made with `key`."""
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                return
+            now = time.time()
+            if latency_ms is not None:
+                state.latency_ms = latency_ms if state.latency_ms is None else 0.8 * state.latency_ms + 0.2 * latency_ms
+            if rate_limited:
+                state.rate_limited += 1
+                state.consecutive_429 += 1
+                # Quarantine until the window resets; back off further on repeated 429s
+                penalty = 0
+                if state.consecutive_429 > 1:
+                    penalty = min(QUOTA_WINDOW_SECONDS * 2 ** (state.consecutive_429 - 2), MAX_QUARANTINE_SECONDS)
+                state.quarantined_until = max(state.window_start + QUOTA_WINDOW_SECONDS, now + penalty, now + 1)
+            elif ok:
+                state.consecutive_429 = 0
+            else:
+                state.errors += 1
+
+    def stats(self):
+        """Per-key utilisation with masked keys, for display."""
+        with self._lock:
+            now = time.time()
+            rows = []
+            for state in self._states.values():
+                rows.append({
+                    "key": f"{state.key[:6]}…{state.key[-4:]}",
+                    "remaining": state.remaining(now),
+                    "budget": state.budget,
+                    "utilisation": round(state.used / state.budget, 2) if state.budget else 0.0,
+                    "requests": state.requests,
+                    "rate_limited": state.rate_limited,
+                    "errors": state.errors,
+                    "latency_ms": round(state.latency_ms, 1) if state.latency_ms is not None else None,
+                    "quarantined_for_s": max(0, round(state.quarantined_until - now)),
+                })
+            return rows
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_key_pool():
+    """Process-wide pool built from `GEMINI_API_KEYS`, or None when not configured."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            keys = [k.strip() for k in os.environ.get("GEMINI_API_KEYS", "").split(",") if k.strip()]
+            if keys:
+                _pool = KeyPool(keys, int(os.environ.get("GEMINI_KEY_RPM", "10")))
+        return _pool
@@ -0,0 +1,320 @@
+# services/llm_backend.py
+
+"""Pluggable model backend behind `GeminiClient`.
+`METAMORPHOSIS_LLM_BACKEND` selects the mode:
+
+- `live` (default): real Gemini calls.
+- `record`: real calls, and every prompt, response and latency is appended
+  to `METAMORPHOSIS_LLM_RECORDING` (JSONL, default `data/llm_recording.jsonl`).
+- `replay` / `mock`: no network.  Recorded responses are replayed with their
+  recorded latency (scaled by `MOCK_LLM_LATENCY_SCALE`); prompts that were
+  never recorded get a deterministic mock response that the app's parsers
+  accept (Mermaid, JSON schemas, translation segments).
+
+Mock latency comes from `MOCK_LLM_LATENCY_MS` (`800` or a `200-1500` range)
+and errors are injected with `MOCK_LLM_ERRORS`, e.g. `429:0.05,500:0.01`
+(status:probability).  `MOCK_LLM_SEED` makes latency and errors repeatable.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from google.api_core import exceptions
+
+MODE = os.environ.get("METAMORPHOSIS_LLM_BACKEND", "live").lower()
+RECORDING_PATH = os.environ.get("METAMORPHOSIS_LLM_RECORDING", os.path.join("data", "llm_recording.jsonl"))
+
+ERROR_TYPES = {
+    "429": exceptions.ResourceExhausted,
+    "500": exceptions.InternalServerError,
+    "503": exceptions.ServiceUnavailable,
+    "504": exceptions.DeadlineExceeded,
+}
+
+# One low-level client per API key. Binding the key per client (instead of the
+# global `genai.configure`) keeps concurrent sessions with different keys apart.
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client_for(api_key):
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        return _clients[api_key]
+
+
+def request_key(model_name, contents, generation_config=None):
+    """Stable hash identifying a request for recording and replay."""
+    config = json.dumps(generation_config, sort_keys=True, default=str) if generation_config else ""
+    raw = f"{model_name}\n{config}\n{contents if isinstance(contents, str) else repr(contents)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def parse_latency(spec):
+    """(low, high) milliseconds from `800` or `200-1500`."""
+    low, _, high = str(spec).partition("-")
+    return float(low), float(high or low)
+
+
+def parse_errors(spec):
+    """{status: probability} from `429:0.05,500:0.01`."""
+    errors = {}
+    for item in filter(None, (part.strip() for part in str(spec).split(","))):
+        status, _, probability = item.partition(":")
+        if status not in ERROR_TYPES:
+            raise ValueError(f"Unknown mock error status {status!r}; use one of {sorted(ERROR_TYPES)}")
+        errors[status] = float(probability or 1.0)
+    return errors
+
+
+class _Usage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = 0
+
+
+class _Response:
+    """Minimal stand-in for a `GenerateContentResponse`."""
+
+    def __init__(self, text, prompt=""):
+        self.text = text
+        self.usage_metadata = _Usage(len(prompt) // 4, len(text) // 4)
+
+
+# ---------------------------------------------------------------------------
+# Deterministic mock responses
+# ---------------------------------------------------------------------------
+
+def _example(schema, seed):
+    """Smallest value matching a (lower-case) JSON response schema."""
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][seed % len(schema["enum"])]
+    if kind == "object":
+        return {name: _example(sub, seed + i) for i, (name, sub) in enumerate(schema.get("properties", {}).items())}
+    if kind == "array":
+        return [_example(schema.get("items", {}), seed + i) for i in range(3)]
+    if kind in ("integer", "number"):
+        return seed % 10
+    if kind == "boolean":
+        return seed % 2 == 0
+    return f"mock-{seed % 1000}"
+
+
+def mock_text(prompt, generation_config=None):
+    """Deterministic response text for `prompt` that downstream parsers accept."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    seed = int(digest[:8], 16)
+    schema = (generation_config or {}).get("response_schema")
+    if schema:
+        return json.dumps(_example(schema, seed))
+    segments = re.findall(r"^\[\[SEG (\d+)\]\]\n(.*?)(?=\n\n\[\[SEG \d+\]\]\n|\Z)", prompt, re.MULTILINE | re.DOTALL)
+    if segments:
+        return "\n\n".join(f"[[SEG {n}]]\n[mock] {text}" for n, text in segments)
+    diagram_set = re.search(r"^Diagrams to generate \(in this order\): (.+)$", prompt, re.MULTILINE)
+    if diagram_set:
+        return "\n\n".join(
+            f"### {kind}\n```mermaid\nflowchart TD\n    A[{kind}] --> B[Step {digest[:6]}]\n```"
+            for kind in diagram_set.group(1).split(", ")
+        )
+    if "Mermaid" in prompt:
+        return f"```mermaid\nflowchart TD\n    A[Start] --> B[Step {digest[:6]}]\n    B --> C[End]\n```"
+    if "Write ONLY the complete contents of" in prompt:
+        path = re.search(r"contents of `([^`]+)`", prompt).group(1)
+        return f"```\n# {path} (mock {digest[:8]})\n```"
+    words = " ".join(f"lorem{digest[i:i + 2]}" for i in range(0, 40, 2))
+    return f"# Mock response {digest[:8]}\n\n{words}\n"
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class LiveBackend:
+    mode = "live"
+
+    def model(self, api_key, model_name, cached_content=None):
+        """
+        A model bound to `api_key`, answering with the server-side cached
+        content named `cached_content` as its context when given.
+        """
+        model = genai.GenerativeModel(model_name)
+        if api_key:
+            model._client = _client_for(api_key)
+        if cached_content:
+            # What `GenerativeModel.from_cached_content` sets, without its extra
+            # lookup of the cache on the default (key-less) client
+            model._cached_content = cached_content
+        return model
+
+    def stats(self):
+        return {"mode": self.mode}
+
+
+class _RecordingModel:
+    def __init__(self, backend, model, model_name):
+        self._backend = backend
+        self._model = model
+        self.model_name = model_name
+
+    def generate_content(self, contents, stream=False, generation_config=None, **kwargs):
+        started = time.perf_counter()
+        if not stream:
+            response = self._model.generate_content(contents, generation_config=generation_config, **kwargs)
+            self._backend.record(self.model_name, contents, generation_config, response.text,
+                                 (time.perf_counter() - started) * 1000)
+            return response
+        return self._stream(contents, generation_config, started, kwargs)
+
+    def _stream(self, contents, generation_config, started, kwargs):
+        parts, first_token_ms = [], None
+        for chunk in self._model.generate_content(contents, stream=True, generation_config=generation_config, **kwargs):
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - started) * 1000
+            parts.append(getattr(chunk, "text", ""))
+            yield chunk
+        self._backend.record(self.model_name, contents, generation_config, "".join(parts),
+                             (time.perf_counter() - started) * 1000, first_token_ms)
+
+
+class RecordBackend(LiveBackend):
+    mode = "record"
+
+    def __init__(self, path=RECORDING_PATH):
+        self.path = path
+        self.recorded = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def model(self, api_key, model_name, cached_content=None):
+        return _RecordingModel(self, super().model(api_key, model_name, cached_content), model_name)
+
+    def record(self, model_name, contents, generation_config, text, latency_ms, first_token_ms=None):
+        entry = {
+            "key": request_key(model_name, contents, generation_config),
+            "model": model_name,
+            "prompt": contents if isinstance(contents, str) else repr(contents),
+            "response": text,
+            "latency_ms": round(latency_ms, 1),
+            "first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.recorded += 1
+
+    def stats(self):
+        return {"mode": self.mode, "recording": self.path, "recorded": self.recorded}
+
+
+class _MockModel:
+    def __init__(self, backend, model_name):
+        self._backend = backend
+        self.model_name = model_name
+
+    def generate_content(self, contents, stream=False, generation_config=None, request_options=None, **kwargs):
+        prompt = contents if isinstance(contents, str) else repr(contents)
+        text, latency_ms, first_token_ms = self._backend.respond(self.model_name, prompt, generation_config)
+        timeout = (request_options or {}).get("timeout")
+        if timeout and latency_ms / 1000 > timeout:
+            time.sleep(timeout)
+            raise exceptions.DeadlineExceeded(f"Mock call exceeded the {timeout}s deadline")
+        if not stream:
+            time.sleep(latency_ms / 1000)
+            return _Response(text, prompt)
+        return self._stream(text, prompt, latency_ms, first_token_ms)
+
+    @staticmethod
+    def _stream(text, prompt, latency_ms, first_token_ms):
+        chunks = [text[i:i + 200] for i in range(0, len(text), 200)] or [""]
+        first_token_ms = min(first_token_ms or latency_ms * 0.2, latency_ms)
+        time.sleep(first_token_ms / 1000)
+        gap = (latency_ms - first_token_ms) / 1000 / max(1, len(chunks) - 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(gap)
+            yield _Response(chunk, prompt if i == len(chunks) - 1 else "")
+
+
+class MockBackend:
+    """Replays recorded responses; anything not recorded gets a deterministic mock response."""
+
+    mode = "mock"
+
+    def __init__(self, path=RECORDING_PATH, latency_ms=None, errors=None, seed=None, latency_scale=None):
+        self.latency = parse_latency(latency_ms if latency_ms is not None else os.environ.get("MOCK_LLM_LATENCY_MS", "800"))
+        self.errors = parse_errors(errors if errors is not None else os.environ.get("MOCK_LLM_ERRORS", ""))
+        self.latency_scale = float(latency_scale if latency_scale is not None else os.environ.get("MOCK_LLM_LATENCY_SCALE", "1"))
+        seed = seed if seed is not None else os.environ.get("MOCK_LLM_SEED")
+        self._rng = random.Random(int(seed) if seed is not None else None)
+        self._lock = threading.Lock()
+        self._recordings = self._load(path)
+        self._replay_index = {}
+        self._stats = {"calls": 0, "replayed": 0, "mocked": 0, "injected_errors": 0}
+
+    @staticmethod
+    def _load(path):
+        recordings = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        recordings.setdefault(entry["key"], []).append(entry)
+        return recordings
+
+    def model(self, api_key, model_name, cached_content=None):
+        # Only server-side caches have handles, and mock calls never create one
+        return _MockModel(self, model_name)
+
+    def respond(self, model_name, prompt, generation_config=None):
+        """(text, latency_ms, first_token_ms) for one call; raises injected errors."""
+        with self._lock:
+            self._stats["calls"] += 1
+            for status, probability in self.errors.items():
+                if self._rng.random() < probability:
+                    self._stats["injected_errors"] += 1
+                    raise ERROR_TYPES[status]("Injected mock error")
+            entries = self._recordings.get(request_key(model_name, prompt, generation_config))
+            if entries:
+                # Several recordings of the same prompt are replayed round-robin
+                index = self._replay_index.get(entries[0]["key"], 0)
+                self._replay_index[entries[0]["key"]] = index + 1
+                entry = entries[index % len(entries)]
+                self._stats["replayed"] += 1
+                return (entry["response"], entry["latency_ms"] * self.latency_scale,
+                        (entry.get("first_token_ms") or 0) * self.latency_scale or None)
+            self._stats["mocked"] += 1
+            latency = self._rng.uniform(*self.latency) * self.latency_scale
+        return mock_text(prompt, generation_config), latency, None
+
+    def stats(self):
+        with self._lock:
+            return {"mode": self.mode, "recordings": sum(len(v) for v in self._recordings.values()), **self._stats}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_llm_backend():
+    """Process-wide backend selected by `METAMORPHOSIS_LLM_BACKEND`."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if MODE == "record":
+                _backend = RecordBackend()
+            elif MODE in ("replay", "mock"):
+                _backend = MockBackend()
+            else:
+                _backend = LiveBackend()
+        return _backend
@@ -0,0 +1,174 @@
+# services/long_document.py
+
+"""Outline-first generation of long documents.
+A fast planning call returns the document title and a section outline (JSON
+structured output); the sections are then written concurrently on a bounded
+pool, each with the full outline and details as shared context, and assembled
+with a generated table of contents and metadata block.  A long BRD or manual
+no longer has to fit into, or wait for, one monolithic response.
+
+`LONG_DOC_CONCURRENCY` (default 4) bounds parallel section generations and
+`LONG_DOC_MAX_SECTIONS` (default 12) caps the outline size.
+"""
+
+import json
+import os
+import re
+
+from services import prompts
+from services.errors import ErrorText
+from services.gemini_client import GeminiClient
+from services.jobs import fan_out
+from services.parsing import parse_json_response
+
+LONG_DOC_CONCURRENCY = int(os.environ.get("LONG_DOC_CONCURRENCY", "4"))
+MAX_SECTIONS = int(os.environ.get("LONG_DOC_MAX_SECTIONS", "12"))
+PENDING_TEXT = "_⏳ Writing this section..._"
+FAILED_TEXT = "_This section could not be written._"
+
+OUTLINE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "sections": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "heading": {"type": "string"},
+                    "summary": {"type": "string"},
+                },
+                "required": ["heading", "summary"],
+            },
+        },
+    },
+    "required": ["title", "sections"],
+}
+OUTLINE_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": OUTLINE_SCHEMA}
+
+
+def parse_outline(text):
+    """(title, [{"heading", "summary"}]) from the outline response; raises ValueError if unusable."""
+    data = parse_json_response(text, "Document outline")
+    sections, seen = [], set()
+    for entry in data.get("sections", []):
+        heading = re.sub(r"^[#\s\d.]+", "", str(entry.get("heading", ""))).strip()
+        if heading and heading.lower() not in seen and heading.lower() != "table of contents":
+            seen.add(heading.lower())
+            sections.append({"heading": heading, "summary": str(entry.get("summary", "")).strip()})
+    if not sections:
+        raise ValueError("Document outline contains no sections.")
+    return str(data.get("title") or "").strip() or "Untitled Document", sections[:MAX_SECTIONS]
+
+
+def clean_section(text):
+    """Section body without a code fence around it or a repeated heading at the top."""
+    text = text.strip()
+    fenced = re.match(r"^```(?:markdown|md)?\n(.*?)\n?```$", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1).strip()
+    return re.sub(r"\A#{1,2} [^\n]*\n+", "", text).strip()
+
+
+def anchor(heading):
+    """GitHub-style Markdown anchor for a heading."""
+    return re.sub(r"[^\w\- ]", "", heading.lower()).strip().replace(" ", "-")
+
+
+def assemble(title, outline, bodies, include_toc=True, author="", version="", failed=()):
+    """
+    Final Markdown: title, optional metadata, optional TOC, then each section
+    under a numbered `##` heading.  Sections missing from `bodies` are shown as
+    still being written, or as not written if their index is in `failed`.
+    """
+    parts = [f"# {title}"]
+    meta = [f"**Author:** {author}" if author else "", f"**Version:** {version}" if version else ""]
+    if any(meta):
+        parts.append("  \n".join(m for m in meta if m))
+    headings = [f"{n}. {entry['heading']}" for n, entry in enumerate(outline, 1)]
+    if include_toc:
+        parts.append("## Table of Contents\n\n" + "\n".join(f"- [{h}](#{anchor(h)})" for h in headings))
+    for i, heading in enumerate(headings):
+        parts.append(f"## {heading}\n\n{bodies.get(i, FAILED_TEXT if i in failed else PENDING_TEXT)}")
+    return "\n\n".join(parts) + "\n"
+
+
+def dump_result(result):
+    """JSON text of a `generate_long_document` result, e.g. to keep it in the blob store."""
+    return json.dumps(result, ensure_ascii=False)
+
+
+def load_result(text):
+    """Inverse of `dump_result`: restores the integer section indexes and (heading, error message) pairs."""
+    result = json.loads(text)
+    result["bodies"] = {int(i): body for i, body in result["bodies"].items()}
+    result["errors"] = {int(i): (heading, ErrorText(message)) for i, (heading, message) in result["errors"].items()}
+    return result
+
+
+def generate_long_document(client, details, doc_type="BRD", style="Professional", language="English",
+                           include_toc=True, include_meta=False, author="", version="1.0", context_text=None,
+                           concurrency=LONG_DOC_CONCURRENCY, on_progress=None, on_partial=None, check=None,
+                           previous=None):
+    """
+    Outline, then write all sections concurrently.  `on_progress(done, total,
+    heading)` is called as sections finish, `on_partial(markdown)` with the
+    document assembled so far, and `check()` (e.g. `Job.check`) before each
+    section starts.  Pass an earlier result as `previous` to keep its outline
+    and written sections and only retry the failed ones.
+
+    Returns {"title", "outline", "bodies", "content", "errors": {index:
+    (heading, message)}} or an error message string if the outline failed.
+    Failed sections are left out of `bodies` and marked as not written in
+    `content`, so the rest of the document stays usable.
+    """
+    # The uploaded context is the shared, cacheable prefix of every call
+    context_prefix, _ = prompts.build_document_prompt_parts(details, doc_type, style, language, context_text=context_text)
+    if previous:
+        title, outline, bodies = previous["title"], previous["outline"], dict(previous["bodies"])
+    else:
+        plan = client.generate_content(
+            prompts.build_document_outline_prompt(details, doc_type, style, language, MAX_SECTIONS),
+            route="document_outline", generation_config=OUTLINE_GENERATION_CONFIG, cached_prefix=context_prefix,
+        )
+        if GeminiClient.is_error_response(plan):
+            return plan
+        try:
+            title, outline = parse_outline(plan)
+        except ValueError as e:
+            return ErrorText(f"❌ {e}")
+        bodies = {}
+    if not include_meta:
+        author = version = ""
+
+    def build(index):
+        return client.generate_content(
+            prompts.build_document_section_prompt(details, outline, index, doc_type, style, language),
+            route="document", cached_prefix=context_prefix,
+        )
+
+    todo = [i for i in range(len(outline)) if i not in bodies]
+    errors = {}
+    if on_progress:
+        on_progress(len(bodies), len(outline), None)
+    if on_partial:
+        on_partial(assemble(title, outline, bodies, include_toc, author, version))
+
+    def collect(index, res):
+        if GeminiClient.is_error_response(res):
+            errors[index] = (outline[index]["heading"], res)
+        else:
+            bodies[index] = clean_section(res)
+        if on_progress:
+            on_progress(len(bodies) + len(errors), len(outline), outline[index]["heading"])
+        if on_partial:
+            on_partial(assemble(title, outline, bodies, include_toc, author, version, errors))
+
+    fan_out(build, todo, concurrency, on_result=collect, check=check)
+    return {
+        "title": title,
+        "outline": outline,
+        "bodies": bodies,
+        "content": assemble(title, outline, bodies, include_toc, author, version, errors),
+        "errors": errors,
+    }
@@ -0,0 +1,95 @@
+# services/metrics.py
+
+"""In-process latency and error metrics.
+`LatencyStats` keeps a rolling window of recent samples for one operation;
+`MetricsRegistry` groups them by name (endpoint, route, ...).
+"""
+
+import math
+import threading
+from collections import deque
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a sequence of numbers (0 when empty)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class LatencyStats:
+    def __init__(self, window=500):
+        """Keep the last `window` samples plus lifetime counters."""
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+
+    def record(self, elapsed_ms, ok=True):
+        """Record one call duration in milliseconds."""
+        with self._lock:
+            self._samples.append(elapsed_ms)
+            self._outcomes.append(ok)
+            self.count += 1
+            self.total_ms += elapsed_ms
+            if not ok:
+                self.errors += 1
+
+    def percentile(self, pct):
+        with self._lock:
+            samples = list(self._samples)
+        return percentile(samples, pct)
+
+    def error_rate(self):
+        """Error rate over the rolling window."""
+        with self._lock:
+            outcomes = list(self._outcomes)
+        if not outcomes:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+
+    def window_size(self):
+        with self._lock:
+            return len(self._samples)
+
+    def snapshot(self):
+        with self._lock:
+            samples = list(self._samples)
+            outcomes = list(self._outcomes)
+            count, errors, total_ms = self.count, self.errors, self.total_ms
+        return {
+            "count": count,
+            "errors": errors,
+            "error_rate": round(outcomes.count(False) / len(outcomes), 4) if outcomes else 0.0,
+            "avg_ms": round(total_ms / count, 2) if count else 0.0,
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self._window = window
+        self._stats = {}
+
+    def get(self, name):
+        """Return (creating if needed) the stats object for `name`."""
+        with self._lock:
+            if name not in self._stats:
+                self._stats[name] = LatencyStats(self._window)
+            return self._stats[name]
+
+    def record(self, name, elapsed_ms, ok=True):
+        self.get(name).record(elapsed_ms, ok)
+
+    def snapshot(self):
+        with self._lock:
+            items = list(self._stats.items())
+        return {name: stats.snapshot() for name, stats in sorted(items)}
+
@@ -0,0 +1,135 @@
+# services/model_router.py
+
+"""Latency-aware model routing.
+`ROUTES` maps each feature / call type to a model tier.  Before every call
+the router checks the recent health of the tier's model; when its p95
+latency or error rate crosses the tier's threshold the call falls back to
+the next faster tier.  A degraded model still gets an occasional probe
+request so it can recover once the upstream settles.
+
+Every feature defaults to the flash tiers; the pro model is opt-in with
+`MODEL_ROUTES`, e.g. `document=capable,code=capable`, which is layered over
+`ROUTES`.
+"""
+
+import os
+import threading
+import time
+
+from services.metrics import MetricsRegistry
+
+MODEL_TIERS = {
+    "capable": "gemini-2.5-pro",
+    "standard": "gemini-2.5-flash",
+    "fast": "gemini-2.5-flash-lite",
+}
+TIER_ORDER = ["capable", "standard", "fast"]  # Fallback walks towards the end
+
+ROUTES = {
+    "default": "standard",
+    "verify": "fast",
+    "prompt_refiner": "standard",
+    "document": "standard",
+    "document_outline": "fast",
+    "diagram": "standard",
+    "diagram_fix": "fast",
+    "code": "standard",
+    "code_tests": "standard",
+    "project_plan": "fast",
+    "summarize": "standard",
+    "translate": "standard",
+    "email": "standard",
+    "analyze": "standard",
+    "quiz": "standard",
+}
+
+# Fall back when a tier's recent p95 latency (ms) or error rate exceeds these
+P95_THRESHOLD_MS = {"capable": 60000, "standard": 30000, "fast": 15000}
+ERROR_RATE_THRESHOLD = 0.3
+MIN_SAMPLES = 5
+PROBE_INTERVAL_SECONDS = 30
+
+
+def parse_routes(spec, defaults=ROUTES):
+    """Routes from a `route=tier,...` spec layered over `defaults`."""
+    routes = dict(defaults)
+    for item in (spec or "").split(","):
+        route, _, tier = item.partition("=")
+        route, tier = route.strip(), tier.strip().lower()
+        if not route or not tier:
+            continue
+        if tier not in MODEL_TIERS:
+            raise ValueError(f"Unknown model tier {tier!r} for route {route!r}; use one of {TIER_ORDER}")
+        routes[route] = tier
+    return routes
+
+
+class ModelRouter:
+    def __init__(self, routes=None, tiers=None, window=50):
+        self.routes = dict(ROUTES if routes is None else routes)
+        self.tiers = dict(MODEL_TIERS if tiers is None else tiers)
+        self.metrics = MetricsRegistry(window=window)
+        self._last_probe = {}
+        self._lock = threading.Lock()
+
+    def choose(self, route=None):
+        """Model name for `route`, falling back to faster tiers while the preferred one is degraded."""
+        tier = self.routes.get(route or "default", self.routes["default"])
+        candidates = TIER_ORDER[TIER_ORDER.index(tier):]
+        for candidate in candidates:
+            if self.is_healthy(candidate) or self._should_probe(candidate):
+                return self.tiers[candidate]
+        return self.tiers[candidates[-1]]
+
+    def record(self, route, model_name, elapsed_ms, ok=True):
+        """Record one call; feeds both the per-model health and the per-route stats."""
+        self.metrics.record(f"model:{model_name}", elapsed_ms, ok)
+        self.metrics.record(f"route:{route or 'default'}:{model_name}", elapsed_ms, ok)
+
+    def faster_model(self, model_name):
+        """Model of the next faster tier (the same model if already the fastest)."""
+        for i, tier in enumerate(TIER_ORDER):
+            if self.tiers[tier] == model_name and i + 1 < len(TIER_ORDER):
+                return self.tiers[TIER_ORDER[i + 1]]
+        return model_name
+
+    def route_stats(self, route, model_name):
+        """Rolling latency stats for one (route, model) pair."""
+        return self.metrics.get(f"route:{route or 'default'}:{model_name}")
+
+    def is_healthy(self, tier):
+        stats = self.metrics.get(f"model:{self.tiers[tier]}")
+        if stats.window_size() < MIN_SAMPLES:
+            return True
+        return stats.percentile(95) <= P95_THRESHOLD_MS[tier] and stats.error_rate() <= ERROR_RATE_THRESHOLD
+
+    def _should_probe(self, tier):
+        """Let one request through to a degraded tier every PROBE_INTERVAL_SECONDS."""
+        with self._lock:
+            now = time.time()
+            if now - self._last_probe.get(tier, 0.0) >= PROBE_INTERVAL_SECONDS:
+                self._last_probe[tier] = now
+                return True
+            return False
+
+    def stats(self):
+        """Per-route and per-model latency stats plus the current health of each tier."""
+        snapshot = self.metrics.snapshot()
+        return {
+            "tiers": {tier: {"model": model, "healthy": self.is_healthy(tier)} for tier, model in self.tiers.items()},
+            "models": {k.split(":", 1)[1]: v for k, v in snapshot.items() if k.startswith("model:")},
+            "routes": {k.split(":", 1)[1]: v for k, v in snapshot.items() if k.startswith("route:")},
+        }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Process-wide router shared by all sessions."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter(parse_routes(os.environ.get("MODEL_ROUTES")))
+        return _router
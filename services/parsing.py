@@ -0,0 +1,15 @@
+# services/parsing.py
+
+"""Parsing helpers for structured model output shared by the generators."""
+
+import json
+import re
+
+
+def parse_json_response(text, what="Response"):
+    """Object from a structured-output response, with or without a ```json fence. Raises ValueError."""
+    match = re.search(r"```(?:json)?\s*(.*?)\s*```", text, re.DOTALL)
+    try:
+        return json.loads(match.group(1) if match else text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{what} is not valid JSON: {e}")
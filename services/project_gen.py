@@ -0,0 +1,131 @@
+# services/project_gen.py
+
+"""Multi-file project generation for the Code Generator.
+A cheap planning call returns a file manifest (JSON structured output); the
+files are then generated concurrently on a bounded pool, each with the whole
+manifest as shared context, and packed into a ZIP.  Wall time is roughly the
+planning call plus the slowest file instead of the sum of all files.
+
+`PROJECT_CONCURRENCY` (default 4) bounds parallel file generations and
+`PROJECT_MAX_FILES` (default 20) caps the manifest size.
+"""
+
+import io
+import os
+import posixpath
+import re
+import zipfile
+
+from services import prompts
+from services.jobs import fan_out
+from services.parsing import parse_json_response
+from services.errors import ErrorText
+from services.gemini_client import GeminiClient
+
+PROJECT_CONCURRENCY = int(os.environ.get("PROJECT_CONCURRENCY", "4"))
+MAX_FILES = int(os.environ.get("PROJECT_MAX_FILES", "20"))
+
+MANIFEST_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "files": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "purpose": {"type": "string"},
+                },
+                "required": ["path", "purpose"],
+            },
+        },
+    },
+    "required": ["name", "files"],
+}
+
+MANIFEST_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": MANIFEST_SCHEMA}
+
+
+def safe_path(path):
+    """Normalized relative POSIX path, or None if it is empty or escapes the project root."""
+    path = posixpath.normpath(path.strip().replace("\\", "/")).lstrip("/")
+    if not path or path == "." or path.startswith("..") or ":" in path:
+        return None
+    return path
+
+
+def parse_manifest(text):
+    """(project name, [{"path", "purpose"}]) from the planning response. Raises ValueError if unusable."""
+    data = parse_json_response(text, "Project plan")
+    files, seen = [], set()
+    for entry in data.get("files", []):
+        path = safe_path(str(entry.get("path", "")))
+        if path and path not in seen:
+            seen.add(path)
+            files.append({"path": path, "purpose": str(entry.get("purpose", "")).strip()})
+    if not files:
+        raise ValueError("Project plan contains no files.")
+    name = re.sub(r"[^\w.-]+", "-", str(data.get("name") or "project")).strip("-") or "project"
+    return name, files[:MAX_FILES]
+
+
+def strip_code_fence(text):
+    """File content without the surrounding ``` fence the model usually adds."""
+    match = re.match(r"^\s*```[^\n]*\n(.*?)\n?```\s*$", text, re.DOTALL)
+    return (match.group(1) if match else text.strip()) + "\n"
+
+
+def generate_project(client, requirements, language="Python", framework="None", style="OOP",
+                     include_docs=False, include_types=False, include_tests=False,
+                     concurrency=PROJECT_CONCURRENCY, on_progress=None, check=None):
+    """
+    Plan and generate a project. `on_progress(done, total, path)` is called as
+    files finish and `check()` (e.g. `Job.check`) before each file starts.
+    Returns {"name", "files": {path: content}, "errors": {path: message}} or an
+    error message string if planning failed.
+    """
+    plan = client.generate_content(
+        prompts.build_project_plan_prompt(requirements, language, framework, style, include_tests, MAX_FILES),
+        route="project_plan", generation_config=MANIFEST_GENERATION_CONFIG,
+    )
+    if GeminiClient.is_error_response(plan):
+        return plan
+    try:
+        name, manifest = parse_manifest(plan)
+    except ValueError as e:
+        return ErrorText(f"❌ {e}")
+
+    def build(path):
+        return client.generate_content(
+            prompts.build_project_file_prompt(
+                requirements, manifest, path, language, framework, style, include_docs, include_types,
+            ),
+            route="code",
+        )
+
+    files, errors = {}, {}
+
+    def collect(path, res):
+        if GeminiClient.is_error_response(res):
+            errors[path] = res
+        else:
+            files[path] = strip_code_fence(res)
+        if on_progress:
+            on_progress(len(files) + len(errors), len(manifest), path)
+
+    if on_progress:
+        on_progress(0, len(manifest), None)
+    fan_out(build, [entry["path"] for entry in manifest], concurrency, on_result=collect, check=check)
+    # Keep the planned order rather than completion order
+    ordered = {entry["path"]: files[entry["path"]] for entry in manifest if entry["path"] in files}
+    return {"name": name, "files": ordered, "errors": errors}
+
+
+def build_zip(name, files):
+    """ZIP archive bytes with every file under a `name/` folder."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for path, content in files.items():
+            archive.writestr(f"{name}/{path}", content)
+    return buffer.getvalue()
@@ -0,0 +1,235 @@
+# services/prompt_cache.py
+
+"""Duplicate response cache for `GeminiClient`.
+Prompts are canonicalized (Unicode NFKC, case-folded, punctuation and
+whitespace collapsed) and split into the instruction line, which carries the
+feature's options and must match exactly, and the body (the user's text).
+Entries are scoped to their owner (the user's key or session), so a response
+is only ever reused for the user it was generated for.
+
+By default a response is reused only when the canonical body is identical,
+i.e. the requests differ in nothing but whitespace, casing or punctuation.
+Near matching is opt-in per route: with a threshold below 1, bodies are
+compared with a 64-bit SimHash over word shingles and a cached response is
+reused when the similarity clears the threshold and every number in the body
+is identical.  SimHash similarity does not measure meaning: a few swapped
+words ("approved" / "rejected", one name for another) stay above 0.9, so near
+matching can answer a request with the response to a text that says something
+else.  Candidates are found through 8 bands of 8 bits, so any match within 7
+differing bits (similarity >= 0.89) is found without a full scan.
+
+Caching is opt-in per route (`services.model_router.ROUTES` names); creative
+features are left out so regenerating gives a fresh answer, and so is
+`analyze`, whose grammar check is about exactly the casing and punctuation
+that canonicalization removes.  Override with
+`PROMPT_CACHE_THRESHOLDS`, e.g. `summarize=0.95,email=off,quiz=1`, where 1
+means exact canonical matches only.  `PROMPT_CACHE=0` disables the cache,
+`PROMPT_CACHE_ENTRIES` (default 2000) bounds it and `PROMPT_CACHE_TTL`
+(seconds, default 3600) expires entries.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+ENABLED = os.environ.get("PROMPT_CACHE", "1").lower() not in ("0", "false", "off", "no")
+MAX_ENTRIES = int(os.environ.get("PROMPT_CACHE_ENTRIES", "2000"))
+TTL_SECONDS = float(os.environ.get("PROMPT_CACHE_TTL", "3600"))
+
+# Routes not listed here are never cached; 1.0 = exact canonical matches only
+DEFAULT_THRESHOLDS = {
+    "summarize": 1.0,
+    "email": 1.0,
+}
+
+BITS = 64
+BANDS = 8
+SHINGLE = 3
+MIN_TOKENS = 8  # Shorter bodies only match exactly; SimHash is too coarse for a few words
+
+_NUMBER = re.compile(r"\b\d+\b")
+
+
+def parse_thresholds(spec, defaults=DEFAULT_THRESHOLDS):
+    """Route thresholds from a `route=value,...` spec layered over `defaults`; `off`/`0` disables a route."""
+    thresholds = dict(defaults)
+    for item in (spec or "").split(","):
+        route, _, value = item.partition("=")
+        route, value = route.strip(), value.strip().lower()
+        if not route or not value:
+            continue
+        if value in ("off", "no", "false", "0"):
+            thresholds.pop(route, None)
+        else:
+            thresholds[route] = min(1.0, max(0.0, float(value)))
+    return thresholds
+
+
+def canonicalize(text):
+    """Case-folded NFKC text with punctuation removed and whitespace collapsed."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return " ".join(text.split())
+
+
+def _hash64(token):
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(tokens):
+    """64-bit SimHash of the word shingles of `tokens`."""
+    shingles = [" ".join(tokens[i:i + SHINGLE]) for i in range(max(1, len(tokens) - SHINGLE + 1))]
+    counts = [0] * BITS
+    for shingle in shingles:
+        h = _hash64(shingle)
+        for bit in range(BITS):
+            counts[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(BITS) if counts[bit] > 0)
+
+
+def similarity(a, b):
+    return 1 - bin(a ^ b).count("1") / BITS
+
+
+def _bands(fingerprint):
+    width = BITS // BANDS
+    return [(i, fingerprint >> (i * width) & ((1 << width) - 1)) for i in range(BANDS)]
+
+
+class _Entry:
+    __slots__ = ("scope", "fingerprint", "numbers", "text", "created", "hits")
+
+    def __init__(self, scope, fingerprint, numbers, text):
+        self.scope = scope
+        self.fingerprint = fingerprint
+        self.numbers = numbers
+        self.text = text
+        self.created = time.time()
+        self.hits = 0
+
+
+class PromptCache:
+    def __init__(self, thresholds=None, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.thresholds = dict(DEFAULT_THRESHOLDS if thresholds is None else thresholds)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # exact key -> _Entry, least recently used first
+        self._bands = {}  # (scope, band, value) -> set of exact keys
+        self._lock = threading.Lock()
+        self._stats = {}  # route -> counters
+
+    def threshold(self, route):
+        """Similarity needed to reuse a response for `route`, or None if the route is not cached."""
+        return self.thresholds.get(route or "default")
+
+    def _parts(self, route, prompt, cached_prefix=None, generation_config=None, owner=None):
+        """(scope, exact key, fingerprint or None, numbers) for one request."""
+        head, _, body = ((cached_prefix or "") + prompt).partition("\n")
+        scope = hashlib.sha256(
+            f"{owner}\n{route}\n{canonicalize(head)}\n{generation_config!r}".encode("utf-8")
+        ).hexdigest()
+        canonical = canonicalize(body)
+        tokens = canonical.split()
+        exact = hashlib.sha256(f"{scope}\n{canonical}".encode("utf-8")).hexdigest()
+        fingerprint = simhash(tokens) if len(tokens) >= MIN_TOKENS else None
+        return scope, exact, fingerprint, tuple(_NUMBER.findall(canonical))
+
+    def get(self, route, prompt, cached_prefix=None, generation_config=None, owner=None):
+        """Cached response text for a (near-)duplicate request by `owner`, or None."""
+        threshold = self.threshold(route)
+        if threshold is None:
+            return None
+        scope, exact, fingerprint, numbers = self._parts(route, prompt, cached_prefix, generation_config, owner)
+        now = time.time()
+        with self._lock:
+            entry = self._live(exact, now)
+            kind = "exact" if entry else None
+            if entry is None and fingerprint is not None and threshold < 1:
+                best, best_score = None, threshold
+                for band in _bands(fingerprint):
+                    for key in tuple(self._bands.get((scope,) + band, ())):
+                        candidate = self._live(key, now)
+                        if candidate is None or candidate.numbers != numbers or candidate.fingerprint is None:
+                            continue
+                        score = similarity(fingerprint, candidate.fingerprint)
+                        if score >= best_score:
+                            best, best_score = (key, candidate), score
+                if best:
+                    exact, entry = best
+                    kind = "near"
+            stats = self._route_stats(route)
+            if entry is None:
+                stats["misses"] += 1
+                return None
+            entry.hits += 1
+            stats[f"{kind}_hits"] += 1
+            self._entries.move_to_end(exact)
+            return entry.text
+
+    def put(self, route, prompt, text, cached_prefix=None, generation_config=None, owner=None):
+        """Remember `owner`'s response for a request on a cached route."""
+        if self.threshold(route) is None:
+            return
+        scope, exact, fingerprint, numbers = self._parts(route, prompt, cached_prefix, generation_config, owner)
+        with self._lock:
+            self._drop(exact)
+            self._entries[exact] = _Entry(scope, fingerprint, numbers, text)
+            if fingerprint is not None:
+                for band in _bands(fingerprint):
+                    self._bands.setdefault((scope,) + band, set()).add(exact)
+            self._route_stats(route)["stored"] += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.created > self.ttl:
+            self._drop(key)
+            return None
+        return entry
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None or entry.fingerprint is None:
+            return
+        for band in _bands(entry.fingerprint):
+            keys = self._bands.get((entry.scope,) + band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[(entry.scope,) + band]
+
+    def _route_stats(self, route):
+        return self._stats.setdefault(route or "default", {"exact_hits": 0, "near_hits": 0, "misses": 0, "stored": 0})
+
+    def stats(self):
+        with self._lock:
+            routes = {route: dict(s) for route, s in self._stats.items()}
+            entries = len(self._entries)
+        hits = sum(s["exact_hits"] + s["near_hits"] for s in routes.values())
+        lookups = hits + sum(s["misses"] for s in routes.values())
+        return {
+            "entries": entries,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "thresholds": dict(self.thresholds),
+            "routes": routes,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prompt_cache():
+    """Process-wide prompt cache, or None when disabled with `PROMPT_CACHE=0`."""
+    global _cache
+    if not ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = PromptCache(parse_thresholds(os.environ.get("PROMPT_CACHE_THRESHOLDS")))
+        return _cache
@@ -0,0 +1,279 @@
+# services/prompts.py
+
+"""Prompt builders shared by the Streamlit tabs and the HTTP API.
+Each builder returns the full prompt string sent to `GeminiClient.generate_content`;
+the `*_parts` variants split off a stable prefix for context caching.
+"""
+
+import os
+
+# Uploaded context is cached across regenerations, so more of it can be kept
+DOCUMENT_CONTEXT_CHARS = int(os.environ.get("DOCUMENT_CONTEXT_CHARS", "20000"))
+
+
+def build_refiner_prompt(prompt, context="General", tone="Neutral", complexity=7):
+    """Prompt Refiner tab."""
+    sys_prompt = f"Refine prompt. Context: {context}. Tone: {tone}. Complexity: {complexity}/10."
+    return f"{sys_prompt}\n{prompt}"
+
+
+def build_document_prompt_parts(details, doc_type="BRD", style="Professional", language="English",
+                                include_toc=True, include_meta=False, author="", version="1.0",
+                                context_text=None):
+    """
+    Document Generator tab as (cached_prefix, prompt): the uploaded context comes
+    first so it can be served from the context cache across regenerations.
+    Uploaded context is truncated to DOCUMENT_CONTEXT_CHARS characters.
+    """
+    sys_prompt = f"Write {doc_type}. Style: {style}. Markdown format."
+
+    # Add language specification for Meeting Minutes
+    if doc_type == "Meeting Minutes":
+        sys_prompt += f" Language: {language}."
+
+    if include_toc:
+        sys_prompt += " Include TOC."
+    if include_meta:
+        sys_prompt += f" Author: {author}. Version: {version}."
+    prefix = None
+    if context_text:
+        prefix = f"CONTEXT FROM UPLOADED FILE:\n{context_text[:DOCUMENT_CONTEXT_CHARS]}\n\n"
+    return prefix, sys_prompt + "\n" + details
+
+
+def build_document_outline_prompt(details, doc_type="BRD", style="Professional", language="English", max_sections=12):
+    """Long-document mode: title and section outline only (see `services.long_document.OUTLINE_SCHEMA`)."""
+    sys_prompt = (
+        f"Plan the outline of a {doc_type}. Style: {style}. "
+        f"Return JSON only: the document title and at most {max_sections} top-level sections in reading order, "
+        "each with a heading and a one- or two-sentence summary of what it must cover. "
+        "Do not include a table of contents section. Do not write the sections."
+    )
+    if doc_type == "Meeting Minutes":
+        sys_prompt += f" Language: {language}."
+    return f"{sys_prompt}\n{details}"
+
+
+def build_document_section_prompt(details, outline, index, doc_type="BRD", style="Professional", language="English"):
+    """Long-document mode: the body of one section, with the whole outline as shared context."""
+    sections = "\n".join(f"{n}. {entry['heading']}: {entry['summary']}" for n, entry in enumerate(outline, 1))
+    section = outline[index]
+    sys_prompt = (
+        f"You are writing one section of a {doc_type}. Style: {style}. Markdown format. "
+        f"Write ONLY the body of section {index + 1}, \"{section['heading']}\", covering: {section['summary']} "
+        "Do not repeat the section heading or write other sections; use ### or deeper for sub-headings."
+    )
+    if doc_type == "Meeting Minutes":
+        sys_prompt += f" Language: {language}."
+    return f"{sys_prompt}\n\nDOCUMENT OUTLINE:\n{sections}\n\nDETAILS:\n{details}"
+
+
+def _diagram_rules(ref_date=None):
+    """Strict Mermaid rules shared by the single and multi-diagram prompts."""
+    if ref_date is None:
+        from datetime import datetime
+        ref_date = datetime.now().strftime('%Y-%m-%d')
+
+    # Optimised System Prompt based on Best Practices
+    return f"""You are a Mermaid diagram code generator with ZERO tolerance for syntax errors.
+
+## CRITICAL RULES - FOLLOW EVERY TIME:
+
+1. **Output Format**
+   - Generate ONLY valid Mermaid syntax
+   - Wrap code in ```mermaid fences
+   - Never add explanations inside the code block
+
+2. **Syntax Strictness**
+   - Node IDs: Use alphanumeric only (no spaces). Match case exactly throughout.
+   - Arrows:
+     * Flowchart: --> (solid), -.-> (dotted), ==> (thick)
+     * Sequence: ->> (solid), -->> (dotted), -x (cross)
+   - Style/Class: No spaces after commas: color:#000,stroke:#fff (NOT color: #000, stroke: #fff)
+   - Blocks: Always close with 'end' statement
+   - Comments: Use `%%` for comments. NEVER use `//` or `#`.
+
+3. **Diagram-Specific Rules (CRITICAL)**
+   - **Mindmap**:
+     * Use 2-space indentation strictly.
+     * ONE node per line.
+     * **ABSOLUTE RULE**: NO text allowed after the closing bracket/quote. (e.g. `Node("Text") EXTRA` is FORBIDDEN).
+     * **SPECIAL CHARACTERS**: If node text contains `(`, `)`, `[`, `]`, or `,`, you **MUST** wrap the text in double quotes.
+     * **CORRECT**: `    NodeID("Node Text")`
+     * **bAD**: `    NodeID(Node Text) ChildNode` (Child MUST be on next line with deeper indentation)
+   - **Gantt**:
+     * defined `dateFormat YYYY-MM-DD`
+     * DO NOT use the keyword `today` at start of line (e.g. `today 2023-01-01` is INVALID). Remove it.
+     * All dates must be absolute YYYY-MM-DD format. No relative dates like "next week".
+     * Every task MUST have a start date or happen `after` another task.
+   - **Flowchart**:
+     * Place every node definition on a NEW LINE.
+     * Do NOT put multiple nodes on one line like `A[Label] B[Label]`.
+     * Escape special characters in labels: `["Label (Text)"]`.
+     * **NO DANGLING ARROWS**: Every arrow `-->` MUST point to something. (e.g. `A -->` is INVALID).
+   - **ER Diagram**:
+     * Attributes MUST follow format: `type name [PK/FK]`.
+     * **CORRECT**: `string name`, `int id PK`, `string ref_id FK`
+     * **bAD**: `name string`, `Packing_WCID FK VARCHAR` (Do not flip type/name/key).
+
+4. **Validation Checklist Before Output**
+   - [ ] All node IDs are consistent
+   - [ ] All opening blocks have closing 'end' statements
+   - [ ] All commas in style declarations have NO spaces after
+   - [ ] Arrow syntax matches diagram type
+   - [ ] Gantt charts do NOT use 'today'
+   - [ ] Mindmap nodes are on separate lines with NO trailing text
+
+Current Date Reference: {ref_date}
+For Gantt Charts: Start the project timeline from {ref_date}."""
+
+
+def build_diagram_prompt_parts(description, diagram_type="Flowchart", ref_date=None):
+    """
+    Diagram Generator tab as (cached_prefix, prompt): the strict Mermaid rules,
+    which only change with the diagram type and date, then the user's description.
+    """
+    sys_prompt = _diagram_rules(ref_date) + f"""
+
+Generate syntactically perfect Mermaid code for a {diagram_type}."""
+
+    return sys_prompt, f"\n\nContext/Description:\n{description}"
+
+
+def build_diagram_set_prompt_parts(description, diagram_types, ref_date=None):
+    """
+    Several diagrams of the same context in one call, as (cached_prefix, prompt).
+    Each diagram comes back in its own ```mermaid block, in the order requested.
+    """
+    sys_prompt = _diagram_rules(ref_date) + f"""
+
+Generate syntactically perfect Mermaid code for EACH of the following diagrams, all describing the same context.
+Diagrams to generate (in this order): {", ".join(diagram_types)}
+Output exactly one ```mermaid block per diagram, in that order, with nothing but the heading `### <Diagram type>` between blocks."""
+
+    return sys_prompt, f"\n\nContext/Description:\n{description}"
+
+
+def build_diagram_fix_prompt(code, errors):
+    """Second-layer LLM self-correction for Mermaid code that failed validation."""
+    return f"""The following Mermaid code has specific syntax errors. Please FIX them and return ONLY the corrected code.
+
+ERRORS FOUND:
+{chr(10).join(errors)}
+
+BROKEN CODE:
+{code}
+
+CRITICAL: Fix the style definitions (remove spaces after commas) and close all blocks properly."""
+
+
+def build_code_prompt(requirements, language="Python", framework="None", style="OOP",
+                      include_docs=False, include_types=False):
+    """Code Generator tab."""
+    sys_prompt = f"Generate {language} code. Framework: {framework}. Style: {style}."
+    if include_docs:
+        sys_prompt += " Include docs."
+    if include_types:
+        sys_prompt += " Include types."
+    return f"{sys_prompt}\n{requirements}"
+
+
+def build_project_plan_prompt(requirements, language="Python", framework="None", style="OOP",
+                              include_tests=False, max_files=20):
+    """Code Generator project mode: file manifest only (see `services.project_gen.MANIFEST_SCHEMA`)."""
+    sys_prompt = (
+        f"Plan a {language} project using {framework}. Style: {style}. "
+        f"Return JSON only: a short project name and at most {max_files} files, each with a relative path "
+        "and a one-sentence purpose. Include configuration and dependency files the framework needs. "
+        "Do not write any file contents."
+    )
+    if include_tests:
+        sys_prompt += " Include unit test files."
+    return f"{sys_prompt}\n{requirements}"
+
+
+def build_project_file_prompt(requirements, manifest, path, language="Python", framework="None", style="OOP",
+                              include_docs=False, include_types=False):
+    """Code Generator project mode: one file, with the full manifest as shared context."""
+    files = "\n".join(f"- {entry['path']}: {entry['purpose']}" for entry in manifest)
+    sys_prompt = (
+        f"You are writing one file of a {language} project using {framework}. Style: {style}. "
+        f"Write ONLY the complete contents of `{path}` in a single code block. "
+        "Imports and references to other files must match the project files below."
+    )
+    if include_docs:
+        sys_prompt += " Include docs."
+    if include_types:
+        sys_prompt += " Include types."
+    return f"{sys_prompt}\n\nPROJECT FILES:\n{files}\n\nREQUIREMENTS:\n{requirements}"
+
+
+def build_tests_prompt(code):
+    """Unit tests for previously generated code."""
+    return f"Generate unit tests for:\n{code}"
+
+
+def build_summary_prompt(text, compression=50, format_type="Paragraph"):
+    """Summarizer tab."""
+    sys_prompt = f"Summarize to {compression}% length. Format: {format_type}."
+    return f"{sys_prompt}\n{text}"
+
+
+def translation_target(direction):
+    """Target language of a direction label such as "English → Bangla"."""
+    return "Bangla" if "Bangla" in direction.split("→")[-1] else "English"
+
+
+def build_translation_prompt(text, direction="English → Bangla", formality="Neutral", preserve_format=True):
+    """Translator tab. `direction` is the radio label, e.g. "English → Bangla"."""
+    sys_prompt = f"Translate to {translation_target(direction)}. Formality: {formality}."
+    if preserve_format:
+        sys_prompt += " Preserve original formatting."
+    return f"{sys_prompt}\n{text}"
+
+
+def build_segment_translation_prompt(segments, direction="English → Bangla", formality="Neutral", preserve_format=True):
+    """Batched translation of independent segments, each introduced by a `[[SEG n]]` marker line."""
+    sys_prompt = (
+        f"Translate each segment to {translation_target(direction)}. Formality: {formality}. "
+        f"There are {len(segments)} segments. Return every segment in the same order, each preceded by "
+        "its unchanged marker line (e.g. [[SEG 1]]). Do not merge, split or skip segments."
+    )
+    if preserve_format:
+        sys_prompt += " Preserve original formatting within each segment."
+    body = "\n\n".join(f"[[SEG {n}]]\n{segment}" for n, segment in enumerate(segments, 1))
+    return f"{sys_prompt}\n\n{body}"
+
+
+def build_email_prompt(body, subject="", template="Meeting Request", tone="Neutral", length="Standard"):
+    """Email Writer tab."""
+    sys_prompt = f"Write an email. Template: {template}. Tone: {tone}. Length: {length}."
+    return f"{sys_prompt}\nSubject: {subject}\n\n{body}"
+
+
+def build_analysis_prompt(text, grammar=False, seo=False, depth="Standard"):
+    """Content Analyzer tab. Counts, readability and keywords are computed locally (`services.text_metrics`)."""
+    sys_prompt = (
+        f"Give a {depth.lower()} qualitative analysis of the text: sentiment, tone and clarity. "
+        "Do not compute word counts, readability scores or keyword lists."
+    )
+    if grammar:
+        sys_prompt += " Include grammar check."
+    if seo:
+        sys_prompt += " Include SEO suggestions."
+    return f"{sys_prompt}\n{text}"
+
+
+def build_quiz_json_prompt(topic, num_questions=10, q_type="MCQ", difficulty="Medium"):
+    """Quiz Generator tab, structured output (see `services.quiz.QUIZ_SCHEMA`)."""
+    if q_type == "Mixed":
+        type_rule = "Mix MCQ, True/False, Short Answer and Fill in the Blank questions."
+    else:
+        type_rule = f"Every question must be of type \"{q_type}\"."
+    return (
+        f"Create {num_questions} quiz questions. Difficulty: {difficulty}. {type_rule}\n"
+        "Return JSON only. For MCQ give 4 options and set `answer` to the exact text of the correct option. "
+        "For True/False set `answer` to \"True\" or \"False\". For Fill in the Blank mark the blank with ____. "
+        "Add a one-sentence `explanation` for each answer.\n"
+        f"{topic}"
+    )
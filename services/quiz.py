@@ -0,0 +1,124 @@
+# services/quiz.py
+
+"""Structured quizzes.
+The Quiz Generator asks Gemini for JSON matching `QUIZ_SCHEMA` (structured
+output) and parses it into a small in-memory model.  Shuffling, points,
+answer-key toggling and TXT/DOCX/PDF rendering then run locally, so changing
+those options never needs a new LLM call.
+"""
+
+import json
+import random
+import re
+from dataclasses import asdict, dataclass, field
+from typing import List
+
+QUESTION_TYPES = ["MCQ", "True/False", "Short Answer", "Fill in the Blank"]
+
+QUIZ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string", "enum": QUESTION_TYPES},
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "items": {"type": "string"}},
+                    "answer": {"type": "string"},
+                    "explanation": {"type": "string"},
+                },
+                "required": ["type", "question", "answer"],
+            },
+        },
+    },
+    "required": ["title", "questions"],
+}
+
+QUIZ_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": QUIZ_SCHEMA}
+
+
+@dataclass
+class Question:
+    type: str
+    question: str
+    answer: str
+    options: List[str] = field(default_factory=list)
+    explanation: str = ""
+
+
+@dataclass
+class Quiz:
+    title: str
+    questions: List[Question]
+
+    def to_json(self):
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    def arranged(self, shuffle=False, seed=None):
+        """Copy with questions (and MCQ options) shuffled deterministically by `seed`."""
+        if not shuffle:
+            return self
+        rng = random.Random(seed)
+        questions = []
+        for q in self.questions:
+            options = list(q.options)
+            if q.type == "MCQ":
+                rng.shuffle(options)
+            questions.append(Question(q.type, q.question, q.answer, options, q.explanation))
+        rng.shuffle(questions)
+        return Quiz(self.title, questions)
+
+
+def parse_quiz(text):
+    """Parse the model's JSON response into a `Quiz`. Raises ValueError if it is not valid."""
+    match = re.search(r"```(?:json)?\s*(.*?)\s*```", text, re.DOTALL)
+    if match:
+        text = match.group(1)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Quiz response is not valid JSON: {e}")
+    if isinstance(data, list):
+        data = {"title": "Quiz", "questions": data}
+    questions = []
+    for item in data.get("questions", []):
+        if not isinstance(item, dict) or not item.get("question"):
+            continue
+        questions.append(Question(
+            type=item.get("type", "Short Answer"),
+            question=str(item["question"]).strip(),
+            answer=str(item.get("answer", "")).strip(),
+            options=[str(o).strip() for o in item.get("options") or []],
+            explanation=str(item.get("explanation", "")).strip(),
+        ))
+    if not questions:
+        raise ValueError("Quiz response contains no questions.")
+    return Quiz(str(data.get("title") or "Quiz").strip(), questions)
+
+
+def render_quiz(quiz, points=1, include_answers=True):
+    """Markdown text of the quiz, with an optional answer key at the end."""
+    letters = "ABCDEFGHIJ"
+    lines = [f"# {quiz.title}", "", f"*Total points: {points * len(quiz.questions)}*", ""]
+    for i, q in enumerate(quiz.questions, 1):
+        lines.append(f"**{i}. {q.question}** ({points} pt{'s' if points != 1 else ''})")
+        if q.type == "MCQ":
+            for letter, option in zip(letters, q.options):
+                lines.append(f"- {letter}) {option}")
+        elif q.type == "True/False":
+            lines.append("- ☐ True   ☐ False")
+        else:
+            lines.append("- Answer: ____________________")
+        lines.append("")
+
+    if include_answers:
+        lines += ["---", "", "## Answer Key", ""]
+        for i, q in enumerate(quiz.questions, 1):
+            answer = q.answer
+            if q.type == "MCQ" and q.answer in q.options:
+                answer = f"{letters[q.options.index(q.answer)]}) {q.answer}"
+            lines.append(f"{i}. {answer}" + (f" — {q.explanation}" if q.explanation else ""))
+    return "\n".join(lines).rstrip() + "\n"
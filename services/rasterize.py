@@ -0,0 +1,72 @@
+# services/rasterize.py
+
+"""Local SVG -> PNG rasterization.
+When the optional `cairosvg` package (and the cairo library it wraps) is
+installed, diagrams are fetched from the renderer as SVG only and PNGs are
+drawn locally at `RASTER_DPI` (default 96, i.e. 1 CSS pixel per pixel), so a
+diagram costs one remote request instead of two and high-DPI exports
+(`EXPORT_DPI`, default 192) cost none.  Set `LOCAL_RASTER=0` to always use the
+renderer's PNG endpoint.
+
+Cairo cannot draw the HTML labels (`<foreignObject>`) Mermaid uses by default,
+so the SVGs fetched for rasterization ask the renderer for plain text labels
+with `RENDERER_CONFIG`; SVGs shown or exported as SVG, and remote PNGs, keep
+the HTML labels.  SVGs that still contain HTML are left to the remote PNG
+endpoint.
+"""
+
+import os
+import re
+
+try:
+    import cairosvg
+except (ImportError, OSError):  # OSError: cairosvg is installed but libcairo is not
+    cairosvg = None
+
+LOCAL_RASTER = os.environ.get("LOCAL_RASTER", "1").lower() not in ("0", "false", "off", "no")
+RASTER_DPI = int(os.environ.get("RASTER_DPI", "96"))
+EXPORT_DPI = int(os.environ.get("EXPORT_DPI", "192"))
+CSS_DPI = 96
+
+# Mermaid init overrides that keep labels as <text> so cairo can draw them
+RENDERER_CONFIG = {"htmlLabels": False, "flowchart": {"htmlLabels": False}}
+
+_ROOT_TAG = re.compile(rb"<svg\b[^>]*>")
+_VIEWBOX = re.compile(rb'viewBox="\s*[-\d.]+[\s,]+[-\d.]+[\s,]+([\d.]+)[\s,]+([\d.]+)\s*"')
+_RELATIVE_SIZE = re.compile(rb'\s(width|height)="[\d.]*%"')
+
+
+def available():
+    """Whether PNGs should be rasterized locally."""
+    return LOCAL_RASTER and cairosvg is not None
+
+
+def _with_absolute_size(svg):
+    """
+    Mermaid emits `width="100%"` plus a viewBox; cairo needs a concrete size,
+    so relative root dimensions are replaced with the viewBox's.
+    """
+    root = _ROOT_TAG.search(svg)
+    if not root or not _RELATIVE_SIZE.search(root.group()):
+        return svg
+    box = _VIEWBOX.search(root.group())
+    if not box:
+        return svg
+    tag = _RELATIVE_SIZE.sub(b"", root.group())
+    tag = tag[:-1].rstrip(b"/") + b' width="%s" height="%s"' % box.groups() + (b"/>" if tag.endswith(b"/>") else b">")
+    return svg[:root.start()] + tag + svg[root.end():]
+
+
+def svg_to_png(svg, dpi=RASTER_DPI):
+    """
+    PNG bytes for `svg` at `dpi`, or None when rasterization is unavailable,
+    the SVG has HTML labels cairo would drop, or cairo fails.
+    """
+    if not svg or cairosvg is None or b"<foreignObject" in svg:
+        return None
+    try:
+        return cairosvg.svg2png(
+            bytestring=_with_absolute_size(svg), dpi=dpi, scale=dpi / CSS_DPI, background_color="white",
+        )
+    except Exception:
+        return None
@@ -0,0 +1,220 @@
+# services/scheduler.py
+
+"""Priority scheduling and admission control for outbound calls.
+Every upstream call (Gemini generations, Kroki / mermaid.ink renders) takes a
+slot from the process-wide scheduler of its upstream.  When all slots are
+busy, callers queue by priority class: interactive previews first, then
+interactive generations, then batch work.  Within a class the next slot goes
+to the session with the fewest calls running (fair share), then first come
+first served, so one session firing many calls cannot starve the others.
+
+Queues are bounded: a call is turned away at once with `SchedulerBusy` when
+its class's queue is full, or after waiting longer than the class allows, so
+users get a quick "busy" answer instead of ever-growing latency.  Waiting
+callers can be told their queue position.
+
+Tune with `GEMINI_MAX_CONCURRENCY` (default 8) and `RENDER_MAX_CONCURRENCY`
+(default 8) slots, `SCHED_MAX_QUEUE` (per class, default 32) and
+`SCHED_MAX_WAIT` (seconds, default 30; batch calls wait up to ten times as
+long).
+"""
+
+import contextlib
+import contextvars
+import itertools
+import os
+import threading
+import time
+
+from services.errors import BUSY, ErrorText
+from services.metrics import MetricsRegistry
+
+PREVIEW = "preview"
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (PREVIEW, INTERACTIVE, BATCH)  # Highest first
+
+SLOTS = {
+    "gemini": int(os.environ.get("GEMINI_MAX_CONCURRENCY", "8")),
+    "render": int(os.environ.get("RENDER_MAX_CONCURRENCY", "8")),
+}
+MAX_QUEUE = int(os.environ.get("SCHED_MAX_QUEUE", "32"))
+MAX_WAIT = float(os.environ.get("SCHED_MAX_WAIT", "30"))
+BATCH_WAIT_FACTOR = 10
+
+BUSY_MESSAGE = ErrorText(
+    "⚠️ **Server Busy**\n\n"
+    "Too many requests are waiting for the model right now. Please try again in a moment.",
+    BUSY,
+)
+
+# Priority and session of calls made from the current context (thread / task)
+_context = contextvars.ContextVar("scheduler_context", default={})
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised when a call is not admitted (queue full or waited too long)."""
+
+
+@contextlib.contextmanager
+def call_context(priority=None, session=None):
+    """Run the block's upstream calls with this priority class and/or session."""
+    current = dict(_context.get())
+    if priority:
+        current["priority"] = priority
+    if session:
+        current["session"] = session
+    token = _context.set(current)
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def context_priority(default=INTERACTIVE):
+    return _context.get().get("priority", default)
+
+
+def context_session(default=None):
+    return _context.get().get("session", default)
+
+
+class _Ticket:
+    __slots__ = ("priority", "session", "seq", "enqueued")
+
+    def __init__(self, priority, session, seq):
+        self.priority = priority
+        self.session = session
+        self.seq = seq
+        self.enqueued = time.perf_counter()
+
+
+class Scheduler:
+    def __init__(self, name, slots, max_queue=MAX_QUEUE, max_wait=MAX_WAIT):
+        self.name = name
+        self.slots = max(1, slots)
+        self.max_queue = max_queue
+        self.max_wait = {PREVIEW: max_wait, INTERACTIVE: max_wait, BATCH: max_wait * BATCH_WAIT_FACTOR}
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._running = {}  # session -> calls holding a slot
+        self._in_use = 0
+        self._seq = itertools.count()
+        self._rejected = {p: 0 for p in PRIORITIES}
+        self.metrics = MetricsRegistry()
+
+    def _order(self, ticket):
+        return PRIORITIES.index(ticket.priority), self._running.get(ticket.session, 0), ticket.seq
+
+    def position(self, ticket):
+        """1-based place of `ticket` in the queue (call with the lock held)."""
+        order = self._order(ticket)
+        return 1 + sum(1 for other in self._waiting if self._order(other) < order)
+
+    def acquire(self, priority=INTERACTIVE, session=None, on_wait=None):
+        """
+        Take a slot, waiting in line if necessary.  `on_wait(position)` is
+        called about twice a second while queued and with position 0 once
+        admitted (it may raise to abandon the wait, e.g. on job cancellation).
+        Raises `SchedulerBusy` if not admitted.
+        """
+        priority = priority if priority in PRIORITIES else INTERACTIVE
+        with self._cond:
+            ticket = _Ticket(priority, session, next(self._seq))
+            if self._in_use < self.slots and not self._waiting:
+                self._grant(ticket)
+                return ticket
+            if sum(1 for t in self._waiting if t.priority == priority) >= self.max_queue:
+                self._rejected[priority] += 1
+                raise SchedulerBusy(f"{self.name} queue for {priority} calls is full")
+            self._waiting.append(ticket)
+            deadline = ticket.enqueued + self.max_wait[priority]
+            try:
+                while not (self._in_use < self.slots and min(self._waiting, key=self._order) is ticket):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._rejected[priority] += 1
+                        self._record_wait(ticket, admitted=False)
+                        raise SchedulerBusy(f"waited {self.max_wait[priority]:.0f} s for a {self.name} slot")
+                    if on_wait:
+                        position = self.position(ticket)
+                        self._cond.release()
+                        try:
+                            on_wait(position)
+                        finally:
+                            self._cond.acquire()
+                    self._cond.wait(min(0.5, remaining))
+            except BaseException:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+                raise
+            self._waiting.remove(ticket)
+            self._grant(ticket)
+            self._cond.notify_all()  # More slots may be free for the next in line
+        if on_wait:
+            try:
+                on_wait(0)
+            except BaseException:
+                self.release(ticket)
+                raise
+        return ticket
+
+    def _grant(self, ticket):
+        self._in_use += 1
+        self._running[ticket.session] = self._running.get(ticket.session, 0) + 1
+        self._record_wait(ticket, admitted=True)
+
+    def _record_wait(self, ticket, admitted):
+        self.metrics.record(f"wait:{ticket.priority}", (time.perf_counter() - ticket.enqueued) * 1000, ok=admitted)
+
+    def release(self, ticket):
+        with self._cond:
+            self._in_use -= 1
+            left = self._running.get(ticket.session, 1) - 1
+            if left:
+                self._running[ticket.session] = left
+            else:
+                self._running.pop(ticket.session, None)
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, priority=None, session=None, on_wait=None):
+        """Hold a slot for the block; priority and session default to the `call_context`."""
+        ticket = self.acquire(priority or context_priority(), session or context_session(), on_wait)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        with self._cond:
+            depth = {p: sum(1 for t in self._waiting if t.priority == p) for p in PRIORITIES}
+            in_use, sessions = self._in_use, len(self._running)
+            rejected = dict(self._rejected)
+        waits = self.metrics.snapshot()
+        return {
+            "slots": self.slots,
+            "in_use": in_use,
+            "active_sessions": sessions,
+            "queue_depth": depth,
+            "rejected": rejected,
+            "wait_ms": {name.split(":", 1)[1]: stats for name, stats in waits.items()},
+        }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(name):
+    """Process-wide scheduler for one upstream (`gemini` or `render`)."""
+    with _schedulers_lock:
+        if name not in _schedulers:
+            _schedulers[name] = Scheduler(name, SLOTS.get(name, 8))
+        return _schedulers[name]
+
+
+def all_stats():
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {name: scheduler.stats() for name, scheduler in schedulers.items()}
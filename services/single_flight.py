@@ -0,0 +1,103 @@
+# services/single_flight.py
+
+"""Process-wide coalescing of identical in-flight upstream calls.
+When several sessions make the same request at the same time (typically the
+same template sent to Gemini or the same diagram sent to Kroki), the first
+caller runs it and the others wait for and share its result instead of paying
+for their own upstream call.  Only results the caller accepts (for example
+non-error responses) are shared; if the leading call fails, each waiter falls
+back to its own call, so one user's quota error is never handed to another.
+
+Nothing is cached after the call completes: a request arriving later starts a
+new flight.  Set `SINGLE_FLIGHT=0` to disable coalescing.
+"""
+
+import hashlib
+import os
+import threading
+
+ENABLED = os.environ.get("SINGLE_FLIGHT", "1").lower() not in ("0", "false", "off", "no")
+
+
+def flight_key(*parts):
+    """Stable key for a request made of strings / reprs."""
+    return hashlib.sha256("\x00".join(map(str, parts)).encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "ok", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.ok = False
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}  # (namespace, key) -> _Flight
+        self._lock = threading.Lock()
+        self._stats = {}  # namespace -> counters
+
+    def do(self, namespace, key, fn, accept=None):
+        """
+        `fn()` run once for all concurrent callers with the same (namespace,
+        key).  Waiters receive the leader's result if `accept(result)` is true
+        (default: always); otherwise, or if the leader raised, they call `fn`
+        themselves.
+        """
+        with self._lock:
+            stats = self._stats.setdefault(namespace, {"calls": 0, "coalesced": 0, "fallbacks": 0, "in_flight": 0})
+            flight = self._flights.get((namespace, key))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(namespace, key)] = _Flight()
+                stats["calls"] += 1
+                stats["in_flight"] += 1
+            else:
+                flight.waiters += 1
+
+        if not leader:
+            flight.done.wait()
+            with self._lock:
+                stats["coalesced" if flight.ok else "fallbacks"] += 1
+            return flight.result if flight.ok else fn()
+
+        try:
+            result = fn()
+            flight.result = result
+            flight.ok = accept is None or bool(accept(result))
+            return result
+        finally:
+            with self._lock:
+                self._flights.pop((namespace, key), None)
+                stats["in_flight"] -= 1
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            namespaces = {name: dict(s) for name, s in self._stats.items()}
+        calls = sum(s["calls"] for s in namespaces.values())
+        coalesced = sum(s["coalesced"] for s in namespaces.values())
+        return {
+            "calls": calls,
+            "coalesced": coalesced,
+            "saved_share": round(coalesced / (calls + coalesced), 3) if calls + coalesced else 0.0,
+            "namespaces": namespaces,
+        }
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Process-wide single-flight group, or None when disabled with `SINGLE_FLIGHT=0`."""
+    global _single_flight
+    if not ENABLED:
+        return None
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
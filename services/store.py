@@ -0,0 +1,231 @@
+# services/store.py
+
+"""Persistent history and favorites backed by SQLite.
+The database runs in WAL mode so concurrent sessions can read while one
+writes.  History and favorites are indexed per (owner, feature) for
+paginated listing, mirrored into FTS5 tables for full-text search, and
+favorites are de-duplicated by content hash.
+
+The location defaults to `data/metamorphosis.db` and can be overridden with
+the `METAMORPHOSIS_DB` environment variable.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+DB_PATH = os.environ.get("METAMORPHOSIS_DB", os.path.join("data", "metamorphosis.db"))
+HISTORY_LIMIT = int(os.environ.get("HISTORY_LIMIT", "200"))  # Per owner and feature
+PREVIEW_CHARS = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_owner_feature ON history (owner, feature, id DESC);
+
+CREATE TABLE IF NOT EXISTS favorites (
+    id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    UNIQUE (owner, content_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_favorites_owner_feature ON favorites (owner, feature, id DESC);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+    title, content, content='{table}', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {table}_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO {table}_fts ({table}_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+END;
+"""
+
+TABLES = ("history", "favorites")
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class HistoryStore:
+    def __init__(self, path=DB_PATH):
+        if path == ":memory:" or path.startswith("file::memory:"):
+            # Every thread opens its own connection, and each would get a separate, empty database
+            raise ValueError("HistoryStore needs a database file; in-memory SQLite is not shared between threads")
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.has_fts = self._init_schema()
+
+    def _conn(self):
+        """One connection per thread (sqlite3 connections are not thread-safe)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.executescript(SCHEMA)
+        try:
+            with conn:
+                for table in TABLES:
+                    conn.executescript(FTS_SCHEMA.format(table=table))
+            return True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: search falls back to LIKE
+            return False
+
+    # -- writes -------------------------------------------------------------
+
+    def add_history(self, owner, feature, title, content):
+        """Insert a history item and trim the feature to HISTORY_LIMIT entries."""
+        conn = self._conn()
+        with self._write_lock, conn:
+            cur = conn.execute(
+                "INSERT INTO history (owner, feature, title, content, content_hash, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (owner, feature, title, content, content_hash(content), _now()),
+            )
+            conn.execute(
+                "DELETE FROM history WHERE owner = ? AND feature = ? AND id NOT IN "
+                "(SELECT id FROM history WHERE owner = ? AND feature = ? ORDER BY id DESC LIMIT ?)",
+                (owner, feature, owner, feature, HISTORY_LIMIT),
+            )
+            return cur.lastrowid
+
+    def add_favorite(self, owner, feature, title, content):
+        """Insert a favorite unless the same content is already saved. Returns True if added."""
+        conn = self._conn()
+        with self._write_lock, conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO favorites (owner, feature, title, content, content_hash, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (owner, feature, title, content, content_hash(content), _now()),
+            )
+            return cur.rowcount > 0
+
+    def delete(self, table, owner, item_id):
+        _check_table(table)
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.execute(f"DELETE FROM {table} WHERE owner = ? AND id = ?", (owner, item_id))
+
+    # -- reads --------------------------------------------------------------
+
+    def features(self, table, owner):
+        """List of (feature, count) for the owner, most recently used first."""
+        _check_table(table)
+        rows = self._conn().execute(
+            f"SELECT feature, COUNT(*) AS n, MAX(id) AS last FROM {table} WHERE owner = ? GROUP BY feature ORDER BY last DESC",
+            (owner,),
+        ).fetchall()
+        return [(row["feature"], row["n"]) for row in rows]
+
+    def list(self, table, owner, feature=None, limit=10, offset=0):
+        """One page of items (newest first) with a content preview instead of the full text."""
+        _check_table(table)
+        sql = f"SELECT id, feature, title, substr(content, 1, {PREVIEW_CHARS}) AS preview, content_hash, created_at FROM {table} WHERE owner = ?"
+        params = [owner]
+        if feature:
+            sql += " AND feature = ?"
+            params.append(feature)
+        sql += " ORDER BY id DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        return [dict(row) for row in self._conn().execute(sql, params).fetchall()]
+
+    def count(self, table, owner, feature=None):
+        _check_table(table)
+        sql = f"SELECT COUNT(*) FROM {table} WHERE owner = ?"
+        params = [owner]
+        if feature:
+            sql += " AND feature = ?"
+            params.append(feature)
+        return self._conn().execute(sql, params).fetchone()[0]
+
+    def get(self, table, owner, item_id):
+        """Full item including content, or None."""
+        _check_table(table)
+        row = self._conn().execute(
+            f"SELECT id, feature, title, content, created_at FROM {table} WHERE owner = ? AND id = ?",
+            (owner, item_id),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def search(self, table, owner, query, feature=None, limit=10, offset=0):
+        """Full-text search over title and content, best matches first."""
+        _check_table(table)
+        query = query.strip()
+        if not query:
+            return []
+        params = [owner]
+        if self.has_fts:
+            sql = (
+                f"SELECT t.id, t.feature, t.title, snippet({table}_fts, 1, '**', '**', '…', 16) AS preview, t.content_hash, t.created_at "
+                f"FROM {table}_fts JOIN {table} t ON t.id = {table}_fts.rowid "
+                f"WHERE t.owner = ? AND {table}_fts MATCH ?"
+            )
+            params.append(_fts_query(query))
+        else:
+            sql = (
+                f"SELECT id, feature, title, substr(content, 1, {PREVIEW_CHARS}) AS preview, content_hash, created_at FROM {table} t "
+                "WHERE owner = ? AND (title LIKE ? OR content LIKE ?)"
+            )
+            params += [f"%{query}%", f"%{query}%"]
+        if feature:
+            sql += " AND t.feature = ?"
+            params.append(feature)
+        sql += " ORDER BY rank LIMIT ? OFFSET ?" if self.has_fts else " ORDER BY id DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        return [dict(row) for row in self._conn().execute(sql, params).fetchall()]
+
+
+def _check_table(table):
+    if table not in TABLES:
+        raise ValueError(f"Unknown table: {table}")
+
+
+def _fts_query(text):
+    """Quote each term so user input cannot inject FTS5 query syntax; last term is a prefix match."""
+    terms = [t.replace('"', '""') for t in text.split()]
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide store shared by all sessions."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
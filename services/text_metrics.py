@@ -0,0 +1,215 @@
+# services/text_metrics.py
+
+"""Deterministic text metrics for the Content Analyzer.
+Counts, Flesch-style readability, TF-IDF keywords and n-gram frequencies are
+computed locally with a regex tokenizer and NumPy, so they are instant and
+reproducible.  Tokenizing and sentence splitting understand Bangla script
+(vowel signs, hasanta and the dari `।`); the LLM is only asked for the
+qualitative part of the analysis.
+"""
+
+import math
+import re
+
+import numpy as np
+
+BANGLA_LETTER = "ঀ-৥ৰ-৿"  # Bengali block without its digits
+_WORD = re.compile(rf"(?:[^\W\d_]|[{BANGLA_LETTER}])(?:[^\W\d_]|[{BANGLA_LETTER}]|['’](?=[^\W\d_]))*")
+_SENTENCE_END = re.compile(r"(?<=[.!?।॥])[\"'”’)\]]*\s+|\n\s*\n")
+_BANGLA_CHAR = re.compile(f"[{BANGLA_LETTER}]")
+_BANGLA_VOWELS = "অআইঈউঊঋএঐওঔ"
+_BANGLA_VOWEL_SIGNS = "ািীুূৃেৈোৌ"
+_BANGLA_CONSONANTS = re.compile("[ক-হড়-য়]")
+_HASANTA = "্"
+_ENGLISH_VOWEL_GROUPS = re.compile(r"[aeiouy]+")
+
+WORDS_PER_MINUTE = 200
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she should so some such than that the
+their theirs them themselves then there these they this those through to too under until up very was we
+were what when where which while who whom why will with would you your yours yourself yourselves also may
+might must shall us one
+এবং ও কিন্তু অথবা বা যে যা এই সেই ওই এটি এটা সে তিনি তারা আমি আমরা তুমি তোমরা আপনি আপনারা তার তাদের আমার আমাদের
+তোমার আপনার একটি একটা এক জন না নয় হয় হয়ে হবে ছিল ছিলেন আছে আছেন করে করা করেন করতে থেকে জন্য দিয়ে সঙ্গে সাথে
+মধ্যে উপর নিচে পর আগে কি কী কেন কোন কোনো যদি তবে তাহলে সব সকল খুব আর ই তো
+""".split())
+
+
+def is_bangla(text):
+    """True if most letters in `text` are Bangla."""
+    letters = sum(1 for ch in text if ch.isalpha() or _BANGLA_CHAR.match(ch))
+    return bool(letters) and len(_BANGLA_CHAR.findall(text)) / letters > 0.5
+
+
+def tokenize(text):
+    """Lower-cased word tokens; Bangla words keep their vowel signs and conjuncts."""
+    return [w.lower() for w in _WORD.findall(text)]
+
+
+def split_sentences(text):
+    """Sentences split on `. ! ?`, the Bangla dari `।`/`॥` and blank lines."""
+    return [s.strip() for s in _SENTENCE_END.split(text) if s and _WORD.search(s)]
+
+
+def _bangla_syllables(word):
+    """Vowel nuclei: independent vowels, vowel signs and inherent vowels (not before hasanta or at word end)."""
+    count = 0
+    for i, ch in enumerate(word):
+        if ch in _BANGLA_VOWELS or ch in _BANGLA_VOWEL_SIGNS:
+            count += 1
+        elif _BANGLA_CONSONANTS.match(ch) and i + 1 < len(word):
+            nxt = word[i + 1]
+            if nxt != _HASANTA and nxt not in _BANGLA_VOWEL_SIGNS:
+                count += 1
+    return count
+
+
+def syllable_counts(words, bangla=False):
+    """Approximate syllables per word as a NumPy array (at least one each)."""
+    if bangla:
+        counts = [_bangla_syllables(w) for w in words]
+    else:
+        counts = [
+            len(_ENGLISH_VOWEL_GROUPS.findall(w)) - (w.endswith("e") and not w.endswith("le"))
+            for w in words
+        ]
+    return np.maximum(np.asarray(counts, dtype=np.int32), 1)
+
+
+def _vocabulary(sentence_tokens):
+    vocab = {}
+    ids = [np.fromiter((vocab.setdefault(t, len(vocab)) for t in tokens), dtype=np.int64, count=len(tokens))
+           for tokens in sentence_tokens]
+    return vocab, ids
+
+
+def tfidf_keywords(sentence_tokens, top_k=10):
+    """
+    Top keywords by TF-IDF, treating each sentence as a document: frequent
+    terms that are concentrated in a few sentences rank highest.
+    """
+    vocab, ids = _vocabulary(sentence_tokens)
+    if not vocab:
+        return []
+    n_docs, n_terms = len(ids), len(vocab)
+    term_ids = np.concatenate(ids)
+    doc_ids = np.repeat(np.arange(n_docs), [len(doc) for doc in ids])
+    tf = np.bincount(term_ids, minlength=n_terms)
+    # Distinct (sentence, term) pairs give the document frequency without a dense matrix
+    df = np.bincount(np.unique(doc_ids * n_terms + term_ids) % n_terms, minlength=n_terms)
+    idf = np.log((1 + n_docs) / (1 + df)) + 1
+    scores = tf * idf
+    terms = np.array(list(vocab), dtype=object)
+    keep = np.array([t not in STOPWORDS and len(t) > 1 for t in terms])
+    order = np.argsort(-scores[keep], kind="stable")[:top_k]
+    return [
+        {"keyword": term, "count": int(count), "score": round(float(score), 3)}
+        for term, count, score in zip(terms[keep][order], tf[keep][order], scores[keep][order])
+    ]
+
+
+def ngram_frequencies(tokens, n=2, top_k=10):
+    """Most frequent n-grams that are not made only of stopwords."""
+    if len(tokens) < n:
+        return []
+    vocab = {}
+    ids = np.fromiter((vocab.setdefault(t, len(vocab)) for t in tokens), dtype=np.int64, count=len(tokens))
+    base = len(vocab)
+    # Encode each n-gram as one integer so counting is a single np.unique
+    codes = np.zeros(len(ids) - n + 1, dtype=np.int64)
+    for offset in range(n):
+        codes = codes * base + ids[offset:len(ids) - n + 1 + offset]
+    unique, counts = np.unique(codes, return_counts=True)
+    terms = list(vocab)
+    rows = []
+    for index in np.argsort(-counts, kind="stable"):
+        if counts[index] < 2:
+            break
+        code, words = int(unique[index]), []
+        for _ in range(n):
+            code, word_id = divmod(code, base)
+            words.append(terms[word_id])
+        words.reverse()
+        if all(w in STOPWORDS for w in words):
+            continue
+        rows.append({"ngram": " ".join(words), "count": int(counts[index])})
+        if len(rows) == top_k:
+            break
+    return rows
+
+
+def flesch_reading_ease(words, sentences, syllables):
+    if not words or not sentences:
+        return 0.0
+    return round(206.835 - 1.015 * (words / sentences) - 84.6 * (syllables / words), 1)
+
+
+def flesch_kincaid_grade(words, sentences, syllables):
+    if not words or not sentences:
+        return 0.0
+    return round(0.39 * (words / sentences) + 11.8 * (syllables / words) - 15.59, 1)
+
+
+def readability_label(score):
+    """Plain-language band for a Flesch reading-ease score."""
+    for limit, label in ((90, "Very easy"), (70, "Easy"), (60, "Standard"), (50, "Fairly difficult"), (30, "Difficult")):
+        if score >= limit:
+            return label
+    return "Very difficult"
+
+
+def analyze_text(text, top_k=10):
+    """All local metrics for `text` as a plain dict."""
+    bangla = is_bangla(text)
+    sentences = split_sentences(text)
+    sentence_tokens = [tokenize(s) for s in sentences]
+    tokens = [t for ts in sentence_tokens for t in ts]
+    lengths = np.fromiter((len(t) for t in tokens), dtype=np.int32, count=len(tokens))
+    syllables = int(syllable_counts(tokens, bangla).sum()) if tokens else 0
+    n_words, n_sentences = len(tokens), len(sentences)
+    reading_ease = flesch_reading_ease(n_words, n_sentences, syllables)
+    return {
+        "language": "Bangla" if bangla else "English",
+        "characters": len(text),
+        "characters_no_spaces": len("".join(text.split())),
+        "words": n_words,
+        "unique_words": len(set(tokens)),
+        "sentences": n_sentences,
+        "paragraphs": len([p for p in re.split(r"\n\s*\n", text) if p.strip()]),
+        "avg_word_length": round(float(lengths.mean()), 2) if n_words else 0.0,
+        "avg_sentence_length": round(n_words / n_sentences, 2) if n_sentences else 0.0,
+        "lexical_diversity": round(len(set(tokens)) / n_words, 3) if n_words else 0.0,
+        "reading_time_minutes": math.ceil(n_words / WORDS_PER_MINUTE) if n_words else 0,
+        "syllables": syllables,
+        "flesch_reading_ease": reading_ease,
+        "flesch_kincaid_grade": flesch_kincaid_grade(n_words, n_sentences, syllables),
+        "readability": readability_label(reading_ease),
+        "keywords": tfidf_keywords(sentence_tokens, top_k),
+        "bigrams": ngram_frequencies(tokens, 2, top_k),
+        "trigrams": ngram_frequencies(tokens, 3, top_k),
+    }
+
+
+def metrics_markdown(metrics):
+    """Markdown summary of `analyze_text` output, used for history and downloads."""
+    lines = [
+        "## Text Metrics",
+        "",
+        f"- Language: {metrics['language']}",
+        f"- Words: {metrics['words']} ({metrics['unique_words']} unique, lexical diversity {metrics['lexical_diversity']})",
+        f"- Sentences: {metrics['sentences']} (avg {metrics['avg_sentence_length']} words)",
+        f"- Paragraphs: {metrics['paragraphs']}",
+        f"- Characters: {metrics['characters']} ({metrics['characters_no_spaces']} without spaces)",
+        f"- Reading time: ~{metrics['reading_time_minutes']} min",
+        f"- Flesch reading ease: {metrics['flesch_reading_ease']} ({metrics['readability']}), "
+        f"grade level {metrics['flesch_kincaid_grade']}",
+    ]
+    if metrics["keywords"]:
+        lines.append("- Keywords: " + ", ".join(k["keyword"] for k in metrics["keywords"]))
+    if metrics["bigrams"]:
+        lines.append("- Common phrases: " + ", ".join(f"{b['ngram']} ({b['count']})" for b in metrics["bigrams"]))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,346 @@
+# services/translation_memory.py
+
+"""Segment-level translation memory for the Translator.
+Text is split into paragraphs; each one is looked up by (normalized source,
+target language, formality, format preservation) in a persistent SQLite
+table.  Only unseen segments are sent to Gemini, batched into chunks that are
+translated concurrently, and the result is reassembled in order around the
+original blank lines and indentation.  Fenced code blocks (``` at the start of
+a line) are never sent for translation; they are passed through untouched.
+
+The table lives in the history database (`METAMORPHOSIS_DB`).  Chunk size
+and parallelism are set with `TRANSLATION_CHUNK_CHARS` (default 4000) and
+`TRANSLATION_CONCURRENCY` (default 4).  Segments not used for
+`TRANSLATION_MEMORY_MAX_AGE_DAYS` (default 180; 0 keeps them) are dropped, and
+the table is trimmed to the `TRANSLATION_MEMORY_LIMIT` most recently used
+segments (default 100000) whenever new ones are stored.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from services import prompts
+from services.gemini_client import GeminiClient
+from services.store import DB_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS translation_memory (
+    key TEXT PRIMARY KEY,
+    target TEXT NOT NULL,
+    formality TEXT NOT NULL,
+    source TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    used_at TEXT
+);
+"""
+
+INDEX = "CREATE INDEX IF NOT EXISTS idx_translation_memory_used ON translation_memory (used_at);"
+
+CHUNK_CHARS = int(os.environ.get("TRANSLATION_CHUNK_CHARS", "4000"))
+CONCURRENCY = int(os.environ.get("TRANSLATION_CONCURRENCY", "4"))
+MEMORY_LIMIT = int(os.environ.get("TRANSLATION_MEMORY_LIMIT", "100000"))
+MEMORY_MAX_AGE_DAYS = int(os.environ.get("TRANSLATION_MEMORY_MAX_AGE_DAYS", "180"))
+
+_PARAGRAPH_BREAK = re.compile(r"(\n[ \t]*\n\s*)")
+_MARKER = re.compile(r"^\[\[SEG (\d+)\]\][ \t]*\n?", re.MULTILINE)
+# A fence opens and closes at the start of a line; inline ``` stays in the prose.
+# An unclosed fence runs to the end.
+_FENCE = re.compile(r"(^[ \t]*```.*?(?:^[ \t]*```[^\n]*$|\Z))", re.DOTALL | re.MULTILINE)
+_FENCE_LINE = re.compile(r"^[ \t]*```", re.MULTILINE)
+
+
+def normalize_segment(text):
+    """Unicode NFC with collapsed whitespace, so re-wrapped paragraphs still match."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def memory_key(segment, target, formality, preserve_format=True):
+    raw = f"{target}\n{formality}\n{'format' if preserve_format else 'plain'}\n{normalize_segment(segment)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def split_segments(text):
+    """
+    Split `text` into parts whose concatenation is the original text.
+    Returns (parts, indexes) where `indexes` lists the parts to translate;
+    the rest are paragraph breaks, indentation, fenced code blocks or
+    segments without letters.
+    """
+    parts, indexes = [], []
+    for chunk in _merge_fenced(_PARAGRAPH_BREAK.split(text)):
+        for n, piece in enumerate(_FENCE.split(chunk)):
+            if n % 2:
+                parts.append(piece)  # Fenced code
+            else:
+                _add_prose(parts, indexes, piece)
+    return parts, indexes
+
+
+def _add_prose(parts, indexes, chunk):
+    core = chunk.strip()
+    if not core or not any(ch.isalpha() for ch in core):
+        if chunk:
+            parts.append(chunk)
+        return
+    start = chunk.index(core)
+    if start:
+        parts.append(chunk[:start])
+    indexes.append(len(parts))
+    parts.append(core)
+    if start + len(core) < len(chunk):
+        parts.append(chunk[start + len(core):])
+
+
+def _merge_fenced(pieces):
+    """Re-join split pieces that fall inside a ``` fenced block, so code blocks stay whole."""
+    merged, open_fence = [], False
+    for n, piece in enumerate(pieces):
+        if open_fence:
+            merged[-1] += piece
+        else:
+            merged.append(piece)
+        if n % 2 == 0 and len(_FENCE_LINE.findall(piece)) % 2:
+            open_fence = not open_fence
+    return merged
+
+
+def parse_segments(text, count):
+    """Map segment number -> translation from a `[[SEG n]]`-marked response."""
+    matches = list(_MARKER.finditer(text))
+    found = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        number = int(match.group(1))
+        segment = text[match.end():end].strip()
+        if 1 <= number <= count and segment:
+            found[number] = segment
+    return found
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class TranslationMemory:
+    def __init__(self, path=DB_PATH, limit=MEMORY_LIMIT, max_age_days=MEMORY_MAX_AGE_DAYS):
+        if path == ":memory:" or path.startswith("file::memory:"):
+            # Every thread opens its own connection, and each would get a separate, empty database
+            raise ValueError("TranslationMemory needs a database file; in-memory SQLite is not shared between threads")
+        self.path = path
+        self.limit = limit
+        self.max_age_days = max_age_days
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(translation_memory)")}
+            if "used_at" not in columns:  # Databases created before pruning existed
+                conn.execute("ALTER TABLE translation_memory ADD COLUMN used_at TEXT")
+                conn.execute("UPDATE translation_memory SET used_at = created_at")
+            conn.execute(INDEX)
+
+    def _conn(self):
+        """One connection per thread (sqlite3 connections are not thread-safe)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, keys):
+        """Stored translations for the given keys (missing keys are absent)."""
+        keys = list(set(keys))
+        if not keys:
+            return {}
+        found = {}
+        conn = self._conn()
+        for i in range(0, len(keys), 500):  # Stay below SQLite's parameter limit
+            batch = keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, translation FROM translation_memory WHERE key IN ({placeholders})", batch,
+            ).fetchall()
+            found.update(rows)
+        if found:
+            with self._write_lock, conn:
+                now = _now()
+                conn.executemany(
+                    "UPDATE translation_memory SET hits = hits + 1, used_at = ? WHERE key = ?",
+                    [(now, k) for k in found],
+                )
+        return found
+
+    def store(self, entries):
+        """Save (key, target, formality, source, translation) tuples, then prune the table."""
+        if not entries:
+            return
+        now = _now()
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO translation_memory "
+                "(key, target, formality, source, translation, created_at, used_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [entry + (now, now) for entry in entries],
+            )
+            self._prune(conn)
+
+    def _prune(self, conn):
+        """Drop segments unused for `max_age_days`, then all but the `limit` most recently used."""
+        if self.max_age_days:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+            conn.execute("DELETE FROM translation_memory WHERE used_at < ?", (cutoff,))
+        if self.limit:
+            conn.execute(
+                "DELETE FROM translation_memory WHERE key IN "
+                "(SELECT key FROM translation_memory ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.limit,),
+            )
+
+    def record(self, hits, misses):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self):
+        """Process-wide segment hit rate plus the number of stored segments."""
+        row = self._conn().execute("SELECT COUNT(*) FROM translation_memory").fetchone()
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "segments_stored": row[0],
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+def chunk_segments(parts, indexes, max_chars=None):
+    """Group consecutive segment indexes into chunks of at most `max_chars` source characters."""
+    if not max_chars:
+        return [list(indexes)] if indexes else []
+    chunks, current, size = [], [], 0
+    for i in indexes:
+        if current and size + len(parts[i]) > max_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += len(parts[i])
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _translate_chunk(client, sources, direction, formality, preserve_format):
+    """Translations for `sources` (one batched call), or the client's error message."""
+    res = client.generate_content(
+        prompts.build_segment_translation_prompt(sources, direction, formality, preserve_format),
+        route="translate",
+    )
+    if GeminiClient.is_error_response(res):
+        return res
+    found = parse_segments(res, len(sources))
+    translations = []
+    for n, source in enumerate(sources, 1):
+        if n not in found:
+            # The model merged or dropped this segment: translate it on its own
+            single = client.generate_content(
+                prompts.build_translation_prompt(source, direction, formality, preserve_format), route="translate",
+            )
+            if GeminiClient.is_error_response(single):
+                return single
+            found[n] = single.strip()
+        translations.append(found[n])
+    return translations
+
+
+def iter_translation(client, text, direction="English → Bangla", formality="Neutral", preserve_format=True,
+                     memory=None, chunk_chars=None, concurrency=CONCURRENCY):
+    """
+    Translate `text`, reusing stored segments and sending the rest in chunks of
+    up to `chunk_chars` characters (one chunk if None), `concurrency` at a time.
+    Yields {"text", "done", "segments", "hits"} whenever a chunk completes, where
+    "text" is the translated prefix so far; the last update holds the full text.
+    On failure a single {"error": message} is yielded instead.
+    """
+    memory = memory or get_translation_memory()
+    target = prompts.translation_target(direction)
+    parts, indexes = split_segments(text)
+    keys = {i: memory_key(parts[i], target, formality, preserve_format) for i in indexes}
+    known = memory.lookup(keys.values())
+    translated = {i: known[keys[i]] for i in indexes if keys[i] in known}
+    misses = [i for i in indexes if i not in translated]
+    hits = len(translated)
+
+    def progress():
+        # Chunks finish out of order; only the contiguous translated prefix is shown
+        out = []
+        for i, part in enumerate(parts):
+            if i in keys and i not in translated:
+                break
+            out.append(translated.get(i, part))
+        return {"text": "".join(out), "done": len(translated), "segments": len(indexes), "hits": hits}
+
+    chunks = chunk_segments(parts, misses, chunk_chars)
+    if chunks:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as pool:
+            futures = {
+                pool.submit(_translate_chunk, client, [parts[i] for i in chunk], direction, formality, preserve_format): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                if isinstance(result, str):
+                    for pending in futures:
+                        pending.cancel()
+                    # Record before yielding: the caller usually stops consuming at the error
+                    memory.record(hits, len(misses))
+                    yield {"error": result}
+                    return
+                chunk = futures[future]
+                translated.update(zip(chunk, result))
+                memory.store([(keys[i], target, formality, parts[i], translated[i]) for i in chunk])
+                yield progress()
+    memory.record(hits, len(misses))
+    if not chunks:
+        yield progress()
+
+
+def translate_with_memory(client, text, direction="English → Bangla", formality="Neutral",
+                          preserve_format=True, memory=None, chunk_chars=None, concurrency=CONCURRENCY):
+    """
+    Blocking form of `iter_translation`.
+    Returns {"text", "segments", "hits"}; on failure "text" is the client's error message.
+    """
+    update = {}
+    for update in iter_translation(client, text, direction, formality, preserve_format,
+                                   memory, chunk_chars, concurrency):
+        if "error" in update:
+            return {"text": update["error"], "segments": 0, "hits": 0}
+    return {"text": update["text"], "segments": update["segments"], "hits": update["hits"]}
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_translation_memory():
+    """Process-wide translation memory shared by all sessions."""
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = TranslationMemory()
+        return _memory
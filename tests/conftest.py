@@ -0,0 +1,22 @@
+# tests/conftest.py
+
+"""Shared test setup.
+Services read their settings at import time, so anything the tests need to
+override is set here, before the test modules import them.
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = tempfile.mkdtemp(prefix="metamorphosis-tests-")
+
+os.environ["METAMORPHOSIS_DB"] = os.path.join(DATA, "metamorphosis.db")
+os.environ["METAMORPHOSIS_BLOBS"] = os.path.join(DATA, "blobs")
+os.environ["BLOB_PRUNE_INTERVAL"] = "0"
+os.environ.pop("GEMINI_API_KEY", None)
+os.environ.pop("GEMINI_API_KEYS", None)
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
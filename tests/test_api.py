@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import api
+from services.errors import BUSY, QUOTA, ErrorText
+from services.gemini_client import GeminiClient
+from services.metrics import MetricsRegistry
+
+HEADERS = {"X-Gemini-Api-Key": "test-key"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    prompts = []
+
+    def generate(self, prompt, *args, **kwargs):
+        prompts.append(prompt)
+        return "generated text"
+
+    def stream(self, prompt, *args, **kwargs):
+        prompts.append(prompt)
+        yield "generated "
+        yield "text"
+
+    monkeypatch.setattr(GeminiClient, "generate_content", generate)
+    monkeypatch.setattr(GeminiClient, "generate_content_stream", stream)
+    test_client = TestClient(api.app)
+    test_client.prompts = prompts
+    return test_client
+
+
+def test_healthz_and_request_id(client):
+    response = client.get("/healthz", headers={"X-Request-ID": "abc"})
+    assert response.json() == {"status": "ok"}
+    assert response.headers["X-Request-ID"] == "abc"
+
+
+def test_missing_key_is_rejected(client, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    response = client.post("/v1/summarize", json={"text": "Some text to summarize."})
+    assert response.status_code == 401
+    assert client.prompts == []
+
+
+def test_invalid_request_is_rejected(client):
+    response = client.post("/v1/summarize", json={"text": "x", "compression": 5}, headers=HEADERS)
+    assert response.status_code == 422
+
+
+def test_summarize(client):
+    response = client.post("/v1/summarize", json={"text": "A report about quarterly revenue."}, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json() == {"content": "generated text"}
+    assert "A report about quarterly revenue." in client.prompts[0]
+
+
+def test_streaming_releases_the_slot(client):
+    response = client.post(
+        "/v1/summarize", json={"text": "A report about quarterly revenue.", "stream": True}, headers=HEADERS,
+    )
+    assert response.status_code == 200
+    assert response.text == "generated text"
+    assert api._in_flight == 0
+
+
+def test_upstream_errors_map_to_status_codes(client, monkeypatch):
+    monkeypatch.setattr(GeminiClient, "generate_content", lambda self, *args, **kwargs: ErrorText("❌ Error: boom"))
+    response = client.post("/v1/summarize", json={"text": "A report."}, headers=HEADERS)
+    assert response.status_code == 502
+    for kind, status in ((QUOTA, 429), (BUSY, 503)):
+        with pytest.raises(HTTPException) as error:
+            api._raise_for_error(ErrorText("⚠️ Not now", kind))
+        assert error.value.status_code == status
+
+
+def test_content_mentioning_error_markers_is_not_an_error(client, monkeypatch):
+    monkeypatch.setattr(GeminiClient, "generate_content", lambda self, *args, **kwargs: "Legend: ❌ fails, ⚠️ warns")
+    response = client.post("/v1/summarize", json={"text": "A report."}, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json() == {"content": "Legend: ❌ fails, ⚠️ warns"}
+
+
+def test_unread_stream_does_not_hold_a_slot():
+    async def run():
+        response = await api._stream(GeminiClient(user_api_key="test-key"), "prompt", "summarize")
+        assert api._in_flight == 0
+        del response  # Never iterated, e.g. the client disconnected before the body started
+
+    asyncio.run(run())
+    assert api._in_flight == 0
+
+
+def test_stream_reports_busy_in_the_body(monkeypatch):
+    async def saturated():
+        raise HTTPException(status_code=503, detail="Server busy, retry later.")
+
+    monkeypatch.setattr(api, "_acquire_slot", saturated)
+
+    async def run():
+        response = await api._stream(GeminiClient(user_api_key="test-key"), "prompt", "summarize")
+        return [chunk async for chunk in response.body_iterator]
+
+    assert asyncio.run(run()) == ["Server busy, retry later."]
+    assert api._in_flight == 0
+
+
+def test_metrics_report_latency_and_concurrency(client):
+    client.get("/healthz")
+    body = client.get("/metrics").json()
+    assert body["concurrency"] == {"limit": api.MAX_CONCURRENCY, "in_flight": 0}
+    assert body["endpoints"]["GET /healthz"]["count"] >= 1
+
+
+def test_streamed_latency_covers_the_whole_body(client, monkeypatch):
+    def slow_stream(self, prompt, *args, **kwargs):
+        yield "generated "
+        time.sleep(0.2)
+        yield "text"
+
+    monkeypatch.setattr(GeminiClient, "generate_content_stream", slow_stream)
+    monkeypatch.setattr(api, "metrics", MetricsRegistry())
+    response = client.post("/v1/summarize", json={"text": "A report.", "stream": True}, headers=HEADERS)
+    assert response.text == "generated text"
+    assert api.metrics.get("POST /v1/summarize").snapshot()["avg_ms"] >= 200
@@ -0,0 +1,75 @@
+import os
+import time
+
+from services.blobstore import BlobStore, SessionCache, blob_hash
+
+
+def _age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_put_get_roundtrip(tmp_path):
+    blobs = BlobStore(str(tmp_path))
+    text = "graph TD; A-->B\n" * 100
+    digest = blobs.put(text)
+    assert digest == blob_hash(text.encode("utf-8"))
+    assert blobs.get(digest) == text.encode("utf-8")
+    assert blobs.put(text) == digest
+    incompressible = os.urandom(2048)
+    assert blobs.get(blobs.put(incompressible)) == incompressible
+    assert blobs.get("0" * 64) is None
+
+
+def test_aliases_point_at_existing_blobs(tmp_path):
+    blobs = BlobStore(str(tmp_path))
+    digest = blobs.put(b"png bytes")
+    blobs.set_alias("thumbnail:abc", digest)
+    assert blobs.get_alias("thumbnail:abc") == digest
+    assert blobs.get_alias("thumbnail:missing") is None
+    os.remove(blobs._path(digest))
+    assert blobs.get_alias("thumbnail:abc") is None
+
+
+def test_prune_removes_only_stale_files(tmp_path):
+    blobs = BlobStore(str(tmp_path))
+    stale, fresh = blobs.put(b"stale"), blobs.put(b"fresh")
+    blobs.set_alias("old", stale)
+    _age(blobs._path(stale), 3600)
+    _age(blobs._alias_path("old"), 3600)
+    assert blobs.prune(60) == 2
+    assert blobs.get(stale) is None
+    assert blobs.get(fresh) == b"fresh"
+
+
+def test_reuse_keeps_blobs_from_being_pruned(tmp_path):
+    blobs = BlobStore(str(tmp_path))
+    stored, aliased = blobs.put(b"stored again"), blobs.put(b"read by alias")
+    blobs.set_alias("name", aliased)
+    for path in (blobs._path(stored), blobs._path(aliased), blobs._alias_path("name")):
+        _age(path, 3600)
+    blobs.put(b"stored again")
+    blobs.get_alias("name")
+    assert blobs.prune(60) == 0
+
+
+def test_start_pruning_is_disabled_by_zero_interval(tmp_path):
+    assert BlobStore(str(tmp_path)).start_pruning(60, interval=0) is None
+
+
+def test_session_cache_is_bounded_per_session(tmp_path):
+    cache = SessionCache(BlobStore(str(tmp_path)), max_bytes=100)
+    digests = [cache.put("s1", bytes([n]) * 40) for n in range(3)]
+    assert cache.stats()["bytes"] == 80
+    assert cache.get("s1", digests[0]) == bytes([0]) * 40  # Evicted from memory, read back from disk
+    cache.put("s2", b"x" * 500)  # Larger than the cap: stored but never held in memory
+    assert cache.stats()["sessions"] == 1
+    assert cache.stats()["bytes"] == 80
+
+
+def test_idle_sessions_are_evicted(tmp_path):
+    cache = SessionCache(BlobStore(str(tmp_path)), idle_seconds=0.05)
+    cache.put("s1", b"data")
+    time.sleep(0.1)
+    cache.evict_idle()
+    assert cache.stats() == {"sessions": 0, "bytes": 0, "max_bytes_per_session": cache.max_bytes}
@@ -0,0 +1,130 @@
+import threading
+import time
+
+from google.api_core import exceptions
+
+from services import context_cache, gemini_client
+from services.context_cache import ContextCache, LocalCacheBackend
+from services.gemini_client import GeminiClient
+
+MODEL = "gemini-2.5-flash"
+PREFIX = "You draw Mermaid diagrams. " * 400  # Well above the minimum cacheable size
+
+
+class SlowBackend:
+    """Server-side backend whose calls take a while, counting each one."""
+
+    server_side = True
+
+    def __init__(self, delay=0.2, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.creates = 0
+        self.refreshes = 0
+        self.started = threading.Event()
+
+    def create(self, api_key, model_name, prefix, ttl):
+        self.creates += 1
+        self.started.set()
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("caching not supported")
+        return f"cachedContents/{self.creates}"
+
+    def refresh(self, api_key, handle, ttl):
+        self.refreshes += 1
+
+    def delete(self, api_key, handle):
+        pass
+
+
+def test_small_prefixes_are_sent_inline():
+    cache = ContextCache(SlowBackend())
+    assert cache.handle("key", MODEL, "short prompt") is None
+    assert cache.stats()["too_small"] == 1
+
+
+def test_concurrent_callers_create_one_cache():
+    backend = SlowBackend()
+    cache = ContextCache(backend)
+    handles = []
+    threads = [threading.Thread(target=lambda: handles.append(cache.handle("key", MODEL, PREFIX))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+    assert backend.creates == 1
+    assert handles.count("cachedContents/1") == 1
+    assert handles.count(None) == 4  # Sent inline instead of waiting for the create
+    assert cache.handle("key", MODEL, PREFIX) == "cachedContents/1"
+    assert cache.stats()["hits"] == 1
+
+
+def test_stats_are_not_blocked_by_a_create():
+    backend = SlowBackend(delay=0.5)
+    cache = ContextCache(backend)
+    thread = threading.Thread(target=cache.handle, args=("key", MODEL, PREFIX))
+    thread.start()
+    backend.started.wait(1)
+    started = time.perf_counter()
+    cache.stats()
+    cache.handle("other", MODEL, "short prompt")
+    assert time.perf_counter() - started < 0.2
+    thread.join(2)
+
+
+def test_failed_creates_are_not_retried_during_backoff():
+    backend = SlowBackend(delay=0, fail=True)
+    cache = ContextCache(backend)
+    assert cache.handle("key", MODEL, PREFIX) is None
+    assert cache.handle("key", MODEL, PREFIX) is None
+    assert backend.creates == 1
+    assert cache.stats()["failures"] == 1
+
+
+def test_expiring_caches_are_refreshed(monkeypatch):
+    backend = SlowBackend(delay=0)
+    cache = ContextCache(backend, ttl=context_cache.REFRESH_MARGIN_SECONDS + 1)
+    handle = cache.handle("key", MODEL, PREFIX)
+    monkeypatch.setattr(context_cache.time, "time", lambda: time.monotonic() + 10 ** 9)
+    cache._entries[next(iter(cache._entries))].expires_at = context_cache.time.time() + 30
+    assert cache.handle("key", MODEL, PREFIX) == handle
+    assert backend.refreshes == 1
+    assert backend.creates == 1
+
+
+def test_keys_and_models_get_separate_caches():
+    backend = SlowBackend(delay=0)
+    cache = ContextCache(backend)
+    assert cache.handle("key-a", MODEL, PREFIX) != cache.handle("key-b", MODEL, PREFIX)
+    assert backend.creates == 2
+
+
+def test_local_backend_never_binds_a_handle():
+    cache = ContextCache(LocalCacheBackend())
+    assert cache.handle("key", MODEL, PREFIX) is None
+    assert cache.stats()["creates"] == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_client_binds_the_handle_and_sends_the_prefix_inline_once_it_expired(monkeypatch):
+    cache = ContextCache(SlowBackend(delay=0))
+    monkeypatch.setattr(gemini_client, "get_context_cache", lambda: cache)
+    calls = []
+
+    class Model:
+        def __init__(self, cached_content):
+            self.cached_content = cached_content
+
+        def generate_content(self, contents, **kwargs):
+            calls.append((self.cached_content, contents))
+            if self.cached_content and len(calls) > 1:
+                raise exceptions.NotFound("cached content expired")
+            return type("Response", (), {"text": "answer", "usage_metadata": None})()
+
+    monkeypatch.setattr(GeminiClient, "_model",
+                        lambda self, api_key, model_name, cached_content=None: Model(cached_content))
+    client = GeminiClient(user_api_key="key", hedge=False)
+    assert client.generate_content("first", model_name=MODEL, cached_prefix=PREFIX) == "answer"
+    assert client.generate_content("second", model_name=MODEL, cached_prefix=PREFIX) == "answer"
+    assert calls == [("cachedContents/1", "first"), ("cachedContents/1", "second"), (None, PREFIX + "second")]
@@ -0,0 +1,155 @@
+import json
+import os
+
+from services import diagram_batch
+from services.diagram_batch import MANIFEST_NAME, content_hash, find_sources, line_fixes, lint_source, run_batch
+
+FLOWCHART = "graph TD\n    A[Start] --> B[End]\n"
+
+
+def _write(root, rel_path, text):
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def _fake_render(calls):
+    def render(code, out_path, format="png", theme="default"):
+        calls.append(out_path)
+        with open(out_path, "wb") as f:
+            f.write(b"image")
+        return True, 1.0, [out_path]
+    return render
+
+
+def test_content_hash_depends_on_render_options():
+    assert content_hash(FLOWCHART) == content_hash(FLOWCHART)
+    assert content_hash(FLOWCHART, "svg") != content_hash(FLOWCHART, "png")
+    assert content_hash(FLOWCHART, theme="dark") != content_hash(FLOWCHART)
+
+
+def test_find_sources(tmp_path):
+    _write(tmp_path, "a.mmd", FLOWCHART)
+    _write(tmp_path, "nested/b.MERMAID", FLOWCHART)
+    _write(tmp_path, "notes.txt", "not a diagram")
+    assert find_sources(str(tmp_path)) == ["a.mmd", os.path.join("nested", "b.MERMAID")]
+
+
+def test_lint_source_reports_the_finalized_code():
+    result = lint_source("a.mmd", FLOWCHART)
+    assert result["file"] == "a.mmd"
+    assert "A[Start] --> B[End]" in result["code"]
+    assert isinstance(result["errors"], list)
+    assert result["lint_ms"] >= 0
+
+
+def test_line_fixes_follow_the_diff_not_the_position():
+    before = "graph TD\n    A --> B\n    B --> C"
+    assert line_fixes(before, before) == []
+    assert line_fixes(before, before.replace("B --> C", "B --> D")) == [
+        {"line": 3, "before": "    B --> C", "after": "    B --> D"},
+    ]
+    # A removed line shifts everything after it; only the removal is reported
+    assert line_fixes("%% note\n" + before, before) == [{"line": 1, "before": "%% note", "after": ""}]
+    assert line_fixes(before, before + "\n    C --> D") == [{"line": 4, "before": "", "after": "    C --> D"}]
+
+
+def test_unchanged_sources_are_skipped(tmp_path, monkeypatch):
+    src, out = tmp_path / "src", tmp_path / "out"
+    _write(src, "a.mmd", FLOWCHART)
+    _write(src, "b.mmd", FLOWCHART.replace("End", "Finish"))
+    calls = []
+    monkeypatch.setattr(diagram_batch, "render_source", _fake_render(calls))
+
+    first = run_batch(str(src), str(out), workers=1)
+    assert first["summary"]["rendered"] == 2
+    assert os.path.exists(out / "a.png")
+
+    _write(src, "b.mmd", FLOWCHART.replace("End", "Done"))
+    second = run_batch(str(src), str(out), workers=1)
+    assert second["summary"]["skipped"] == 1
+    assert second["summary"]["rendered"] == 1
+    assert len(calls) == 3
+
+    forced = run_batch(str(src), str(out), workers=1, force=True)
+    assert forced["summary"]["rendered"] == 2
+
+
+def test_failed_renders_are_retried_and_deleted_sources_forgotten(tmp_path, monkeypatch):
+    src, out = tmp_path / "src", tmp_path / "out"
+    _write(src, "a.mmd", FLOWCHART)
+    monkeypatch.setattr(diagram_batch, "render_source", lambda *args: (False, 1.0))
+    assert run_batch(str(src), str(out), workers=1)["summary"]["failed"] == 1
+    calls = []
+    monkeypatch.setattr(diagram_batch, "render_source", _fake_render(calls))
+    assert run_batch(str(src), str(out), workers=1)["summary"]["rendered"] == 1
+
+    os.remove(src / "a.mmd")
+    run_batch(str(src), str(out), workers=1)
+    with open(out / MANIFEST_NAME, encoding="utf-8") as f:
+        assert json.load(f) == {}
+
+
+def test_lint_only_run_does_not_render(tmp_path, monkeypatch):
+    src, out = tmp_path / "src", tmp_path / "out"
+    _write(src, "a.mmd", FLOWCHART)
+    calls = []
+    monkeypatch.setattr(diagram_batch, "render_source", _fake_render(calls))
+    report = run_batch(str(src), str(out), workers=1, render=False)
+    assert report["summary"]["linted"] == 1
+    assert calls == []
+    assert run_batch(str(src), str(out), workers=1, render=False)["summary"]["skipped"] == 1
+
+
+def test_paged_outputs_are_recorded_and_checked(tmp_path, monkeypatch):
+    src, out = tmp_path / "src", tmp_path / "out"
+    _write(src, "big.mmd", FLOWCHART)
+    calls = []
+
+    def render(code, out_path, format="png", theme="default"):
+        calls.append(out_path)
+        stem, ext = os.path.splitext(out_path)
+        paths = [f"{stem}.p1{ext}", f"{stem}.p2{ext}"]
+        for path in paths:
+            with open(path, "wb") as f:
+                f.write(b"page")
+        return True, 1.0, paths
+
+    monkeypatch.setattr(diagram_batch, "render_source", render)
+    run_batch(str(src), str(out), workers=1)
+    with open(out / MANIFEST_NAME, encoding="utf-8") as f:
+        assert json.load(f)["big.mmd"]["pages"] == [str(out / "big.p1.png"), str(out / "big.p2.png")]
+
+    assert run_batch(str(src), str(out), workers=1)["summary"]["skipped"] == 1
+    os.remove(out / "big.p2.png")
+    assert run_batch(str(src), str(out), workers=1)["summary"]["rendered"] == 1
+    assert len(calls) == 2
+
+
+def test_outputs_no_longer_produced_are_removed(tmp_path, monkeypatch):
+    src, out = tmp_path / "src", tmp_path / "out"
+    _write(src, "big.mmd", FLOWCHART)
+    pages = {"count": 1}
+
+    def render(code, out_path, format="png", theme="default"):
+        stem, ext = os.path.splitext(out_path)
+        paths = [out_path] if pages["count"] == 1 else [f"{stem}.p{n}{ext}" for n in range(1, pages["count"] + 1)]
+        for path in paths:
+            with open(path, "wb") as f:
+                f.write(b"image")
+        return True, 1.0, paths
+
+    monkeypatch.setattr(diagram_batch, "render_source", render)
+    _write(out, "big.svg", "<svg/>")  # Another format's output is left alone
+    run_batch(str(src), str(out), workers=1)
+
+    pages["count"] = 2
+    _write(src, "big.mmd", FLOWCHART + "    B --> C[More]\n")
+    run_batch(str(src), str(out), workers=1)
+    assert sorted(os.listdir(out)) == [MANIFEST_NAME, "big.p1.png", "big.p2.png", "big.svg"]
+
+    pages["count"] = 1
+    run_batch(str(src), str(out), workers=1, force=True)
+    assert sorted(os.listdir(out)) == [MANIFEST_NAME, "big.png", "big.svg"]
@@ -0,0 +1,51 @@
+from services.diagram_scale import analyze_diagram, diagram_type, is_oversized, split_diagram
+
+
+def _flowchart(groups, nodes_per_group):
+    lines = ["flowchart TD"]
+    for g in range(groups):
+        lines.append(f"    subgraph G{g}")
+        for n in range(nodes_per_group - 1):
+            lines.append(f"        G{g}N{n} --> G{g}N{n + 1}")
+        lines.append("    end")
+    return "\n".join(lines)
+
+
+def test_analyze_counts_nodes_edges_and_groups():
+    stats = analyze_diagram(_flowchart(3, 4))
+    assert stats["type"] == "flowchart"
+    assert stats["nodes"] == 12
+    assert stats["edges"] == 9
+    assert stats["groups"] == 3
+    assert stats["nesting"] == 1
+    assert stats["depth"] == 4  # Nodes on the longest chain
+
+
+def test_small_diagrams_are_not_split():
+    code = _flowchart(2, 3)
+    assert not is_oversized(analyze_diagram(code), max_nodes=50)
+    assert split_diagram(code, max_nodes=50) == [{"label": "Full diagram", "code": code}]
+
+
+def test_oversized_flowchart_is_split_into_pages_within_the_limit():
+    code = _flowchart(6, 10)
+    assert is_oversized(analyze_diagram(code), max_nodes=25)
+    pages = split_diagram(code, max_nodes=25)
+    assert len(pages) > 1
+    for page in pages:
+        assert diagram_type(page["code"]) == "flowchart"
+        assert analyze_diagram(page["code"])["nodes"] <= 25
+    # Every node appears on some page
+    text = "\n".join(page["code"] for page in pages)
+    assert all(f"G{g}N9" in text for g in range(6))
+
+
+def test_mindmap_is_split_by_branch():
+    lines = ["mindmap", "  root((Topics))"]
+    for b in range(4):
+        lines.append(f"    Branch{b}")
+        lines += [f"      Leaf{b}x{n}" for n in range(8)]
+    pages = split_diagram("\n".join(lines), max_nodes=12)
+    assert len(pages) > 1
+    assert all(page["code"].startswith("mindmap") for page in pages)
+    assert all("root((Topics))" in page["code"] for page in pages)
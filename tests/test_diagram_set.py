@@ -0,0 +1,86 @@
+import pytest
+
+from services.errors import ErrorText
+from services.diagram_set import assign_blocks, generate_diagram_set, split_blocks
+from services.scheduler import call_context, context_session
+
+FLOW = "flowchart TD\n    A[Start] --> B[End]"
+SEQ = "sequenceDiagram\n    Alice->>Bob: Hi"
+GANTT = "gantt\n    title Plan\n    section A\n    Task :a1, 2024-01-01, 3d"
+
+RESPONSE = f"""Here you go.
+
+### Sequence
+```mermaid
+{SEQ}
+```
+
+### Flowchart
+```mermaid
+{FLOW}
+```
+"""
+
+
+class FakeClient:
+    def __init__(self, reply=RESPONSE):
+        self.reply = reply
+        self.calls = []
+
+    def generate_content(self, prompt, route="default", cached_prefix=None, **kwargs):
+        self.calls.append((route, cached_prefix, prompt))
+        return self.reply
+
+
+def test_split_blocks_keeps_headings():
+    assert split_blocks(RESPONSE) == [("Sequence", SEQ), ("Flowchart", FLOW)]
+    assert split_blocks(f"```mermaid\n{GANTT}\n```") == [(None, GANTT)]
+    assert split_blocks("no code") == []
+
+
+def test_assign_blocks_by_heading_then_keyword_then_position():
+    blocks = [(None, GANTT), ("flowchart", FLOW), (None, SEQ), (None, "mindmap\n  root")]
+    assigned = assign_blocks(blocks, ["Flowchart", "Sequence", "Gantt", "ER Diagram"])
+    assert assigned["Flowchart"] == FLOW
+    assert assigned["Sequence"] == SEQ
+    assert assigned["Gantt"] == GANTT
+    assert assigned["ER Diagram"] == "mindmap\n  root"
+    assert assign_blocks([(None, FLOW)], ["Flowchart", "Gantt"]) == {"Flowchart": FLOW}
+
+
+def test_generate_diagram_set_uses_one_call_and_reports_missing_types():
+    client = FakeClient()
+    rendered, progress = [], []
+    result = generate_diagram_set(
+        client, "Checkout flow", ["Flowchart", "Sequence", "Gantt"],
+        render=lambda code: rendered.append(code) or b"png",
+        on_progress=lambda done, total, kind: progress.append((done, total)),
+    )
+    assert len(client.calls) == 1
+    route, rules, prompt = client.calls[0]
+    assert route == "diagram"
+    assert "Diagrams to generate (in this order): Flowchart, Sequence, Gantt" in rules
+    assert "Checkout flow" in prompt
+
+    assert [d["type"] for d in result["diagrams"]] == ["Flowchart", "Sequence"]
+    assert result["missing"] == ["Gantt"]
+    assert all(d["rendered"] for d in result["diagrams"]) and len(rendered) == 2
+    assert progress[0] == (0, 2) and progress[-1] == (2, 2)
+
+
+def test_generate_diagram_set_errors():
+    assert generate_diagram_set(FakeClient(ErrorText("❌ Error: boom")), "x", ["Flowchart"]) == "❌ Error: boom"
+    assert generate_diagram_set(FakeClient("no diagrams here"), "x", ["Flowchart"]).startswith("❌")
+
+    def check():
+        raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        generate_diagram_set(FakeClient(), "x", ["Flowchart", "Sequence"], check=check)
+
+
+def test_renders_run_in_the_callers_session():
+    sessions = []
+    with call_context(session="alice"):
+        generate_diagram_set(FakeClient(), "x", ["Flowchart", "Sequence"], render=lambda code: sessions.append(context_session()))
+    assert sessions == ["alice", "alice"]
@@ -0,0 +1,173 @@
+import threading
+import time
+
+import pytest
+
+from services import gemini_client, hedging
+from services.gemini_client import GeminiClient
+from services.hedging import HedgeBudget, Hedger, hedge_delay
+from services.key_pool import KeyPool
+from services.metrics import LatencyStats
+from services.model_router import ModelRouter
+
+
+def _slow(value, seconds, started=None):
+    def call():
+        if started is not None:
+            started.set()
+        time.sleep(seconds)
+        return value
+    return call
+
+
+def _fail(seconds):
+    def call():
+        time.sleep(seconds)
+        raise RuntimeError("upstream error")
+    return call
+
+
+def test_fast_primary_is_not_hedged():
+    hedger = Hedger(budgets={"default": 1.0})
+    backup_started = threading.Event()
+    assert hedger.run("default", _slow("primary", 0), _slow("backup", 0, backup_started), delay=1) == "primary"
+    assert not backup_started.is_set()
+    assert hedger.stats()["default"]["unhedged"] == 1
+
+
+def test_slow_primary_is_hedged_and_the_first_answer_wins():
+    hedger = Hedger(budgets={"default": 1.0})
+    assert hedger.run("default", _slow("primary", 1), _slow("backup", 0), delay=0.05) == "backup"
+    stats = hedger.stats()["default"]
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["hedge_win_rate"] == 1.0
+
+
+def test_primary_can_still_win_after_hedging():
+    hedger = Hedger(budgets={"default": 1.0})
+    assert hedger.run("default", _slow("primary", 0.1), _slow("backup", 1), delay=0.05) == "primary"
+    assert hedger.stats()["default"]["primary_wins"] == 1
+
+
+def test_failed_call_loses_to_the_other_one():
+    hedger = Hedger(budgets={"default": 1.0})
+    assert hedger.run("default", _fail(0.1), _slow("backup", 0.2), delay=0.05) == "backup"
+    with pytest.raises(RuntimeError):
+        hedger.run("default", _fail(0.1), _fail(0.1), delay=0.05)
+
+
+def test_budget_caps_the_share_of_hedged_requests():
+    hedger = Hedger(budgets={"default": 0.0, "verify": 0.0})
+    assert hedger.run("verify", _slow("primary", 0.1), _slow("backup", 0), delay=0.01) == "primary"
+    assert hedger.stats()["verify"]["budget_denied"] == 1
+
+
+def test_budget_tokens():
+    budget = HedgeBudget(0.5)
+    assert budget.spend()
+    assert not budget.spend()
+    budget.earn()
+    budget.earn()
+    assert budget.spend()
+    assert not HedgeBudget(0.0).spend()
+
+
+def test_hedge_delay_follows_the_latency_percentile():
+    stats = LatencyStats()
+    assert hedge_delay(stats) == hedging.DEFAULT_DELAY_SECONDS
+    for ms in range(1, hedging.MIN_SAMPLES + 1):
+        stats.record(ms * 1000)
+    assert hedge_delay(stats) == pytest.approx(stats.percentile(hedging.HEDGE_PERCENTILE) / 1000)
+    fast = LatencyStats()
+    for _ in range(hedging.MIN_SAMPLES):
+        fast.record(10)
+    assert hedge_delay(fast) == hedging.MIN_DELAY_SECONDS
+
+
+def test_faster_model_is_the_next_tier():
+    router = ModelRouter(tiers={"capable": "pro", "standard": "flash", "fast": "lite"})
+    assert router.faster_model("pro") == "flash"
+    assert router.faster_model("lite") == "lite"
+
+
+def test_client_hedges_a_single_key_to_the_faster_model(monkeypatch):
+    class Model:
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+        def generate_content(self, prompt, **kwargs):
+            time.sleep(1 if self.model_name == "gemini-2.5-flash" else 0)
+            return type("Response", (), {"text": f"answer from {self.model_name}"})()
+
+    monkeypatch.setattr(GeminiClient, "_model", lambda self, api_key, model_name: Model(model_name))
+    monkeypatch.setattr(gemini_client, "hedge_delay", lambda stats: 0.05)
+    monkeypatch.setattr(gemini_client, "get_hedger", lambda: Hedger(budgets={"default": 1.0}))
+    router = ModelRouter()
+    monkeypatch.setattr(gemini_client, "get_router", lambda: router)
+    client = GeminiClient(user_api_key="key", hedge=True)
+    assert client.generate_content("hello", model_name="gemini-2.5-flash") == "answer from gemini-2.5-flash-lite"
+    # Latency is credited to the model that answered
+    assert router.route_stats("default", "gemini-2.5-flash-lite").window_size() == 1
+    assert router.route_stats("default", "gemini-2.5-flash").window_size() == 0
+
+
+def test_pooled_hedge_uses_a_key_the_primary_has_not_used(monkeypatch):
+    calls = []
+
+    class Model:
+        def __init__(self, api_key):
+            self.api_key = api_key
+
+        def generate_content(self, prompt, **kwargs):
+            calls.append(self.api_key)
+            time.sleep(1 if len(calls) == 1 else 0)
+            return type("Response", (), {"text": f"answer from {self.api_key}"})()
+
+    monkeypatch.setattr(GeminiClient, "_model", lambda self, api_key, model_name: Model(api_key))
+    monkeypatch.setattr(gemini_client, "hedge_delay", lambda stats: 0.05)
+    monkeypatch.setattr(gemini_client, "get_hedger", lambda: Hedger(budgets={"default": 1.0}))
+    client = GeminiClient(key_pool=KeyPool(["key-a", "key-b"], requests_per_minute=100), hedge=True)
+    text = client.generate_content("hello")
+    assert len(calls) == 2 and calls[0] != calls[1]
+    assert text == f"answer from {calls[1]}"
+
+
+def test_key_pool_acquire_skips_excluded_keys():
+    pool = KeyPool(["key-a", "key-b"], requests_per_minute=100)
+    assert {pool.acquire(exclude={"key-a"}) for _ in range(3)} == {"key-b"}
+    assert pool.acquire(exclude={"key-a", "key-b"}) is None
+
+
+def _single_key_models(monkeypatch, calls):
+    class Model:
+        def __init__(self, api_key, model_name):
+            self.api_key, self.model_name = api_key, model_name
+
+        def generate_content(self, prompt, **kwargs):
+            calls.append((self.api_key, self.model_name))
+            time.sleep(1 if self.model_name == "gemini-2.5-flash" else 0)
+            return type("Response", (), {"text": f"answer from {self.model_name}"})()
+
+    monkeypatch.setattr(GeminiClient, "_model", lambda self, api_key, model_name: Model(api_key, model_name))
+    monkeypatch.setattr(gemini_client, "hedge_delay", lambda stats: 0.05)
+
+
+def test_single_pooled_key_hedges_to_the_faster_model_on_the_same_key(monkeypatch):
+    calls = []
+    _single_key_models(monkeypatch, calls)
+    monkeypatch.setattr(gemini_client, "get_hedger", lambda: Hedger(budgets={"default": 1.0}))
+    client = GeminiClient(key_pool=KeyPool(["key-a"], requests_per_minute=100), hedge=True)
+    assert client.generate_content("hello", model_name="gemini-2.5-flash") == "answer from gemini-2.5-flash-lite"
+    assert calls == [("key-a", "gemini-2.5-flash"), ("key-a", "gemini-2.5-flash-lite")]
+
+
+def test_single_key_on_the_fastest_model_is_not_hedged(monkeypatch):
+    calls = []
+    _single_key_models(monkeypatch, calls)
+    hedger = Hedger(budgets={"default": 1.0})
+    monkeypatch.setattr(gemini_client, "get_hedger", lambda: hedger)
+    client = GeminiClient(key_pool=KeyPool(["key-a"], requests_per_minute=100), hedge=True)
+    assert client.generate_content("hello", model_name="gemini-2.5-flash-lite") == "answer from gemini-2.5-flash-lite"
+    assert calls == [("key-a", "gemini-2.5-flash-lite")]
+    assert hedger.stats() == {}
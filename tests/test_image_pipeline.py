@@ -0,0 +1,81 @@
+import io
+import threading
+
+from PIL import Image
+
+from services.blobstore import BlobStore, blob_hash
+from services import image_pipeline
+from services.image_pipeline import ImagePipeline, derive, open_image, to_jpg
+
+
+def _png(size=(1200, 600), mode="RGBA", color=(255, 0, 0, 0)):
+    output = io.BytesIO()
+    Image.new(mode, size, color).save(output, format="PNG")
+    return output.getvalue()
+
+
+def _open(data):
+    return Image.open(io.BytesIO(data))
+
+
+def test_jpg_flattens_transparency_onto_white():
+    image = _open(to_jpg(Image.open(io.BytesIO(_png(size=(10, 10))))))
+    assert image.format == "JPEG"
+    assert image.getpixel((5, 5)) == (255, 255, 255)
+
+
+def test_thumbnail_keeps_aspect_ratio_within_the_size():
+    thumb = _open(derive(_png(), "thumb"))
+    assert thumb.format == "WEBP"
+    assert thumb.size == (256, 128)
+    assert _open(derive(_png(size=(100, 50)), "thumb")).size == (100, 50)
+
+
+def test_jpeg_sources_are_drafted_for_thumbnails():
+    jpg = to_jpg(Image.new("RGB", (2048, 2048), "blue"))
+    assert max(open_image(jpg, ("thumb",)).size) < 2048
+    assert open_image(jpg).size == (2048, 2048)
+
+
+def test_pipeline_builds_each_variant_once(tmp_path):
+    pipeline = ImagePipeline(BlobStore(str(tmp_path)), workers=1)
+    png = _png()
+    digest = pipeline.submit(png, thumbnail_key="item-1")
+    assert digest == blob_hash(png)
+    assert _open(pipeline.get(digest, "jpg", wait=10)).format == "JPEG"
+    assert _open(pipeline.get(digest, "webp", wait=10)).format == "WEBP"
+    assert pipeline.thumbnail("item-1") == pipeline.get(digest, "thumb")
+
+    assert pipeline.submit(png, thumbnail_key="item-2") == digest
+    assert pipeline.thumbnail("item-2") == pipeline.thumbnail("item-1")
+    stats = pipeline.stats()
+    assert (stats["submitted"], stats["built"], stats["reused"], stats["failed"]) == (1, 1, 1, 0)
+
+
+def test_unknown_or_broken_sources(tmp_path):
+    pipeline = ImagePipeline(BlobStore(str(tmp_path)), workers=1)
+    assert pipeline.get("0" * 64, "jpg", wait=1) is None
+    assert pipeline.thumbnail("missing") is None
+    digest = pipeline.submit(b"not an image")
+    assert pipeline.get(digest, "jpg", wait=10) is None
+    assert pipeline.stats()["failed"] == 1
+
+
+def test_every_thumbnail_key_submitted_while_pending_is_aliased(tmp_path, monkeypatch):
+    release = threading.Event()
+    real_open = image_pipeline.open_image
+
+    def slow_open(data, variants):
+        release.wait(5)
+        return real_open(data, variants)
+
+    monkeypatch.setattr(image_pipeline, "open_image", slow_open)
+    pipeline = ImagePipeline(BlobStore(str(tmp_path)), workers=1)
+    png = _png()
+    digest = pipeline.submit(png, thumbnail_key="item-1")
+    assert pipeline.submit(png, thumbnail_key="item-2") == digest
+    release.set()
+    thumb = pipeline.get(digest, "thumb", wait=10)
+    assert thumb is not None
+    assert pipeline.thumbnail("item-1") == pipeline.thumbnail("item-2") == thumb
+    assert pipeline.stats()["submitted"] == 1
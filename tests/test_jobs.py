@@ -0,0 +1,142 @@
+import threading
+import time
+
+import pytest
+
+from services.gemini_client import GeminiClient
+from services.jobs import CANCELLED, DONE, FAILED, TIMED_OUT, JobCancelled, JobManager, JobQueueFull, fan_out
+from services.scheduler import call_context, context_session
+
+
+def _wait(manager, job_id, timeout=2.0):
+    deadline = time.time() + timeout
+    while manager.get(job_id).is_active:
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+    return manager.get(job_id)
+
+
+def test_jobs_run_in_the_background_and_report_progress():
+    manager = JobManager(max_workers=1)
+
+    def work(job, value):
+        job.update(0.5, "Half way")
+        return value * 2
+
+    job = _wait(manager, manager.submit(work, 21, label="Double"))
+    assert (job.status, job.result, job.progress) == (DONE, 42, 1.0)
+    assert manager.stats() == {DONE: 1}
+
+
+def test_active_jobs_are_deduplicated_by_key():
+    manager = JobManager(max_workers=2)
+    release = threading.Event()
+
+    def work(job, value):
+        release.wait(2)
+        return value
+
+    first = manager.submit(work, 1, key="same")
+    assert manager.submit(work, 2, key="same") == first
+    assert manager.submit(work, 3, key="other") != first
+    release.set()
+    assert _wait(manager, first).result == 1
+    assert manager.submit(work, 4, key="same") != first  # Finished jobs are not reused
+
+
+def test_failed_jobs_report_an_error_message():
+    manager = JobManager(max_workers=1)
+
+    def work(job):
+        raise RuntimeError("boom")
+
+    job = _wait(manager, manager.submit(work))
+    assert job.status == FAILED
+    assert job.error == "❌ Error: boom"
+
+
+def test_cancelled_job_stops_at_its_next_check():
+    manager = JobManager(max_workers=1)
+    started, steps = threading.Event(), []
+
+    def work(job):
+        started.set()
+        for step in range(100):
+            job.update(step / 100)
+            steps.append(step)
+            time.sleep(0.01)
+
+    job_id = manager.submit(work)
+    started.wait(2)
+    manager.cancel(job_id)
+    job = manager.get(job_id)
+    assert job.status == CANCELLED
+    time.sleep(0.05)
+    assert len(steps) < 100
+
+
+def test_jobs_time_out_at_their_deadline():
+    manager = JobManager(max_workers=1)
+
+    def work(job):
+        while True:
+            job.check()
+            time.sleep(0.01)
+
+    job = _wait(manager, manager.submit(work, timeout=0.1))
+    assert job.status == TIMED_OUT
+    assert job.remaining() == 1.0
+
+
+def test_queue_is_bounded():
+    manager = JobManager(max_workers=1, max_pending=1)
+    release = threading.Event()
+    manager.submit(lambda job: release.wait(2))
+    with pytest.raises(JobQueueFull):
+        manager.submit(lambda job: None)
+    release.set()
+
+
+def test_client_calls_are_bounded_by_the_job_deadline(monkeypatch):
+    client = GeminiClient(user_api_key="key", request_timeout=60)
+    assert client._request_options() == {"timeout": 60}
+    client.deadline = time.time() + 5
+    assert 4 < client._request_options()["timeout"] <= 5
+
+    calls = []
+    monkeypatch.setattr(GeminiClient, "_model", lambda self, api_key, model_name: calls.append(model_name))
+    client.deadline = time.time() - 1
+    assert client.generate_content("prompt", route="code").startswith("❌")
+    assert calls == []
+
+
+def test_fan_out_returns_every_result_and_reports_progress():
+    seen = []
+    results = fan_out(lambda n: n * n, range(5), concurrency=3, on_result=lambda n, r: seen.append(n))
+    assert results == {n: n * n for n in range(5)}
+    assert sorted(seen) == list(range(5))
+
+
+def test_fan_out_workers_see_the_callers_context():
+    with call_context(session="alice"):
+        results = fan_out(lambda n: context_session(), range(3), concurrency=3)
+    assert set(results.values()) == {"alice"}
+
+
+def test_fan_out_stops_starting_work_once_cancelled():
+    cancelled = threading.Event()
+    started = []
+
+    def check():
+        if cancelled.is_set():
+            raise JobCancelled("cancelled")
+
+    def work(n):
+        started.append(n)
+        cancelled.set()
+        time.sleep(0.05)
+        return n
+
+    with pytest.raises(JobCancelled):
+        fan_out(work, range(10), concurrency=1, check=check)
+    assert started == [0]
@@ -0,0 +1,99 @@
+import pytest
+from google.api_core import exceptions
+
+from services import key_pool
+from services.gemini_client import GeminiClient
+from services.key_pool import KeyPool
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Model:
+    """Stands in for `GenerativeModel`; keys listed in `exhausted` answer with a 429."""
+
+    def __init__(self, api_key, exhausted, calls):
+        self.api_key = api_key
+        self.exhausted = exhausted
+        self.calls = calls
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls.append(self.api_key)
+        if self.api_key in self.exhausted:
+            raise exceptions.ResourceExhausted("429 quota exceeded")
+        return _Response(f"answer from {self.api_key}")
+
+
+def _fake_models(monkeypatch, exhausted=()):
+    calls = []
+    monkeypatch.setattr(GeminiClient, "_model", lambda self, api_key, model_name: _Model(api_key, exhausted, calls))
+    return calls
+
+
+def test_pool_needs_keys():
+    with pytest.raises(ValueError):
+        KeyPool([])
+
+
+def test_requests_go_to_the_key_with_most_quota_left():
+    pool = KeyPool(["key-a", "key-b"], requests_per_minute=2)
+    picks = [pool.acquire() for _ in range(4)]
+    assert sorted(picks) == ["key-a", "key-a", "key-b", "key-b"]
+    assert pool.acquire() is None
+
+
+def test_rate_limited_keys_are_quarantined(monkeypatch):
+    pool = KeyPool(["key-a", "key-b"], requests_per_minute=100)
+    pool.report("key-a", ok=False, rate_limited=True)
+    assert {pool.acquire() for _ in range(5)} == {"key-b"}
+    stats = {row["key"]: row for row in pool.stats()}
+    assert stats["key-a…ey-a"]["rate_limited"] == 1
+    assert stats["key-a…ey-a"]["quarantined_for_s"] > 0
+
+    later = key_pool.time.time() + key_pool.QUOTA_WINDOW_SECONDS + 1
+    monkeypatch.setattr(key_pool.time, "time", lambda: later)
+    assert "key-a" in {pool.acquire() for _ in range(5)}
+
+
+def test_repeated_429s_back_off_further():
+    pool = KeyPool(["key-a"], requests_per_minute=100)
+    pool.report("key-a", ok=False, rate_limited=True)
+    first = pool._states["key-a"].quarantined_until
+    pool.report("key-a", ok=False, rate_limited=True)
+    pool.report("key-a", ok=False, rate_limited=True)
+    assert pool._states["key-a"].quarantined_until > first
+    pool.report("key-a", ok=True)
+    assert pool._states["key-a"].consecutive_429 == 0
+
+
+def test_stats_mask_keys():
+    pool = KeyPool(["AIzaSecretKey1234"])
+    pool.acquire()
+    row = pool.stats()[0]
+    assert row["key"] == "AIzaSe…1234"
+    assert row["requests"] == 1
+
+
+def test_client_retries_the_next_key_on_a_429(monkeypatch):
+    calls = _fake_models(monkeypatch, exhausted={"key-a"})
+    pool = KeyPool(["key-a", "key-b"], requests_per_minute=100)
+    pool.report("key-b", ok=True, latency_ms=1000.0)  # Slower, so key-a is tried first
+    client = GeminiClient(key_pool=pool)
+    assert client.generate_content("hello") == "answer from key-b"
+    assert calls == ["key-a", "key-b"]
+
+
+def test_client_reports_quota_when_every_key_is_exhausted(monkeypatch):
+    _fake_models(monkeypatch, exhausted={"key-a", "key-b"})
+    client = GeminiClient(key_pool=KeyPool(["key-a", "key-b"], requests_per_minute=100))
+    assert "Quota" in client.generate_content("hello")
+
+
+def test_user_key_bypasses_the_pool(monkeypatch):
+    calls = _fake_models(monkeypatch)
+    client = GeminiClient(user_api_key="own-key", key_pool=KeyPool(["key-a"]))
+    assert client.key_pool is None
+    assert client.generate_content("hello") == "answer from own-key"
+    assert calls == ["own-key"]
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from google.api_core import exceptions
+
+from services import llm_backend
+from services.llm_backend import MockBackend, RecordBackend, mock_text, parse_errors, parse_latency, request_key
+
+
+class _Inner:
+    """Stand-in for the live `GenerativeModel` wrapped by the record backend."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def generate_content(self, contents, stream=False, generation_config=None, **kwargs):
+        response = llm_backend._Response(self.text, contents)
+        return iter([llm_backend._Response(self.text[:3]), llm_backend._Response(self.text[3:])]) if stream else response
+
+
+def test_parse_latency_and_errors():
+    assert parse_latency("800") == (800.0, 800.0)
+    assert parse_latency("200-1500") == (200.0, 1500.0)
+    assert parse_errors("429:0.05, 500:0.01") == {"429": 0.05, "500": 0.01}
+    assert parse_errors("") == {}
+    with pytest.raises(ValueError):
+        parse_errors("418:1")
+
+
+def test_mock_text_is_deterministic_and_parser_friendly():
+    assert mock_text("hello") == mock_text("hello") != mock_text("bye")
+    assert mock_text("Create a Mermaid diagram").startswith("```mermaid\nflowchart TD")
+    segments = mock_text("Translate:\n\n[[SEG 0]]\nHello\n\n[[SEG 1]]\nWorld")
+    assert segments == "[[SEG 0]]\n[mock] Hello\n\n[[SEG 1]]\n[mock] World"
+    schema = {"type": "object", "properties": {"title": {"type": "string"}, "items": {"type": "array", "items": {"type": "integer"}}}}
+    data = json.loads(mock_text("quiz", {"response_schema": schema}))
+    assert isinstance(data["title"], str) and len(data["items"]) == 3
+
+
+def test_mock_backend_streams_and_counts_calls():
+    backend = MockBackend(path=None, latency_ms="0", errors="", seed=1)
+    model = backend.model("key", "gemini-2.5-flash")
+    assert model.generate_content("hello").text == mock_text("hello")
+    assert "".join(chunk.text for chunk in model.generate_content("hello", stream=True)) == mock_text("hello")
+    assert backend.stats() == {"mode": "mock", "recordings": 0, "calls": 2, "replayed": 0, "mocked": 2, "injected_errors": 0}
+
+
+def test_mock_backend_injects_errors_and_deadlines():
+    backend = MockBackend(path=None, latency_ms="0", errors="429:1", seed=1)
+    with pytest.raises(exceptions.ResourceExhausted):
+        backend.model("key", "m").generate_content("hello")
+    assert backend.stats()["injected_errors"] == 1
+
+    slow = MockBackend(path=None, latency_ms="5000", errors="", seed=1)
+    with pytest.raises(exceptions.DeadlineExceeded):
+        slow.model("key", "m").generate_content("hello", request_options={"timeout": 0.01})
+
+
+def test_record_then_replay(tmp_path, monkeypatch):
+    path = str(tmp_path / "rec" / "calls.jsonl")
+    recorder = RecordBackend(path)
+    texts = iter(["first answer", "streamed answer"])
+    monkeypatch.setattr(llm_backend.LiveBackend, "model",
+                        lambda self, api_key, model_name, cached_content=None: _Inner(next(texts)))
+
+    assert recorder.model("key", "m").generate_content("q1").text == "first answer"
+    assert "".join(c.text for c in recorder.model("key", "m").generate_content("q2", stream=True)) == "streamed answer"
+    assert recorder.stats()["recorded"] == 2
+
+    entries = [json.loads(line) for line in open(path, encoding="utf-8")]
+    assert [e["key"] for e in entries] == [request_key("m", "q1"), request_key("m", "q2")]
+    assert entries[1]["first_token_ms"] is not None
+
+    replay = MockBackend(path=path, latency_ms="0", errors="", seed=1, latency_scale=0)
+    model = replay.model("other-key", "m")
+    assert model.generate_content("q1").text == "first answer"
+    assert model.generate_content("q2").text == "streamed answer"
+    assert model.generate_content("unseen").text == mock_text("unseen")
+    stats = replay.stats()
+    assert (stats["recordings"], stats["replayed"], stats["mocked"]) == (2, 2, 1)
+
+
+def test_live_model_is_bound_to_the_cached_content():
+    backend = llm_backend.LiveBackend()
+    assert backend.model(None, "gemini-2.5-flash", "cachedContents/abc")._cached_content == "cachedContents/abc"
+    assert getattr(backend.model(None, "gemini-2.5-flash"), "_cached_content", None) is None
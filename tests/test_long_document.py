@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from services.errors import QUOTA, ErrorText
+from services.gemini_client import GeminiClient
+from services.long_document import (
+    anchor, assemble, clean_section, dump_result, generate_long_document, load_result, parse_outline,
+)
+
+OUTLINE = {
+    "title": "Payments BRD",
+    "sections": [
+        {"heading": "1. Overview", "summary": "Why."},
+        {"heading": "Table of Contents", "summary": "skip"},
+        {"heading": "Scope", "summary": "What."},
+        {"heading": "scope", "summary": "duplicate"},
+        {"heading": "Risks", "summary": "What could go wrong."},
+    ],
+}
+
+
+class FakeClient:
+    def __init__(self, plan=json.dumps(OUTLINE), fail=()):
+        self.plan = plan
+        self.fail = fail
+        self.calls = []
+
+    def generate_content(self, prompt, route="default", cached_prefix=None, **kwargs):
+        self.calls.append((route, cached_prefix, prompt))
+        if route == "document_outline":
+            return self.plan
+        heading = prompt.split('"', 2)[1]
+        if heading in self.fail:
+            return ErrorText("❌ Error: section failed")
+        return f"```markdown\n## {heading}\nBody of {heading}.\n```"
+
+
+def test_parse_outline_cleans_and_dedupes_headings():
+    title, sections = parse_outline(f"```json\n{json.dumps(OUTLINE)}\n```")
+    assert title == "Payments BRD"
+    assert [s["heading"] for s in sections] == ["Overview", "Scope", "Risks"]
+    assert parse_outline(json.dumps({"sections": [{"heading": "A"}]}))[0] == "Untitled Document"
+    with pytest.raises(ValueError):
+        parse_outline("not json")
+    with pytest.raises(ValueError):
+        parse_outline(json.dumps({"title": "Empty", "sections": []}))
+
+
+def test_clean_section_and_anchor():
+    assert clean_section("```markdown\n## Scope\nBody.\n```") == "Body."
+    assert clean_section("### Sub\nBody.") == "### Sub\nBody."
+    assert anchor("2. Scope & Goals") == "2-scope--goals"
+
+
+def test_assemble_marks_pending_sections():
+    outline = [{"heading": "Overview", "summary": ""}, {"heading": "Scope", "summary": ""}]
+    text = assemble("Doc", outline, {0: "Intro."}, include_toc=True, author="Ana", version="2.0")
+    assert text.startswith("# Doc\n\n**Author:** Ana  \n**Version:** 2.0\n\n## Table of Contents")
+    assert "- [2. Scope](#2-scope)" in text
+    assert "## 1. Overview\n\nIntro." in text
+    assert "## 2. Scope\n\n_⏳ Writing this section..._" in text
+    assert "Table of Contents" not in assemble("Doc", outline, {}, include_toc=False)
+
+
+def test_generate_long_document_writes_every_section():
+    client = FakeClient(fail=("Risks",))
+    progress, partials = [], []
+    result = generate_long_document(
+        client, "Card payments", include_meta=False, context_text="uploaded notes",
+        on_progress=lambda done, total, heading: progress.append((done, total)), on_partial=partials.append,
+    )
+    assert [route for route, _, _ in client.calls].count("document") == 3
+    assert all(prefix and "uploaded notes" in prefix for _, prefix, _ in client.calls)
+    assert result["title"] == "Payments BRD"
+    assert "## 2. Scope\n\nBody of Scope." in result["content"]
+    assert result["errors"] == {2: ("Risks", "❌ Error: section failed")}
+    assert sorted(result["bodies"]) == [0, 1]
+    assert "## 3. Risks\n\n_This section could not be written._" in result["content"]
+    assert "**Author:**" not in result["content"]
+    assert progress[0] == (0, 3) and progress[-1] == (3, 3)
+    assert len(partials) == 4 and partials[-1] == result["content"]
+
+
+def test_generate_long_document_outline_errors():
+    assert generate_long_document(FakeClient(plan=ErrorText("⚠️ Quota", QUOTA)), "x") == "⚠️ Quota"
+    assert generate_long_document(FakeClient(plan="nonsense"), "x").startswith("❌ Document outline")
+
+
+def test_retry_rewrites_only_the_failed_sections():
+    # The UI keeps the failed result as JSON in the blob store between reruns
+    first = load_result(dump_result(generate_long_document(FakeClient(fail=("Risks",)), "Card payments")))
+    assert first["errors"] == {2: ("Risks", "❌ Error: section failed")}
+    assert GeminiClient.is_error_response(first["errors"][2][1])
+    client = FakeClient()
+    progress = []
+    result = generate_long_document(
+        client, "Card payments", previous=first, on_progress=lambda done, total, heading: progress.append(done),
+    )
+    assert [route for route, _, _ in client.calls] == ["document"]
+    assert result["errors"] == {}
+    assert "## 3. Risks\n\nBody of Risks." in result["content"]
+    assert "## 1. Overview\n\nBody of Overview." in result["content"]
+    assert progress == [2, 3]
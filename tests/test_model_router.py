@@ -0,0 +1,93 @@
+import pytest
+from google.api_core import exceptions
+
+from services import gemini_client, model_router
+from services.gemini_client import GeminiClient
+from services.model_router import MIN_SAMPLES, P95_THRESHOLD_MS, ModelRouter, parse_routes
+
+TIERS = {"capable": "pro", "standard": "flash", "fast": "lite"}
+ROUTES = {"default": "standard", "document": "capable", "verify": "fast"}
+
+
+def _router():
+    return ModelRouter(routes=ROUTES, tiers=TIERS)
+
+
+def test_routes_pick_their_tier():
+    router = _router()
+    assert router.choose("document") == "pro"
+    assert router.choose("verify") == "lite"
+    assert router.choose() == "flash"
+    assert router.choose("unknown") == "flash"
+
+
+def test_every_route_names_a_known_tier():
+    assert set(model_router.ROUTES.values()) <= set(model_router.MODEL_TIERS)
+
+
+def test_pro_is_opt_in():
+    assert "capable" not in model_router.ROUTES.values()
+    routes = parse_routes("document=capable, code = Capable,")
+    assert (routes["document"], routes["code"], routes["summarize"]) == ("capable", "capable", "standard")
+    assert parse_routes("") == model_router.ROUTES
+    with pytest.raises(ValueError):
+        parse_routes("document=huge")
+
+
+def test_slow_model_falls_back_to_the_next_tier():
+    router = _router()
+    router._last_probe["capable"] = model_router.time.time()  # No probe due yet
+    for _ in range(MIN_SAMPLES):
+        router.record("document", "pro", P95_THRESHOLD_MS["capable"] * 2)
+    assert not router.is_healthy("capable")
+    assert router.choose("document") == "flash"
+
+
+def test_failing_model_falls_back_to_the_next_tier():
+    router = _router()
+    router._last_probe["standard"] = model_router.time.time()
+    for _ in range(MIN_SAMPLES):
+        router.record("default", "flash", 100, ok=False)
+    assert router.choose() == "lite"
+
+
+def test_degraded_model_is_probed_again(monkeypatch):
+    router = _router()
+    for _ in range(MIN_SAMPLES):
+        router.record("document", "pro", 100, ok=False)
+    assert router.choose("document") == "pro"  # First probe
+    assert router.choose("document") == "flash"
+    later = model_router.time.time() + model_router.PROBE_INTERVAL_SECONDS + 1
+    monkeypatch.setattr(model_router.time, "time", lambda: later)
+    assert router.choose("document") == "pro"
+
+
+def test_stats_group_by_model_and_route():
+    router = _router()
+    router.record("document", "pro", 120)
+    stats = router.stats()
+    assert stats["models"]["pro"]["count"] == 1
+    assert stats["routes"]["document:pro"]["count"] == 1
+    assert stats["tiers"]["capable"] == {"model": "pro", "healthy": True}
+
+
+def test_quota_errors_do_not_count_against_the_model(monkeypatch):
+    class Model:
+        def __init__(self, error):
+            self.error = error
+
+        def generate_content(self, *args, **kwargs):
+            raise self.error
+
+    router = _router()
+    monkeypatch.setattr(gemini_client, "get_router", lambda: router)
+    client = GeminiClient(user_api_key="key")
+    monkeypatch.setattr(GeminiClient, "_model", lambda self, api_key, model_name: Model(exceptions.ResourceExhausted("429")))
+    assert client.generate_content("hello").kind == "quota"
+    assert "".join(client.generate_content_stream("hello")).count("Quota")
+    assert router.metrics.get("model:flash").window_size() == 0
+
+    monkeypatch.setattr(GeminiClient, "_model", lambda self, api_key, model_name: Model(RuntimeError("boom")))
+    assert client.generate_content("hello") == "❌ Error: boom"
+    assert GeminiClient.is_error_response(client.generate_content("hello"))
+    assert router.metrics.get("model:flash").error_rate() == 1.0
@@ -0,0 +1,11 @@
+import pytest
+
+from services.parsing import parse_json_response
+
+
+def test_parse_json_response():
+    assert parse_json_response('```json\n{"title": "Plan"}\n```') == {"title": "Plan"}
+    assert parse_json_response('Here it is:\n```\n[1, 2]\n```') == [1, 2]
+    assert parse_json_response('{"a": 1}') == {"a": 1}
+    with pytest.raises(ValueError, match="Outline is not valid JSON"):
+        parse_json_response("not json", "Outline")
@@ -0,0 +1,114 @@
+import io
+import json
+import re
+import threading
+import time
+import zipfile
+
+import pytest
+
+from services.errors import ErrorText
+from services.project_gen import build_zip, generate_project, parse_manifest, safe_path, strip_code_fence
+
+PLAN = {
+    "name": "todo app",
+    "files": [
+        {"path": "app/main.py", "purpose": "Entry point"},
+        {"path": "./app/models.py", "purpose": "Data models"},
+        {"path": "app/main.py", "purpose": "Duplicate"},
+        {"path": "../etc/passwd", "purpose": "Escapes the root"},
+        {"path": "README.md", "purpose": "Docs"},
+    ],
+}
+
+
+class FakeClient:
+    def __init__(self, plan=None, fail=(), delay=0.0):
+        self.plan = json.dumps(PLAN) if plan is None else plan
+        self.fail = fail
+        self.delay = delay
+        self.calls = []
+        self.active = self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, route=None, **kwargs):
+        if route == "project_plan":
+            return self.plan
+        path = re.search(r"contents of `(.+?)`", prompt).group(1)
+        with self._lock:
+            self.calls.append(path)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if path in self.fail:
+            return ErrorText("❌ Error: boom")
+        return f"```python\n# {path}\n```"
+
+
+def test_safe_path():
+    assert safe_path(" ./src\\app.py ") == "src/app.py"
+    assert safe_path("/abs/path.py") == "abs/path.py"
+    assert safe_path("../up.py") is None
+    assert safe_path("C:/windows.py") is None
+    assert safe_path(".") is None
+
+
+def test_parse_manifest_drops_unsafe_and_duplicate_paths():
+    name, files = parse_manifest(f"```json\n{json.dumps(PLAN)}\n```")
+    assert name == "todo-app"
+    assert [f["path"] for f in files] == ["app/main.py", "app/models.py", "README.md"]
+    with pytest.raises(ValueError):
+        parse_manifest("not json")
+    with pytest.raises(ValueError):
+        parse_manifest(json.dumps({"name": "x", "files": []}))
+
+
+def test_strip_code_fence():
+    assert strip_code_fence("```python\nprint(1)\n```") == "print(1)\n"
+    assert strip_code_fence("  plain  ") == "plain\n"
+
+
+def test_files_are_generated_concurrently_in_plan_order():
+    client = FakeClient(delay=0.1)
+    progress = []
+    result = generate_project(client, "A todo app", concurrency=3, on_progress=lambda *args: progress.append(args))
+    assert result["name"] == "todo-app"
+    assert list(result["files"]) == ["app/main.py", "app/models.py", "README.md"]
+    assert result["files"]["README.md"] == "# README.md\n"
+    assert result["errors"] == {}
+    assert client.peak > 1
+    assert progress[0] == (0, 3, None)
+    assert progress[-1][:2] == (3, 3)
+
+
+def test_failed_files_are_reported_separately():
+    result = generate_project(FakeClient(fail={"app/models.py"}), "A todo app")
+    assert list(result["files"]) == ["app/main.py", "README.md"]
+    assert result["errors"] == {"app/models.py": "❌ Error: boom"}
+
+
+def test_planning_errors_are_returned():
+    assert generate_project(FakeClient(plan=ErrorText("❌ Error: quota")), "x") == "❌ Error: quota"
+    assert generate_project(FakeClient(plan="not json"), "x").startswith("❌ Project plan is not valid JSON")
+
+
+def test_check_stops_the_remaining_files():
+    class Cancelled(Exception):
+        pass
+
+    def check():
+        raise Cancelled()
+
+    client = FakeClient()
+    with pytest.raises(Cancelled):
+        generate_project(client, "x", concurrency=1, check=check)
+    assert client.calls == []
+
+
+def test_build_zip():
+    data = build_zip("demo", {"a.py": "print(1)\n", "pkg/b.py": ""})
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert sorted(archive.namelist()) == ["demo/a.py", "demo/pkg/b.py"]
+        assert archive.read("demo/a.py") == b"print(1)\n"
@@ -0,0 +1,77 @@
+import time
+
+from services import prompts
+from services.prompt_cache import DEFAULT_THRESHOLDS, PromptCache, canonicalize, parse_thresholds
+
+HEAD = "You are a helpful assistant that summarizes text.\n"
+BODY = ("Please summarize the quarterly report for the board. Revenue grew in "
+        "every region and costs fell, but hiring slowed in the second half of 2024.")
+
+
+def test_canonical_duplicates_hit():
+    cache = PromptCache()
+    cache.put("summarize", HEAD + BODY, "summary", owner="alice")
+    assert cache.get("summarize", HEAD + "  " + BODY.upper() + "!!", owner="alice") == "summary"
+    assert cache.stats()["routes"]["summarize"]["exact_hits"] == 1
+
+
+def test_entries_are_scoped_to_their_owner():
+    cache = PromptCache()
+    cache.put("summarize", HEAD + BODY, "summary", owner="alice")
+    assert cache.get("summarize", HEAD + BODY, owner="bob") is None
+    assert cache.get("summarize", HEAD + BODY) is None
+
+
+def test_generation_config_is_part_of_the_scope():
+    cache = PromptCache()
+    cache.put("summarize", HEAD + BODY, "summary", generation_config={"temperature": 0}, owner="alice")
+    assert cache.get("summarize", HEAD + BODY, generation_config={"temperature": 1}, owner="alice") is None
+
+
+def test_near_duplicates_only_match_when_enabled():
+    near = BODY.replace("board", "directors")
+    exact_only = PromptCache()
+    exact_only.put("summarize", HEAD + BODY, "summary", owner="alice")
+    assert exact_only.get("summarize", HEAD + near, owner="alice") is None
+
+    fuzzy = PromptCache(thresholds={"summarize": 0.8})
+    fuzzy.put("summarize", HEAD + BODY, "summary", owner="alice")
+    assert fuzzy.get("summarize", HEAD + near, owner="alice") == "summary"
+    assert fuzzy.get("summarize", HEAD + BODY.replace("2024", "2025"), owner="alice") is None
+
+
+def test_uncached_routes_are_ignored():
+    cache = PromptCache()
+    cache.put("code", HEAD + BODY, "code", owner="alice")
+    assert cache.get("code", HEAD + BODY, owner="alice") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_grammar_checks_are_not_answered_from_a_differently_punctuated_text():
+    cache = PromptCache()
+    sloppy, clean = "the meeting is on monday i think", "The meeting is on Monday, I think."
+    cache.put("analyze", prompts.build_analysis_prompt(clean, grammar=True), "No errors.", owner="alice")
+    assert cache.get("analyze", prompts.build_analysis_prompt(sloppy, grammar=True), owner="alice") is None
+    assert "analyze" not in DEFAULT_THRESHOLDS
+
+
+def test_entries_expire_and_are_bounded():
+    cache = PromptCache(max_entries=2, ttl=0.05)
+    for n in range(3):
+        cache.put("summarize", HEAD + f"{BODY} item {n}", str(n), owner="alice")
+    assert cache.stats()["entries"] == 2
+    assert cache.get("summarize", HEAD + f"{BODY} item 0", owner="alice") is None
+    time.sleep(0.1)
+    assert cache.get("summarize", HEAD + f"{BODY} item 2", owner="alice") is None
+
+
+def test_parse_thresholds():
+    assert parse_thresholds("") == DEFAULT_THRESHOLDS
+    thresholds = parse_thresholds("summarize=off, translate=0.9, email=2")
+    assert "summarize" not in thresholds
+    assert thresholds["translate"] == 0.9
+    assert thresholds["email"] == 1.0
+
+
+def test_canonicalize():
+    assert canonicalize("  Hello,   WORLD! ") == "hello world"
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from services import prompts
+from services.quiz import Question, Quiz, parse_quiz, render_quiz
+
+QUIZ = {
+    "title": "Planets",
+    "questions": [
+        {"type": "MCQ", "question": "Largest planet?", "options": ["Mars", "Jupiter", "Venus", "Earth"],
+         "answer": "Jupiter", "explanation": "It is a gas giant."},
+        {"type": "True/False", "question": "Pluto is a planet.", "answer": "False"},
+        {"type": "Short Answer", "question": "Closest planet to the Sun?", "answer": "Mercury"},
+    ],
+}
+
+
+def test_parse_quiz_from_plain_and_fenced_json():
+    quiz = parse_quiz(json.dumps(QUIZ))
+    assert quiz.title == "Planets"
+    assert [q.type for q in quiz.questions] == ["MCQ", "True/False", "Short Answer"]
+    assert quiz.questions[0].options[1] == "Jupiter"
+    assert parse_quiz(f"```json\n{json.dumps(QUIZ)}\n```") == quiz
+
+
+def test_parse_quiz_accepts_a_bare_list_and_skips_empty_items():
+    quiz = parse_quiz(json.dumps([{"question": "Why?", "answer": "Because"}, {"question": ""}, "junk"]))
+    assert quiz.title == "Quiz"
+    assert quiz.questions == [Question("Short Answer", "Why?", "Because")]
+
+
+def test_parse_quiz_rejects_invalid_responses():
+    with pytest.raises(ValueError):
+        parse_quiz("Here is your quiz: 1. ...")
+    with pytest.raises(ValueError):
+        parse_quiz(json.dumps({"title": "Empty", "questions": []}))
+
+
+def test_shuffle_is_deterministic_and_keeps_answers():
+    quiz = parse_quiz(json.dumps(QUIZ))
+    assert quiz.arranged(shuffle=False) is quiz
+    first, second = quiz.arranged(True, seed=7), quiz.arranged(True, seed=7)
+    assert first == second
+    assert sorted(q.question for q in first.questions) == sorted(q.question for q in quiz.questions)
+    mcq = next(q for q in first.questions if q.type == "MCQ")
+    assert sorted(mcq.options) == sorted(QUIZ["questions"][0]["options"])
+    assert mcq.answer == "Jupiter"
+
+
+def test_render_quiz_with_and_without_answer_key():
+    quiz = parse_quiz(json.dumps(QUIZ))
+    text = render_quiz(quiz, points=2)
+    assert text.startswith("# Planets\n")
+    assert "*Total points: 6*" in text
+    assert "- B) Jupiter" in text
+    assert "1. B) Jupiter — It is a gas giant." in text
+    assert "Answer Key" not in render_quiz(quiz, include_answers=False)
+
+
+def test_quiz_roundtrips_through_json():
+    quiz = Quiz("T", [Question("MCQ", "Q?", "A", ["A", "B"])])
+    assert parse_quiz(quiz.to_json()) == quiz
+
+
+def test_quiz_prompt_names_the_question_type():
+    assert 'type "True/False"' in prompts.build_quiz_json_prompt("Space", 5, "True/False")
+    assert "Mix MCQ" in prompts.build_quiz_json_prompt("Space", 5, "Mixed")
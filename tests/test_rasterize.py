@@ -0,0 +1,84 @@
+import pytest
+
+from services import rasterize
+from ui import helpers
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg" width="100%" viewBox="0 0 320 180" style="max-width: 320px;"><g/></svg>'
+
+
+class _Cairo:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def svg2png(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.fail:
+            raise ValueError("broken svg")
+        return b"png"
+
+
+def test_relative_root_size_is_replaced_with_the_viewbox():
+    fixed = rasterize._with_absolute_size(SVG)
+    assert b'width="100%"' not in fixed
+    assert fixed.startswith(b'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 320 180" style="max-width: 320px;" width="320" height="180">')
+    absolute = b'<svg width="10" height="20" viewBox="0 0 10 20"/>'
+    assert rasterize._with_absolute_size(absolute) == absolute
+
+
+def test_svg_to_png_scales_with_dpi(monkeypatch):
+    cairo = _Cairo()
+    monkeypatch.setattr(rasterize, "cairosvg", cairo)
+    assert rasterize.svg_to_png(SVG, dpi=192) == b"png"
+    call = cairo.calls[0]
+    assert (call["dpi"], call["scale"], call["background_color"]) == (192, 2.0, "white")
+    assert b'width="320"' in call["bytestring"]
+
+
+def test_svg_to_png_declines_what_cairo_cannot_draw(monkeypatch):
+    monkeypatch.setattr(rasterize, "cairosvg", None)
+    assert not rasterize.available()
+    assert rasterize.svg_to_png(SVG) is None
+
+    monkeypatch.setattr(rasterize, "cairosvg", _Cairo())
+    assert rasterize.svg_to_png(None) is None
+    assert rasterize.svg_to_png(SVG.replace(b"<g/>", b"<foreignObject/>")) is None
+    monkeypatch.setattr(rasterize, "cairosvg", _Cairo(fail=True))
+    assert rasterize.svg_to_png(SVG) is None
+
+
+@pytest.fixture
+def renderer(monkeypatch):
+    """Local rasterization with a fake cairo, and a Kroki stand-in that records each request."""
+    cairo, requests = _Cairo(), []
+    monkeypatch.setattr(rasterize, "cairosvg", cairo)
+    monkeypatch.setattr(rasterize, "LOCAL_RASTER", True)
+
+    def kroki(code, format="png", timeout=None):
+        requests.append((format, code))
+        return SVG if format == "svg" else b"remote png"
+
+    monkeypatch.setattr(helpers, "get_kroki_img", kroki)
+    return cairo, requests
+
+
+def test_pngs_are_drawn_from_a_text_label_svg(renderer):
+    cairo, requests = renderer
+    assert helpers.get_mermaid_img("graph TD\n  A --> B", "png") == b"png"
+    assert [(fmt, "htmlLabels" in code) for fmt, code in requests] == [("svg", True)]
+    assert (cairo.calls[0]["dpi"], cairo.calls[0]["scale"]) == (rasterize.RASTER_DPI, rasterize.RASTER_DPI / 96)
+
+
+def test_svg_and_remote_png_renders_keep_html_labels(renderer):
+    cairo, requests = renderer
+    helpers.get_mermaid_img("graph TD\n  C --> D", "svg")
+    assert helpers.get_mermaid_img("graph TD\n  C --> D", "png", local_raster=False) == b"remote png"
+    assert [(fmt, "htmlLabels" in code) for fmt, code in requests] == [("svg", False), ("png", False)]
+    assert cairo.calls == []
+
+
+def test_export_pngs_are_rasterized_at_the_export_dpi(renderer):
+    cairo, requests = renderer
+    assert helpers.render_diagram_png("graph TD\n  E --> F", dpi=192) == b"png"
+    assert (cairo.calls[0]["dpi"], cairo.calls[0]["scale"]) == (192, 2.0)
+    assert len(requests) == 1 and "htmlLabels" in requests[0][1]
@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from services.scheduler import BATCH, INTERACTIVE, PREVIEW, Scheduler, SchedulerBusy, call_context
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _queue(scheduler, order, *args):
+    """Start a thread that waits for a slot, records its admission and releases at once."""
+    def run():
+        ticket = scheduler.acquire(*args)
+        order.append(args)
+        scheduler.release(ticket)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_free_slot_is_granted_at_once():
+    scheduler = Scheduler("test", 2)
+    first, second = scheduler.acquire(), scheduler.acquire()
+    assert scheduler.stats()["in_use"] == 2
+    scheduler.release(first)
+    scheduler.release(second)
+    assert scheduler.stats()["in_use"] == 0
+    assert scheduler.stats()["active_sessions"] == 0
+
+
+def test_waiting_calls_are_admitted_by_priority_class():
+    scheduler = Scheduler("test", 1)
+    holder = scheduler.acquire()
+    order = []
+    threads = []
+    for priority in (BATCH, INTERACTIVE, PREVIEW):
+        threads.append(_queue(scheduler, order, priority, "s"))
+        _wait_for(lambda n=len(threads): sum(scheduler.stats()["queue_depth"].values()) == n)
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join(2)
+    assert [args[0] for args in order] == [PREVIEW, INTERACTIVE, BATCH]
+
+
+def test_session_with_fewer_running_calls_goes_first():
+    scheduler = Scheduler("test", 2)
+    busy = scheduler.acquire(INTERACTIVE, "busy")
+    holder = scheduler.acquire(INTERACTIVE, "other")
+    order = []
+    first = _queue(scheduler, order, INTERACTIVE, "busy")
+    _wait_for(lambda: scheduler.stats()["queue_depth"][INTERACTIVE] == 1)
+    second = _queue(scheduler, order, INTERACTIVE, "quiet")
+    _wait_for(lambda: scheduler.stats()["queue_depth"][INTERACTIVE] == 2)
+    scheduler.release(holder)
+    first.join(2)
+    second.join(2)
+    scheduler.release(busy)
+    assert [args[1] for args in order] == ["quiet", "busy"]
+
+
+def test_full_queue_is_rejected_immediately():
+    scheduler = Scheduler("test", 1, max_queue=1)
+    holder = scheduler.acquire()
+    order = []
+    waiter = _queue(scheduler, order, INTERACTIVE, "a")
+    _wait_for(lambda: scheduler.stats()["queue_depth"][INTERACTIVE] == 1)
+    with pytest.raises(SchedulerBusy):
+        scheduler.acquire(INTERACTIVE, "b")
+    assert scheduler.stats()["rejected"][INTERACTIVE] == 1
+    scheduler.release(holder)
+    waiter.join(2)
+
+
+def test_wait_is_bounded():
+    scheduler = Scheduler("test", 1, max_wait=0.1)
+    holder = scheduler.acquire()
+    started = time.perf_counter()
+    with pytest.raises(SchedulerBusy):
+        scheduler.acquire(INTERACTIVE)
+    assert time.perf_counter() - started < 1
+    assert scheduler.stats()["queue_depth"][INTERACTIVE] == 0
+    scheduler.release(holder)
+
+
+def test_on_wait_reports_positions_then_admission():
+    scheduler = Scheduler("test", 1)
+    holder = scheduler.acquire()
+    positions = []
+    thread = threading.Thread(target=lambda: scheduler.release(scheduler.acquire(on_wait=positions.append)))
+    thread.start()
+    _wait_for(lambda: positions)
+    scheduler.release(holder)
+    thread.join(2)
+    assert positions[0] == 1
+    assert positions[-1] == 0
+
+
+def test_slot_is_released_when_on_wait_raises_on_admission():
+    scheduler = Scheduler("test", 1)
+    holder = scheduler.acquire()
+    errors = []
+
+    def cancelled(position):
+        if position == 0:
+            raise RuntimeError("cancelled")
+
+    def run():
+        try:
+            scheduler.acquire(on_wait=cancelled)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    _wait_for(lambda: scheduler.stats()["queue_depth"][INTERACTIVE] == 1)
+    scheduler.release(holder)
+    thread.join(2)
+    assert errors
+    assert scheduler.stats()["in_use"] == 0
+
+
+def test_slot_uses_the_call_context():
+    scheduler = Scheduler("test", 1)
+    holder = scheduler.acquire()
+    order = []
+
+    def run():
+        with call_context(priority=PREVIEW, session="ctx"), scheduler.slot():
+            order.append("ctx")
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    _wait_for(lambda: scheduler.stats()["queue_depth"][PREVIEW] == 1)
+    scheduler.release(holder)
+    thread.join(2)
+    assert order == ["ctx"]
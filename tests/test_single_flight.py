@@ -0,0 +1,120 @@
+import threading
+import time
+
+from services import gemini_client
+from services.gemini_client import GeminiClient
+from services.single_flight import SingleFlight
+
+
+def _concurrently(n, fn):
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def run(i):
+        barrier.wait()
+        results[i] = fn()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+class _SlowCall:
+    def __init__(self, results):
+        self.calls = 0
+        self.results = list(results)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            result = self.results[min(self.calls, len(self.results)) - 1]
+        time.sleep(0.2)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_concurrent_identical_calls_share_one_result():
+    flight = SingleFlight()
+    call = _SlowCall(["answer"])
+    assert _concurrently(4, lambda: flight.do("llm", "k", call)) == ["answer"] * 4
+    assert call.calls == 1
+    stats = flight.stats()
+    assert stats["calls"] == 1
+    assert stats["coalesced"] == 3
+    assert stats["namespaces"]["llm"]["in_flight"] == 0
+
+
+def test_rejected_result_is_not_shared():
+    flight = SingleFlight()
+    call = _SlowCall(["❌ Error: quota", "answer"])
+    results = _concurrently(3, lambda: flight.do("llm", "k", call, accept=lambda r: not r.startswith("❌")))
+    assert results.count("❌ Error: quota") == 1
+    assert results.count("answer") == 2
+    assert flight.stats()["namespaces"]["llm"]["fallbacks"] == 2
+
+
+def test_waiters_call_again_when_the_leader_raises():
+    flight = SingleFlight()
+    call = _SlowCall([RuntimeError("boom"), "answer"])
+
+    def run():
+        try:
+            return flight.do("llm", "k", call)
+        except RuntimeError:
+            return "raised"
+
+    results = _concurrently(3, run)
+    assert results.count("raised") == 1
+    assert results.count("answer") == 2
+
+
+def test_later_calls_start_a_new_flight():
+    flight = SingleFlight()
+    call = _SlowCall(["first", "second"])
+    assert flight.do("llm", "k", call) == "first"
+    assert flight.do("llm", "k", call) == "second"
+
+
+def _count_upstream_calls(monkeypatch):
+    calls = []
+
+    def generate(self, prompt, *args):
+        calls.append(self.key_identity())
+        time.sleep(0.2)
+        return "answer"
+
+    monkeypatch.setattr(GeminiClient, "_generate", generate)
+    monkeypatch.setattr(gemini_client, "get_prompt_cache", lambda: None)
+    return calls
+
+
+def test_clients_with_the_same_key_coalesce(monkeypatch):
+    calls = _count_upstream_calls(monkeypatch)
+    _concurrently(3, lambda: GeminiClient(user_api_key="key-a").generate_content("same prompt", route="code"))
+    assert len(calls) == 1
+
+
+def test_clients_with_different_keys_do_not_coalesce(monkeypatch):
+    calls = _count_upstream_calls(monkeypatch)
+    keys = iter(["key-a", "key-b"])
+    lock = threading.Lock()
+
+    def run():
+        with lock:
+            key = next(keys)
+        return GeminiClient(user_api_key=key).generate_content("same prompt", route="code")
+
+    _concurrently(2, run)
+    assert len(calls) == 2
+    assert len(set(calls)) == 2
+
+
+def test_verify_calls_never_coalesce(monkeypatch):
+    calls = _count_upstream_calls(monkeypatch)
+    _concurrently(3, lambda: GeminiClient(user_api_key="key-a").generate_content("ping", route="verify"))
+    assert len(calls) == 3
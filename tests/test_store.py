@@ -0,0 +1,65 @@
+import pytest
+
+from services import store
+from services.store import HistoryStore
+
+
+@pytest.fixture
+def history(tmp_path):
+    return HistoryStore(str(tmp_path / "history.db"))
+
+
+def test_history_is_listed_newest_first_with_previews(history):
+    history.add_history("alice", "diagram", "First", "graph TD; A-->B")
+    history.add_history("alice", "diagram", "Second", "x" * 500)
+    items = history.list("history", "alice")
+    assert [item["title"] for item in items] == ["Second", "First"]
+    assert len(items[0]["preview"]) == store.PREVIEW_CHARS
+    assert history.get("history", "alice", items[0]["id"])["content"] == "x" * 500
+
+
+def test_history_is_trimmed_per_owner_and_feature(history, monkeypatch):
+    monkeypatch.setattr(store, "HISTORY_LIMIT", 3)
+    for n in range(5):
+        history.add_history("alice", "diagram", f"Item {n}", f"content {n}")
+    history.add_history("alice", "document", "Doc", "text")
+    assert history.count("history", "alice", "diagram") == 3
+    assert history.count("history", "alice") == 4
+    assert history.features("history", "alice") == [("document", 1), ("diagram", 3)]
+
+
+def test_favorites_are_deduplicated_by_content(history):
+    assert history.add_favorite("alice", "diagram", "Flow", "graph TD; A-->B")
+    assert not history.add_favorite("alice", "diagram", "Same flow", "graph TD; A-->B")
+    assert history.add_favorite("bob", "diagram", "Flow", "graph TD; A-->B")
+    assert history.count("favorites", "alice") == 1
+
+
+def test_owners_only_see_their_own_items(history):
+    item_id = history.add_history("alice", "email", "Secret", "private launch plans")
+    assert history.list("history", "bob") == []
+    assert history.get("history", "bob", item_id) is None
+    assert history.search("history", "bob", "launch") == []
+    history.delete("history", "bob", item_id)
+    assert history.get("history", "alice", item_id) is not None
+
+
+def test_search_matches_title_and_content(history):
+    history.add_history("alice", "document", "Onboarding guide", "Welcome to the team")
+    history.add_history("alice", "document", "Release notes", "Fixed the onboarding crash")
+    history.add_history("alice", "email", "Lunch", "Pizza on Friday")
+    assert {item["title"] for item in history.search("history", "alice", "onboard")} == {
+        "Onboarding guide", "Release notes",
+    }
+    assert history.search("history", "alice", "pizza", feature="document") == []
+    assert history.search("history", "alice", '"unbalanced') == []
+
+
+def test_unknown_table_is_rejected(history):
+    with pytest.raises(ValueError):
+        history.list("users", "alice")
+
+
+def test_in_memory_databases_are_rejected():
+    with pytest.raises(ValueError):
+        HistoryStore(":memory:")
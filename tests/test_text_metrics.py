@@ -0,0 +1,70 @@
+from services.text_metrics import (
+    analyze_text, flesch_reading_ease, is_bangla, metrics_markdown, ngram_frequencies, readability_label,
+    split_sentences, syllable_counts, tfidf_keywords, tokenize,
+)
+
+TEXT = (
+    "The cat sat on the mat. The cat was happy!\n\n"
+    "Dogs chase the cat? The cat climbs a tree. The cat sat on the mat again."
+)
+
+
+def test_tokenize_and_split_sentences():
+    assert tokenize("Don't stop — it's 2024, OK?") == ["don't", "stop", "it's", "ok"]
+    assert split_sentences(TEXT) == [
+        "The cat sat on the mat.", "The cat was happy!", "Dogs chase the cat?",
+        "The cat climbs a tree.", "The cat sat on the mat again.",
+    ]
+
+
+def test_bangla_words_and_sentences():
+    text = "আমি বাংলায় গান গাই। তুমি কি শুনেছ?"
+    assert is_bangla(text)
+    assert not is_bangla("Hello world")
+    assert tokenize(text)[:2] == ["আমি", "বাংলায়"]
+    assert len(split_sentences(text)) == 2
+    assert list(syllable_counts(["আমি"], bangla=True)) == [2]
+
+
+def test_english_syllables_are_at_least_one():
+    assert list(syllable_counts(["cat", "table", "make", "rhythm"])) == [1, 2, 1, 1]
+
+
+def test_keywords_skip_stopwords():
+    keywords = tfidf_keywords([tokenize(s) for s in split_sentences(TEXT)], top_k=3)
+    assert keywords[0]["keyword"] == "cat"
+    assert keywords[0]["count"] == 5
+    assert all(k["keyword"] not in ("the", "a", "on") for k in keywords)
+    assert tfidf_keywords([]) == []
+
+
+def test_ngrams_count_repeats_only():
+    bigrams = ngram_frequencies(tokenize(TEXT), 2)
+    assert bigrams[0] == {"ngram": "the cat", "count": 5}
+    assert {"ngram": "cat sat", "count": 2} in bigrams
+    assert "on the" not in [b["ngram"] for b in bigrams]  # Stopwords only
+    assert {"ngram": "sat on the", "count": 2} in ngram_frequencies(tokenize(TEXT), 3)
+    assert ngram_frequencies(["one"], 2) == []
+
+
+def test_readability():
+    assert flesch_reading_ease(0, 0, 0) == 0.0
+    assert readability_label(95) == "Very easy"
+    assert readability_label(10) == "Very difficult"
+
+
+def test_analyze_text_is_deterministic():
+    metrics = analyze_text(TEXT)
+    assert metrics == analyze_text(TEXT)
+    assert metrics["language"] == "English"
+    assert (metrics["words"], metrics["sentences"], metrics["paragraphs"]) == (26, 5, 2)
+    assert metrics["reading_time_minutes"] == 1
+    assert metrics["readability"] in ("Very easy", "Easy")
+    assert "- Keywords: cat" in metrics_markdown(metrics)
+
+
+def test_empty_text():
+    metrics = analyze_text("")
+    assert metrics["words"] == 0
+    assert metrics["keywords"] == []
+    assert metrics["flesch_reading_ease"] == 0.0
@@ -0,0 +1,158 @@
+import re
+
+import pytest
+
+from services.errors import ErrorText
+from services.translation_memory import (
+    TranslationMemory, chunk_segments, iter_translation, memory_key, normalize_segment, parse_segments,
+    split_segments, translate_with_memory,
+)
+
+TEXT = "Hello world.\n\n  Second paragraph\nwraps here.\n\n123\n"
+
+
+class FakeClient:
+    """Translates by upper-casing each `[[SEG n]]` segment; counts upstream calls."""
+
+    def __init__(self, reply=None):
+        self.prompts = []
+        self.reply = reply
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        if self.reply is not None:
+            return self.reply
+        segments = re.split(r"^\[\[SEG (\d+)\]\]\n", prompt, flags=re.MULTILINE)[1:]
+        return "\n\n".join(f"[[SEG {n}]]\n{body.strip().upper()}" for n, body in zip(segments[::2], segments[1::2]))
+
+
+@pytest.fixture
+def memory(tmp_path):
+    return TranslationMemory(str(tmp_path / "tm.db"))
+
+
+def test_split_segments_roundtrips_and_skips_non_text():
+    parts, indexes = split_segments(TEXT)
+    assert "".join(parts) == TEXT
+    assert [parts[i] for i in indexes] == ["Hello world.", "Second paragraph\nwraps here."]
+
+
+def test_fenced_code_blocks_stay_whole():
+    text = "Intro.\n\n```python\nx = 1\n\ny = 2\n```\n\nOutro."
+    parts, indexes = split_segments(text)
+    assert "".join(parts) == text
+    assert "```python\nx = 1\n\ny = 2\n```" in parts
+    assert [parts[i] for i in indexes] == ["Intro.", "Outro."]
+
+
+def test_inline_backticks_stay_in_the_prose():
+    text = "Use ```x``` inline.\n\nNext ``` paragraph."
+    parts, indexes = split_segments(text)
+    assert "".join(parts) == text
+    assert [parts[i] for i in indexes] == ["Use ```x``` inline.", "Next ``` paragraph."]
+
+
+def test_fenced_code_is_never_sent_for_translation(memory):
+    client = FakeClient()
+    text = "Intro.\n\n```\nprint('hi')\n```\n\nOutro."
+    assert translate_with_memory(client, text, memory=memory)["text"] == "INTRO.\n\n```\nprint('hi')\n```\n\nOUTRO."
+    assert "print" not in client.prompts[0]
+
+
+def test_memory_key_ignores_wrapping_but_not_target_formality_or_format():
+    key = memory_key("Second paragraph\nwraps here.", "Bangla", "Neutral")
+    assert key == memory_key("Second  paragraph wraps   here.", "Bangla", "Neutral")
+    assert key != memory_key("Second paragraph wraps here.", "English", "Neutral")
+    assert key != memory_key("Second paragraph wraps here.", "Bangla", "Formal")
+    assert key != memory_key("Second paragraph wraps here.", "Bangla", "Neutral", preserve_format=False)
+    assert normalize_segment(" a\n b ") == "a b"
+
+
+def test_parse_segments_ignores_unknown_numbers():
+    assert parse_segments("[[SEG 1]]\nOne\n\n[[SEG 3]]\nThree\n[[SEG 2]]\n", 2) == {1: "One"}
+
+
+def test_only_unseen_segments_are_sent(memory):
+    client = FakeClient()
+    first = translate_with_memory(client, TEXT, memory=memory)
+    assert first == {"text": "HELLO WORLD.\n\n  SECOND PARAGRAPH\nWRAPS HERE.\n\n123\n", "segments": 2, "hits": 0}
+
+    second = translate_with_memory(client, "Hello world.\n\nA new paragraph.", memory=memory)
+    assert second["text"] == "HELLO WORLD.\n\nA NEW PARAGRAPH."
+    assert second["hits"] == 1
+    assert "Hello world." not in client.prompts[-1]
+
+    translate_with_memory(client, TEXT, memory=memory)
+    assert len(client.prompts) == 2  # Fully served from memory
+    assert memory.stats()["hits"] == 3
+    assert memory.stats()["segments_stored"] == 3
+
+
+def test_errors_are_returned_and_not_stored(memory):
+    result = translate_with_memory(FakeClient(reply=ErrorText("❌ Error: boom")), TEXT, memory=memory)
+    assert result["text"] == "❌ Error: boom"
+    assert memory.stats()["segments_stored"] == 0
+
+
+def test_errors_still_record_the_memory_hits(memory):
+    translate_with_memory(FakeClient(), "Hello world.", memory=memory)
+    updates = iter_translation(FakeClient(reply=ErrorText("❌ Error: boom")), "Hello world.\n\nNew.", memory=memory)
+    assert next(updates) == {"error": "❌ Error: boom"}
+    assert memory.stats()["hits"] == 1
+    assert memory.stats()["misses"] == 2
+
+
+def test_store_trims_to_the_most_recently_used(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.db"), limit=2)
+    memory.store([("a", "Bangla", "Neutral", "A", "a"), ("b", "Bangla", "Neutral", "B", "b")])
+    conn = memory._conn()
+    conn.execute("UPDATE translation_memory SET used_at = '2000-01-01 00:00:00' WHERE key = 'a'")
+    conn.commit()
+    memory.store([("c", "Bangla", "Neutral", "C", "c")])
+    assert memory.lookup(["a", "b", "c"]) == {"b": "b", "c": "c"}
+
+
+def test_store_drops_segments_unused_for_max_age(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.db"), max_age_days=30)
+    memory.store([("old", "Bangla", "Neutral", "Old", "old")])
+    conn = memory._conn()
+    conn.execute("UPDATE translation_memory SET used_at = '2000-01-01 00:00:00'")
+    conn.commit()
+    memory.store([("new", "Bangla", "Neutral", "New", "new")])
+    assert memory.stats()["segments_stored"] == 1
+
+
+def test_in_memory_databases_are_rejected():
+    with pytest.raises(ValueError):
+        TranslationMemory(":memory:")
+
+
+def test_chunk_segments_respects_the_size_limit():
+    parts = ["a" * 10, " ", "b" * 10, " ", "c" * 10]
+    assert chunk_segments(parts, [0, 2, 4]) == [[0, 2, 4]]
+    assert chunk_segments(parts, [0, 2, 4], max_chars=20) == [[0, 2], [4]]
+    assert chunk_segments(parts, [], max_chars=20) == []
+
+
+def test_chunks_report_the_translated_prefix(memory):
+    text = "\n\n".join(f"Paragraph number {n}." for n in range(6))
+    client = FakeClient()
+    updates = list(iter_translation(client, text, memory=memory, chunk_chars=40, concurrency=3))
+    assert len(client.prompts) == len(updates) == 3
+    assert all(text.upper().startswith(u["text"]) for u in updates)
+    assert updates[-1]["text"] == text.upper()
+    assert updates[-1]["done"] == updates[-1]["segments"] == 6
+
+
+def test_dropped_segments_are_translated_on_their_own(memory):
+    class MergingClient(FakeClient):
+        def generate_content(self, prompt, **kwargs):
+            self.prompts.append(prompt)
+            if "[[SEG" in prompt:
+                return "[[SEG 1]]\nFIRST."
+            return prompt.rsplit("\n", 1)[-1].upper()
+
+    client = MergingClient()
+    result = translate_with_memory(client, "First.\n\nSecond.", memory=memory)
+    assert result["text"] == "FIRST.\n\nSECOND."
+    assert len(client.prompts) == 2
@@ -5,4 +5,4 @@ Provides a single entry point `render_tabs` that builds the Streamlit tab interf
 The heavy business logic is delegated to the service layer (`services.helpers`).
 """
 
-from .tabs import render_tabs  # noqa: F401
+from .tabs import render_tabs, render_history_panel  # noqa: F401
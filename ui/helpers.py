@@ -8,37 +8,141 @@ import re
 from datetime import datetime
 from fpdf import FPDF
 from docx import Document
-from PIL import Image
 import os
+import hashlib
+import secrets
+from services import diagram_scale, prompts, rasterize
+from services.image_pipeline import derive, get_image_pipeline
+from services.store import content_hash, get_store
+from services.blobstore import get_blob_store, get_session_cache
+from services.errors import is_error
+from services.single_flight import flight_key, get_single_flight
+from services.scheduler import PREVIEW, SchedulerBusy, context_priority, context_session, get_scheduler
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+def history_owner(st_obj):
+    """
+    Owner ID for persistent history: a hash of the active API key, never the
+    key itself.  Users on the shared key pool get a random ID for their
+    browser session, so they never see each other's items.
+    """
+    api_key = st_obj.session_state.get("api_key")
+    if not api_key:
+        if "history_session_owner" not in st_obj.session_state:
+            st_obj.session_state.history_session_owner = "session:" + secrets.token_hex(8)
+        return st_obj.session_state.history_session_owner
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
 
 def add_to_history(st_obj, feature, content, title="Untitled"):
-    """Add item to history in session state."""
-    if 'history' not in st_obj.session_state:
-        st_obj.session_state.history = {}
-    
-    if feature not in st_obj.session_state.history:
-        st_obj.session_state.history[feature] = []
-    
-    st_obj.session_state.history[feature].insert(0, {
-        'title': title,
-        'content': content,
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M")
-    })
-    
-    # Keep only last 10 items
-    st_obj.session_state.history[feature] = st_obj.session_state.history[feature][:10]
+    """Add item to the persistent history store."""
+    get_store().add_history(history_owner(st_obj), feature, title, content)
 
 def save_to_favorites(st_obj, content, feature, title):
-    """Save item to favorites in session state."""
-    if 'favorites' not in st_obj.session_state:
-        st_obj.session_state.favorites = []
-        
-    st_obj.session_state.favorites.append({
-        'feature': feature,
-        'title': title,
-        'content': content,
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M")
-    })
+    """Save item to favorites. Returns False if the same content is already saved."""
+    return get_store().add_favorite(history_owner(st_obj), feature, title, content)
+
+def load_history_page(st_obj, table, feature=None, page=0, page_size=10, query=None):
+    """One page of history/favorites previews, optionally filtered by a full-text query."""
+    store = get_store()
+    owner = history_owner(st_obj)
+    if query:
+        return store.search(table, owner, query, feature, limit=page_size, offset=page * page_size)
+    return store.list(table, owner, feature, limit=page_size, offset=page * page_size)
+
+def _session_id():
+    """The Streamlit session, or the one a background job runs for (see `services.scheduler.call_context`)."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx else context_session("default")
+
+def _render_slot():
+    """Render scheduler slot; renders are previews unless the caller's `call_context` says otherwise."""
+    return get_scheduler("render").slot(context_priority(PREVIEW), _session_id())
+
+def put_artifact(st_obj, key, data):
+    """Store a large payload in the blob store and keep only its hash in session state."""
+    st_obj.session_state[key] = get_session_cache().put(_session_id(), data)
+
+def get_artifact(st_obj, key, as_text=True):
+    """Load the payload whose hash is stored under `key` (None if missing)."""
+    digest = st_obj.session_state.get(key)
+    if not digest:
+        return None
+    data = get_session_cache().get(_session_id(), digest)
+    if data is None:
+        return None
+    return data.decode("utf-8") if as_text else data
+
+def cached_artifact(name, producer):
+    """Return the bytes stored under alias `name`, computing them with `producer()` only once."""
+    store = get_blob_store()
+    cache = get_session_cache()
+    digest = store.get_alias(name)
+    if digest:
+        data = cache.get(_session_id(), digest)
+        if data is not None:
+            return data
+    data = producer()
+    if data:
+        store.set_alias(name, cache.put(_session_id(), data))
+    return data
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def render_diagram(code, format="png", theme="default"):
+    """Rendered diagram bytes, cached on disk by (code, format, theme) so reruns don't re-render."""
+    if format == "png" and rasterize.available():
+        return render_diagram_png(code, theme)
+    return cached_artifact(
+        f"render:{format}:{theme}:{_text_hash(code)}",
+        lambda: get_mermaid_img(code, format, theme),
+    )
+
+def render_diagram_png(code, theme="default", dpi=rasterize.RASTER_DPI):
+    """
+    PNG drawn locally from the cached SVG render at `dpi`, so no extra remote
+    request is made; falls back to the renderer's PNG if that is not possible.
+    """
+    def produce():
+        # Its own SVG: the one shown or exported as SVG keeps Mermaid's HTML labels
+        svg = cached_artifact(
+            f"render:svg-text:{theme}:{_text_hash(code)}",
+            lambda: get_mermaid_img(code, "svg", theme, text_labels=True),
+        )
+        png = rasterize.svg_to_png(svg, dpi)
+        if png is None and dpi == rasterize.RASTER_DPI:
+            png = get_mermaid_img(code, "png", theme, local_raster=False)
+        return png
+    return cached_artifact(f"render:png@{dpi}:{theme}:{_text_hash(code)}", produce)
+
+def submit_derived_images(png, code=None):
+    """
+    Queue the JPG/WebP/thumbnail conversions of a rendered PNG in the
+    background and return the PNG hash to fetch them with.  When `code` is
+    given, the thumbnail is also filed under its history content hash.
+    """
+    return get_image_pipeline().submit(png, content_hash(code) if code else None)
+
+def derived_image(digest, variant, wait=30):
+    """Precomputed `variant` bytes of a submitted PNG, waiting up to `wait` seconds for the pool."""
+    return get_image_pipeline().get(digest, variant, wait=wait)
+
+def history_thumbnail(item_hash):
+    """Thumbnail of a rendered history item (by content hash), or None if it was never rendered."""
+    digest = get_blob_store().get_alias(get_image_pipeline().thumbnail_alias(item_hash))
+    return get_session_cache().get(_session_id(), digest) if digest else None
+
+def render_diagram_svgz(code, theme="default"):
+    """Gzipped variant of the cached (minified) SVG render."""
+    def produce():
+        svg = render_diagram(code, "svg", theme)
+        return diagram_scale.compress_svg(svg) if svg else None
+    return cached_artifact(f"render:svgz:{theme}:{_text_hash(code)}", produce)
+
+def export_document(text, kind):
+    """DOCX/PDF export bytes for `text`, built once per content."""
+    producer = {"docx": create_docx, "pdf": create_pdf}[kind]
+    return cached_artifact(f"export:{kind}:{_text_hash(text)}", lambda: producer(text))
 
 def extract_context_text(uploaded_file):
     """Extract text from uploaded file (txt, md, pdf, docx)."""
@@ -108,7 +212,38 @@ def sanitize_mermaid_code(raw_text):
         code = raw_text.replace("```mermaid", "").replace("```", "").strip()
     return code
 
-def get_kroki_img(code, format="png"):
+def finalize_mermaid_code(code):
+    """Final cleanup applied to Mermaid code before it is stored or rendered."""
+    return code.replace("title:", "title").replace("graph TD    ", "graph TD ")
+
+def repair_mermaid_code(client, raw_response):
+    """
+    Turn a raw LLM diagram response into final Mermaid code.
+    Layer 0 is the regex auto-fixer, layer 1 the validator and layer 2 an LLM
+    self-correction call (only made when validation finds issues).
+    Returns a dict with the final `code`, the validation `errors` and whether
+    the LLM fix succeeded (`llm_fixed`).
+    """
+    candidate_code = sanitize_mermaid_code(raw_response)
+
+    # Layer 0: Regex Auto-Fixer (Pre-Correction)
+    candidate_code = fix_mermaid_syntax(candidate_code)
+
+    # Validation Layer 1: Check for known syntax issues
+    errors = validate_mermaid_syntax(candidate_code)
+
+    llm_fixed = False
+    if errors:
+        # Validation Layer 2: LLM Self-Correction
+        fix_res = client.generate_content(prompts.build_diagram_fix_prompt(candidate_code, errors), route="diagram_fix")
+        if not is_error(fix_res):
+            candidate_code = sanitize_mermaid_code(fix_res)
+            llm_fixed = True
+
+    # Final Cleanup
+    return {"code": finalize_mermaid_code(candidate_code), "errors": errors, "llm_fixed": llm_fixed}
+
+def get_kroki_img(code, format="png", timeout=None):
     """
     Generate diagram using Kroki.io API.
     Uses POST request to avoid URL length limits for large diagrams.
@@ -116,7 +251,7 @@ def get_kroki_img(code, format="png"):
     try:
         url = f"https://kroki.io/mermaid/{format}"
         # Kroki POST expects raw diagram source in body (uncompressed is fine and standard for POST)
-        response = requests.post(url, data=code.encode('utf-8'))
+        response = requests.post(url, data=code.encode('utf-8'), timeout=timeout)
         
         if response.status_code == 200:
             return response.content
@@ -124,29 +259,58 @@ def get_kroki_img(code, format="png"):
         return None
     return None
 
-def get_mermaid_img(code, format="png", theme="default"):
+def get_mermaid_img(code, format="png", theme="default", timeout=None, local_raster=True, text_labels=False):
     """
     Generate Mermaid image.
     Attempts Kroki.io first (more robust), falls back to mermaid.ink.
+    Each request gets `timeout` seconds, by default scaled to the diagram's size.
+    When local rasterization is available, a PNG is drawn from an SVG render
+    instead of being requested separately.  `text_labels` asks for plain SVG
+    text labels, which only that local rasterization needs.  Identical
+    concurrent renders share one upstream request.
     """
+    single_flight = get_single_flight()
+    if single_flight is None:
+        return _render_mermaid_img(code, format, theme, timeout, local_raster, text_labels)
+    return single_flight.do(
+        "render", flight_key(format, theme, local_raster, text_labels, code),
+        lambda: _render_mermaid_img(code, format, theme, timeout, local_raster, text_labels), accept=bool,
+    )
+
+def _render_mermaid_img(code, format, theme, timeout, local_raster, text_labels=False):
+    if timeout is None:
+        timeout = diagram_scale.render_timeout(diagram_scale.analyze_diagram(code))
+    if format == "png" and local_raster and rasterize.available():
+        png = rasterize.svg_to_png(get_mermaid_img(code, "svg", theme, timeout, text_labels=True))
+        if png:
+            return png
+    init = {"theme": theme} if theme != "default" else {}
+    if text_labels:
+        # Cairo cannot draw HTML labels (see `services.rasterize`)
+        init.update(rasterize.RENDERER_CONFIG)
+
     # 1. Try Kroki (Primary)
     # Note: Kroki doesn't support 'theme' via URL easily for Mermaid, it renders default.
     # But it handles complex syntax much better.
     # We inject theme directive into the code if possible
     kroki_code = code
-    if "%%{init:" not in code and theme != "default":
-        # Inject theme directive
-        theme_json = json.dumps({"theme": theme})
-        kroki_code = f"%%{{init: {theme_json} }}%%\n{code}"
+    if "%%{init:" not in code and init:
+        # Inject theme/label directive
+        init_json = json.dumps(init)
+        kroki_code = f"%%{{init: {init_json} }}%%\n{code}"
         
-    img = get_kroki_img(kroki_code, format)
+    try:
+        with _render_slot():
+            img = get_kroki_img(kroki_code, format, timeout)
+    except SchedulerBusy:
+        return None
     if img:
-        return img
+        return diagram_scale.minify_svg(img) if format == "svg" else img
         
     # 2. Fallback to mermaid.ink
     state = {
         "code": code,
-        "mermaid": {"theme": theme, "securityLevel": "loose"},
+        "mermaid": {"theme": theme, "securityLevel": "loose", **init},
         "autoSync": True,
         "updateDiagram": True
     }
@@ -161,9 +325,10 @@ def get_mermaid_img(code, format="png", theme="default"):
         url = f"https://mermaid.ink/svg/pako:{base64_str}"
     
     try:
-        response = requests.get(url)
+        with _render_slot():
+            response = requests.get(url, timeout=timeout)
         if response.status_code == 200:
-            return response.content
+            return diagram_scale.minify_svg(response.content) if format == "svg" else response.content
     except:
         return None
     return None
@@ -171,11 +336,7 @@ def get_mermaid_img(code, format="png", theme="default"):
 def convert_to_jpg(image_bytes):
     """Convert image bytes to JPG."""
     try:
-        image = Image.open(io.BytesIO(image_bytes))
-        rgb_im = image.convert('RGB')
-        output = io.BytesIO()
-        rgb_im.save(output, format='JPEG', quality=95)
-        return output.getvalue()
+        return derive(image_bytes, "jpg")
     except:
         return None
 
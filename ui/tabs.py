@@ -6,9 +6,154 @@ All Streamlit UI code lives here. Business logic is delegated to
 """
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from . import helpers
 from services.gemini_client import GeminiClient
+from services import prompts, jobs, text_metrics, project_gen, long_document, diagram_scale, diagram_set, rasterize
+from services.quiz import QUIZ_GENERATION_CONFIG, parse_quiz, render_quiz
+from services.store import get_store
+from services.key_pool import get_key_pool
+from services.model_router import get_router
+from services.hedging import get_hedger
+from services.context_cache import get_context_cache
+from services.scheduler import call_context
+from services.translation_memory import CHUNK_CHARS, get_translation_memory, iter_translation
 from datetime import datetime
+import hashlib
+import json
+import posixpath
+
+# ---------------------------------------------------------------------------
+# Background jobs
+# ---------------------------------------------------------------------------
+# Job functions run on the shared job pool, outside the script thread, so they
+# must not touch `st`. Results are applied by the `on_done` callbacks below.
+
+def _generation_job(job, client, prompt, route=None, generation_config=None, cached_prefix=None):
+    """Single LLM generation."""
+    job.update(0.1, "Generating...")
+    client.deadline = job.deadline
+    return client.generate_content(
+        prompt, route=route, generation_config=generation_config, cached_prefix=cached_prefix,
+    )
+
+def _diagram_job(job, client, prompt, route="diagram", cached_prefix=None):
+    """Diagram generation followed by validation and LLM repair."""
+    job.update(0.1, "Generating diagram...")
+    client.deadline = job.deadline
+    res = client.generate_content(prompt, route=route, cached_prefix=cached_prefix)
+    if GeminiClient.is_error_response(res):
+        return {"error": res}
+    job.update(0.6, "Validating and repairing syntax...")
+    client.deadline = job.deadline
+    return helpers.repair_mermaid_code(client, res)
+
+def _diagram_set_job(job, client, description, route="diagram", diagram_types=(), ref_date=None, theme="default"):
+    """Several diagram types from one generation call, repaired and pre-rendered concurrently."""
+    job.update(0.05, f"Generating {len(diagram_types)} diagrams...")
+    client.deadline = job.deadline
+
+    def progress(done, total, kind):
+        job.update(0.5 + 0.5 * done / total, f"Validated and rendered {done}/{total} diagrams" + (f" ({kind})" if kind else ""))
+
+    result = diagram_set.generate_diagram_set(
+        client, description, diagram_types, ref_date, route=route, on_progress=progress, check=job.check,
+        render=lambda code: helpers.render_diagram(code, "png", theme),
+    )
+    if isinstance(result, str):
+        return {"error": result}
+    return result
+
+def _long_document_job(job, client, details, route=None, **options):
+    """Long-document mode: outline first, then the sections concurrently, published as they finish."""
+    job.update(0.05, "Planning document outline...")
+    client.deadline = job.deadline
+
+    def progress(done, total, heading):
+        job.update(0.1 + 0.9 * done / total, f"Wrote {done}/{total} sections" + (f" ({heading})" if heading else ""))
+
+    return long_document.generate_long_document(
+        client, details, on_progress=progress, on_partial=job.publish, check=job.check, **options,
+    )
+
+def _project_job(job, client, requirements, route=None, **options):
+    """Project mode: plan a file manifest, then generate the files concurrently and zip them."""
+    job.update(0.05, "Planning project files...")
+    client.deadline = job.deadline
+
+    def progress(done, total, path):
+        job.update(0.1 + 0.9 * done / total, f"Generated {done}/{total} files" + (f" ({path})" if path else ""))
+
+    result = project_gen.generate_project(client, requirements, on_progress=progress, check=job.check, **options)
+    if isinstance(result, str):
+        return {"error": result}
+    result["zip"] = project_gen.build_zip(result["name"], result["files"])
+    return result
+
+def _in_session(fn):
+    """
+    Wrap a job `fn` to run on behalf of the submitting session (blob cache and
+    scheduler fair share) and to show its place in line while its model calls
+    wait for a slot.
+    """
+    def run(job, client, *args, **kwargs):
+        def on_wait(position):
+            message = f"Waiting for a free model slot (position {position})..." if position else "Working..."
+            job.update(job.progress, message)
+        client.on_wait = on_wait
+        with call_context(session=client.session_id):
+            return fn(job, client, *args, **kwargs)
+    return run
+
+def _submit_job(state_key, fn, client, prompt, label, route=None, **kwargs):
+    """Start a background job and remember its ID under `state_key`. Extra kwargs go to `fn`."""
+    # Identical in-flight requests from the same session share one job (resubmits, double clicks)
+    session = get_script_run_ctx().session_id
+    dedupe_key = hashlib.sha256(
+        f"{state_key}\n{session}\n{client.api_key}\n{prompt}\n{sorted(kwargs.items())!r}".encode("utf-8")
+    ).hexdigest()
+    try:
+        st.session_state[state_key] = jobs.get_job_manager().submit(
+            _in_session(fn), client, prompt, label=label, key=dedupe_key, route=route, **kwargs,
+        )
+    except jobs.JobQueueFull as e:
+        st.warning(f"⚠️ {e}")
+
+def _render_job_status(state_key, on_done, on_partial=None):
+    """
+    Show progress and a cancel button while the job under `state_key` runs.
+    `on_done(job)` is called once with the finished job and may return a
+    message to display instead of the result.  `on_partial(partial)` renders
+    whatever the job has published so far.
+    """
+    message_key = f"{state_key}_message"
+    if message_key in st.session_state:
+        st.markdown(st.session_state.pop(message_key))
+    if state_key in st.session_state:
+        _job_status_fragment(state_key, on_done, on_partial)
+
+@st.fragment(run_every=1.0)
+def _job_status_fragment(state_key, on_done, on_partial=None):
+    manager = jobs.get_job_manager()
+    job = manager.get(st.session_state.get(state_key))
+    if job is not None and job.is_active:
+        st.progress(job.progress, text=f"⏳ {job.message}")
+        cancelled = st.button("✖ Cancel", key=f"{state_key}_cancel")
+        if on_partial and job.partial is not None:
+            on_partial(job.partial)
+        if not cancelled:
+            return
+        manager.cancel(job.id)
+
+    st.session_state.pop(state_key, None)
+    if job is not None:
+        if job.status == jobs.DONE:
+            message = on_done(job)
+        else:
+            message = f"⚠️ {job.error}"
+        if message:
+            st.session_state[f"{state_key}_message"] = message
+    st.rerun()
 
 # ---------------------------------------------------------------------------
 # Helper wrappers to keep UI code concise
@@ -23,8 +168,8 @@ def _render_api_tab():
         if api_input:
             client = GeminiClient(user_api_key=api_input)
             # Try a simple generation to verify
-            res = client.generate_content("Test")
-            if "Error" not in res and "Quota" not in res and res.strip():
+            res = client.generate_content("Test", route="verify")
+            if not GeminiClient.is_error_response(res) and res.strip():
                 st.session_state.api_key = api_input
                 st.success("✅ Verified & Saved!")
             else:
@@ -35,6 +180,36 @@ def _render_api_tab():
     if "api_key" in st.session_state:
         st.success(f"✅ Active Key: {st.session_state.api_key[:12]}...")
 
+    key_pool = get_key_pool()
+    if key_pool:
+        st.info(f"🔁 Shared key pool active ({len(key_pool)} keys). Used when no personal key is saved.")
+        with st.expander("📈 Key Pool Utilisation"):
+            st.dataframe(key_pool.stats(), use_container_width=True)
+
+    with st.expander("⚡ Model Routing"):
+        routing = get_router().stats()
+        st.caption("Each feature is routed to a model tier and falls back to a faster tier while the preferred model is slow or failing.")
+        st.dataframe(
+            [{"tier": tier, "model": info["model"], "healthy": info["healthy"]} for tier, info in routing["tiers"].items()],
+            use_container_width=True,
+        )
+        if routing["routes"]:
+            st.dataframe(
+                [{"route": name, **stats} for name, stats in routing["routes"].items()],
+                use_container_width=True,
+            )
+        hedging = get_hedger().stats()
+        if hedging:
+            st.caption("Hedged requests (duplicate sent when a call outlives the route's recent p95)")
+            st.dataframe([{"route": name, **stats} for name, stats in hedging.items()], use_container_width=True)
+        context_cache = get_context_cache()
+        if context_cache:
+            cache_stats = context_cache.stats()
+            st.caption(
+                f"Context cache ({cache_stats['backend']}): {cache_stats['entries']} active, "
+                f"{cache_stats['hits']} hits, {cache_stats['cached_token_share']:.0%} of prompt tokens served from cache"
+            )
+
     st.markdown("---")
     
     # Bengali User Manual for API Key Creation (using st.info for guaranteed visibility)
@@ -78,10 +253,9 @@ def _render_prompt_refiner_tab():
     if st.button("🚀 Refine", type="primary"):
         if prompt_input:
             client = GeminiClient(st.session_state.get("api_key"))
-            sys_prompt = f"Refine prompt. Context: {context}. Tone: {tone}. Complexity: {complexity}/10."
-            res = client.generate_content(f"{sys_prompt}\n{prompt_input}")
+            res = client.generate_content(prompts.build_refiner_prompt(prompt_input, context, tone, complexity), route="prompt_refiner")
             
-            if "⚠️" in res or "❌" in res:
+            if GeminiClient.is_error_response(res):
                 st.markdown(res)
             else:
                 st.session_state.refined_prompt = res.replace("**", "")
@@ -93,8 +267,10 @@ def _render_prompt_refiner_tab():
         st.markdown("#### 📄 Refined Result")
         st.text_area("Result", st.session_state.refined_prompt, height=300, key="refiner_result_display")
         if st.button("⭐ Save Favorite"):
-            helpers.save_to_favorites(st, st.session_state.refined_prompt, "Prompts", f"{context} prompt")
-            st.success("Saved!")
+            if helpers.save_to_favorites(st, st.session_state.refined_prompt, "Prompts", f"{context} prompt"):
+                st.success("Saved!")
+            else:
+                st.info("Already in favorites.")
 
 def _render_document_generator_tab():
     st.markdown("### 📝 Document Generator")
@@ -114,6 +290,10 @@ def _render_document_generator_tab():
     if include_meta:
         author = st.text_input("Author", key="doc_author")
         version = st.text_input("Version", "1.0", key="doc_version")
+    long_mode = st.checkbox(
+        "📚 Long Document Mode", key="doc_long",
+        help="Plan an outline first, then write the sections in parallel. Best for long BRDs, TDDs and manuals.",
+    )
     
     # Context file upload
     st.markdown("#### 📤 Upload Context File (Optional)")
@@ -128,46 +308,77 @@ def _render_document_generator_tab():
     
     doc_details = st.text_area("Content Details", height=250, key="doc_details_input")
     
-    if st.button("📄 Generate", type="primary"):
+    if st.button("📄 Generate", type="primary", disabled="doc_job" in st.session_state):
         client = GeminiClient(st.session_state.get("api_key"))
-        sys_prompt = f"Write {doc_type}. Style: {doc_style}. Markdown format."
-        
-        # Add language specification for Meeting Minutes
-        if doc_type == "Meeting Minutes":
-            sys_prompt += f" Language: {doc_language}."
-        
-        if include_toc:
-            sys_prompt += " Include TOC."
-        if include_meta:
-            sys_prompt += f" Author: {author}. Version: {version}."
-        full_prompt = sys_prompt + "\n" + doc_details
-        if context_text:
-            full_prompt += f"\n\nCONTEXT FROM UPLOADED FILE:\n{context_text[:5000]}"
-        
-        res = client.generate_content(full_prompt)
-        
-        if "⚠️" in res or "❌" in res:
-            st.markdown(res)
+        st.session_state.pop("doc_failed", None)
+        if long_mode:
+            options = dict(
+                doc_type=doc_type, style=doc_style, language=doc_language, include_toc=include_toc,
+                include_meta=include_meta, author=author if include_meta else "",
+                version=version if include_meta else "", context_text=context_text,
+            )
+            st.session_state.doc_long_request = {"details": doc_details, "label": doc_type, "options": options}
+            _submit_job("doc_job", _long_document_job, client, doc_details, doc_type, route="document", **options)
         else:
-            st.session_state.doc_content = res
-            helpers.add_to_history(st, "Documents", st.session_state.doc_content, doc_type)
-            st.success("✅ Document generated!")
+            context_prefix, doc_prompt = prompts.build_document_prompt_parts(
+                doc_details, doc_type, doc_style, doc_language, include_toc,
+                include_meta, author if include_meta else "", version if include_meta else "",
+                context_text,
+            )
+
+            _submit_job(
+                "doc_job", _generation_job, client, doc_prompt, doc_type,
+                route="document", cached_prefix=context_prefix,
+            )
+
+    def _on_document_done(job):
+        result = job.result
+        if isinstance(result, str) and GeminiClient.is_error_response(result):
+            return result
+        if isinstance(result, dict):
+            # Long document mode: keep the finished sections even if some failed
+            if result["errors"]:
+                helpers.put_artifact(st, "doc_failed", long_document.dump_result(result))
+            else:
+                st.session_state.pop("doc_failed", None)
+            result = result["content"]
+        helpers.put_artifact(st, "doc_content", result)
+        helpers.add_to_history(st, "Documents", result, job.label)
+        st.toast("✅ Document generated!")
+
+    _render_job_status("doc_job", _on_document_done, on_partial=st.markdown)
+
+    failed_json = helpers.get_artifact(st, "doc_failed")
+    failed = long_document.load_result(failed_json) if failed_json else None
+    if failed and "doc_job" not in st.session_state:
+        st.warning(
+            f"⚠️ {len(failed['errors'])} of {len(failed['outline'])} sections could not be written:\n\n"
+            + "\n".join(f"- **{heading}**: {message}" for heading, message in failed["errors"].values())
+        )
+        request = st.session_state.get("doc_long_request")
+        if request and st.button("🔁 Retry Failed Sections", key="doc_retry"):
+            _submit_job(
+                "doc_job", _long_document_job, GeminiClient(st.session_state.get("api_key")),
+                request["details"], request["label"], route="document", previous=failed, **request["options"],
+            )
+            st.rerun()
 
     # ----- Preview Section -----
-    if "doc_content" in st.session_state:
+    doc_content = helpers.get_artifact(st, "doc_content")
+    if doc_content:
         st.markdown("#### 📄 Document Preview")
-        st.markdown(st.session_state.doc_content)
+        st.markdown(doc_content)
         
         # ----- Download / Export Section -----
         st.markdown("---")
         st.markdown("#### 📥 Downloads & Export")
         dl1, dl2, dl3 = st.columns(3)
         with dl1:
-            st.download_button("📥 MD", st.session_state.doc_content, "document.md", use_container_width=True)
+            st.download_button("📥 MD", doc_content, "document.md", use_container_width=True)
         with dl2:
-            st.download_button("📥 DOCX", helpers.create_docx(st.session_state.doc_content), "document.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", use_container_width=True)
+            st.download_button("📥 DOCX", helpers.export_document(doc_content, "docx"), "document.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", use_container_width=True)
         with dl3:
-            st.download_button("📥 PDF", helpers.create_pdf(st.session_state.doc_content), "document.pdf", "application/pdf", use_container_width=True)
+            st.download_button("📥 PDF", helpers.export_document(doc_content, "pdf"), "document.pdf", "application/pdf", use_container_width=True)
 
 def _render_diagram_generator_tab():
     st.markdown("### 📊 Diagram Generator")
@@ -178,11 +389,20 @@ def _render_diagram_generator_tab():
         diagram_template = None
 
     diagram_theme = st.selectbox("Theme", ["default", "dark", "forest", "neutral"], key="diagram_theme")
-    diagram_type = st.selectbox("Type", ["Flowchart", "Sequence", "ER Diagram", "Gantt", "Mindmap"], key="diagram_type")
+    multi_mode = st.checkbox(
+        "🖼️ Multiple Diagrams", key="diagram_multi",
+        help="Generate several diagram types for the same context in one call and show them in a gallery.",
+    )
+    if multi_mode:
+        diagram_types = st.multiselect("Types", list(diagram_set.TYPE_KEYWORDS), default=["Flowchart", "Sequence", "ER Diagram"], key="diagram_types")
+        diagram_type = None
+    else:
+        diagram_type = st.selectbox("Type", list(diagram_set.TYPE_KEYWORDS), key="diagram_type")
+        diagram_types = [diagram_type]
     
     # Gantt Start Date Picker
     gantt_start_date = None
-    if diagram_type == "Gantt":
+    if "Gantt" in diagram_types:
         col1, col2 = st.columns([1, 2])
         with col1:
              gantt_start_date = st.date_input("Project Start Date", datetime.now())
@@ -190,107 +410,67 @@ def _render_diagram_generator_tab():
     base_code = st.session_state.DIAGRAM_TEMPLATES.get(diagram_template, "") if diagram_template else ""
     custom_code = st.text_area("Context", value=base_code, height=200, key="diagram_code")
     
-    if st.button("🎨 Generate", type="primary"):
+    busy = "diagram_job" in st.session_state or "diagram_set_job" in st.session_state
+    if st.button("🎨 Generate", type="primary", disabled=busy or not diagram_types):
         client = GeminiClient(st.session_state.get("api_key"))
         
         # Determine reference date
         ref_date = gantt_start_date.strftime('%Y-%m-%d') if gantt_start_date else datetime.now().strftime('%Y-%m-%d')
 
-        # Optimised System Prompt based on Best Practices
-        sys_prompt = f"""You are a Mermaid diagram code generator with ZERO tolerance for syntax errors.
-
-## CRITICAL RULES - FOLLOW EVERY TIME:
-
-1. **Output Format**
-   - Generate ONLY valid Mermaid syntax
-   - Wrap code in ```mermaid fences
-   - Never add explanations inside the code block
-
-2. **Syntax Strictness**
-   - Node IDs: Use alphanumeric only (no spaces). Match case exactly throughout.
-   - Arrows: 
-     * Flowchart: --> (solid), -.-> (dotted), ==> (thick)
-     * Sequence: ->> (solid), -->> (dotted), -x (cross)
-   - Style/Class: No spaces after commas: color:#000,stroke:#fff (NOT color: #000, stroke: #fff)
-   - Blocks: Always close with 'end' statement
-   - Comments: Use `%%` for comments. NEVER use `//` or `#`.
-
-3. **Diagram-Specific Rules (CRITICAL)**
-   - **Mindmap**:
-     * Use 2-space indentation strictly.
-     * ONE node per line.
-     * **ABSOLUTE RULE**: NO text allowed after the closing bracket/quote. (e.g. `Node("Text") EXTRA` is FORBIDDEN).
-     * **SPECIAL CHARACTERS**: If node text contains `(`, `)`, `[`, `]`, or `,`, you **MUST** wrap the text in double quotes. 
-     * **CORRECT**: `    NodeID("Node Text")`
-     * **bAD**: `    NodeID(Node Text) ChildNode` (Child MUST be on next line with deeper indentation)
-   - **Gantt**: 
-     * defined `dateFormat YYYY-MM-DD` 
-     * DO NOT use the keyword `today` at start of line (e.g. `today 2023-01-01` is INVALID). Remove it.
-     * All dates must be absolute YYYY-MM-DD format. No relative dates like "next week".
-     * Every task MUST have a start date or happen `after` another task.
-   - **Flowchart**:
-     * Place every node definition on a NEW LINE.
-     * Do NOT put multiple nodes on one line like `A[Label] B[Label]`.
-     * Escape special characters in labels: `["Label (Text)"]`.
-     * **NO DANGLING ARROWS**: Every arrow `-->` MUST point to something. (e.g. `A -->` is INVALID).
-   - **ER Diagram**:
-     * Attributes MUST follow format: `type name [PK/FK]`.
-     * **CORRECT**: `string name`, `int id PK`, `string ref_id FK`
-     * **bAD**: `name string`, `Packing_WCID FK VARCHAR` (Do not flip type/name/key).
- 
-4. **Validation Checklist Before Output**
-   - [ ] All node IDs are consistent
-   - [ ] All opening blocks have closing 'end' statements
-   - [ ] All commas in style declarations have NO spaces after
-   - [ ] Arrow syntax matches diagram type
-   - [ ] Gantt charts do NOT use 'today'
-   - [ ] Mindmap nodes are on separate lines with NO trailing text
-
-Current Date Reference: {ref_date}
-For Gantt Charts: Start the project timeline from {ref_date}.
-
-Generate syntactically perfect Mermaid code for a {diagram_type}."""
-
-        res = client.generate_content(f"{sys_prompt}\n\nContext/Description:\n{custom_code}")
-        
-        if "⚠️" in res or "❌" in res:
-             st.markdown(res)
-             return
+        if multi_mode:
+            _submit_job(
+                "diagram_set_job", _diagram_set_job, client, custom_code, f"{len(diagram_types)} diagrams",
+                route="diagram", diagram_types=diagram_types, ref_date=ref_date, theme=diagram_theme,
+            )
         else:
-            candidate_code = helpers.sanitize_mermaid_code(res)
-            
-            # Layer 0: Regex Auto-Fixer (Pre-Correction)
-            candidate_code = helpers.fix_mermaid_syntax(candidate_code)
-            
-            # Validation Layer 1: Check for known syntax issues
-            errors = helpers.validate_mermaid_syntax(candidate_code)
-            
-            if errors:
-                st.warning("⚠️ Initial validation found issues. Attempting auto-fix...")
-                # for e in errors: st.caption(e)
-                
-                # Validation Layer 2: LLM Self-Correction
-                fix_prompt = f"""The following Mermaid code has specific syntax errors. Please FIX them and return ONLY the corrected code.
-
-ERRORS FOUND:
-{chr(10).join(errors)}
-
-BROKEN CODE:
-{candidate_code}
-
-CRITICAL: Fix the style definitions (remove spaces after commas) and close all blocks properly."""
-                
-                fix_res = client.generate_content(fix_prompt)
-                if "⚠️" not in fix_res and "❌" not in fix_res:
-                    candidate_code = helpers.sanitize_mermaid_code(fix_res)
-                    st.success("✅ Auto-corrected syntax errors!")
+            rules, diagram_prompt = prompts.build_diagram_prompt_parts(custom_code, diagram_type, ref_date)
+            _submit_job("diagram_job", _diagram_job, client, diagram_prompt, diagram_type, route="diagram", cached_prefix=rules)
+
+    def _on_diagram_done(job):
+        result = job.result
+        if "error" in result:
+            return result["error"]
+        st.session_state.mermaid_code = result["code"]
+        helpers.add_to_history(st, "Diagrams", st.session_state.mermaid_code, job.label)
+        if result["errors"]:
+            if result["llm_fixed"]:
+                return "✅ Initial validation found issues. Auto-corrected syntax errors!"
+            return "⚠️ Initial validation found issues and the auto-fix failed to return a valid response."
+
+    _render_job_status("diagram_job", _on_diagram_done)
+
+    def _on_diagram_set_done(job):
+        result = job.result
+        if "error" in result:
+            return result["error"]
+        st.session_state.diagram_gallery = result["diagrams"]
+        st.session_state.mermaid_code = result["diagrams"][0]["code"]
+        for item in result["diagrams"]:
+            helpers.add_to_history(st, "Diagrams", item["code"], f"{item['type']} diagram")
+        notes = [f"⚠️ No diagram was returned for: {', '.join(result['missing'])}."] if result["missing"] else []
+        for item in result["diagrams"]:
+            if item["errors"]:
+                notes.append(f"✅ {item['type']}: auto-corrected syntax errors." if item["llm_fixed"]
+                             else f"⚠️ {item['type']}: validation found issues and the auto-fix failed.")
+        return "\n\n".join(notes) or None
+
+    _render_job_status("diagram_set_job", _on_diagram_set_done)
+
+    # --- GALLERY (multi-diagram results) ---
+    gallery = st.session_state.get("diagram_gallery")
+    if gallery:
+        st.markdown("#### 🖼️ Gallery")
+        columns = st.columns(2)
+        for i, item in enumerate(gallery):
+            with columns[i % 2]:
+                st.markdown(f"**{item['type']}**")
+                png = helpers.render_diagram(item["code"], "png", diagram_theme)
+                if png:
+                    st.image(png, use_container_width=True)
                 else:
-                    st.error("❌ Auto-fix failed to return valid response.")
-
-            # Final Cleanup
-            clean_code = candidate_code.replace("title:", "title").replace("graph TD    ", "graph TD ")
-            st.session_state.mermaid_code = clean_code
-            helpers.add_to_history(st, "Diagrams", st.session_state.mermaid_code, diagram_type)
+                    st.warning("⚠️ Could not render diagram. Check syntax.")
+                if st.button("✏️ Edit", key=f"diagram_gallery_edit_{i}", use_container_width=True):
+                    st.session_state.mermaid_code = item["code"]
 
         
     # --- LIVE EDITOR & PREVIEW ---
@@ -306,9 +486,27 @@ CRITICAL: Fix the style definitions (remove spaces after commas) and close all b
             st.session_state.mermaid_code = edited_code
 
         st.markdown("**Render your diagram**: [Mermaid Live Editor](https://mermaid.live) | [Mermaid JS Docs](https://mermaid-js.github.io/mermaid/#/edit) | [Kroki.io](https://kroki.io)" )        
-        
+
+        # Large diagrams are analyzed first and rendered one page at a time
+        code = st.session_state.mermaid_code
+        stats = diagram_scale.analyze_diagram(code)
+        st.caption(
+            f"📐 {stats['nodes']} nodes · {stats['edges']} edges · depth {stats['depth']}"
+            + (f" · nesting {stats['nesting']}" if stats["nesting"] else "")
+            + f" · {stats['chars']:,} characters"
+        )
+        pages = diagram_scale.split_diagram(code) if diagram_scale.is_oversized(stats) else [{"label": "Full diagram", "code": code}]
+        page = 0
+        if len(pages) > 1:
+            st.info(f"ℹ️ This diagram is too large to render in one piece, so it was split into {len(pages)} pages.")
+            page = st.selectbox(
+                "Page", range(len(pages)), format_func=lambda i: pages[i]["label"],
+                key=f"diagram_page_{hashlib.sha256(code.encode('utf-8')).hexdigest()[:12]}",
+            )
+            code = pages[page]["code"]
+
         # Generate PNG for preview and download
-        png = helpers.get_mermaid_img(st.session_state.mermaid_code, "png", diagram_theme)
+        png = helpers.render_diagram(code, "png", diagram_theme)
         
         # Preview Image
         if png:
@@ -316,21 +514,32 @@ CRITICAL: Fix the style definitions (remove spaces after commas) and close all b
         else:
              st.warning("⚠️ Could not render diagram. Check syntax.")
 
+        # JPG, WebP and the history thumbnail are converted in the background;
+        # the download buttons fetch the finished bytes only when clicked
+        if png:
+            png_digest = helpers.submit_derived_images(png, st.session_state.mermaid_code if page == 0 else None)
+
         # Download options
         st.markdown("#### 💾 Downloads")
         dl1, dl2, dl3 = st.columns(3)
         with dl1:
             if png:
                 st.download_button("PNG", png, "diagram.png", use_container_width=True)
+                if rasterize.available():
+                    st.download_button(f"PNG {rasterize.EXPORT_DPI} DPI",
+                                       lambda: helpers.render_diagram_png(code, diagram_theme, rasterize.EXPORT_DPI) or b"",
+                                       "diagram@hidpi.png", "image/png", use_container_width=True)
         with dl2:
             if png:
-                jpg = helpers.convert_to_jpg(png)
-                if jpg:
-                    st.download_button("JPG", jpg, "diagram.jpg", use_container_width=True)
+                st.download_button("JPG", lambda: helpers.derived_image(png_digest, "jpg") or b"", "diagram.jpg",
+                                   "image/jpeg", use_container_width=True)
+                st.download_button("WebP", lambda: helpers.derived_image(png_digest, "webp") or b"", "diagram.webp",
+                                   "image/webp", use_container_width=True)
         with dl3:
-            svg = helpers.get_mermaid_img(st.session_state.mermaid_code, "svg", diagram_theme)
+            svg = helpers.render_diagram(code, "svg", diagram_theme)
             if svg:
                 st.download_button("SVG", svg, "diagram.svg", use_container_width=True)
+                st.download_button("SVGZ", helpers.render_diagram_svgz(code, diagram_theme), "diagram.svgz", "image/svg+xml", use_container_width=True)
 
 def _render_code_generator_tab():
     st.markdown("### 💻 Code Generator")
@@ -343,6 +552,11 @@ def _render_code_generator_tab():
     else:
         framework = "None"
     style = st.selectbox("Style", ["OOP", "Functional", "Procedural"], key="code_style")
+    project_mode = framework != "None" and st.checkbox(
+        "📦 Project Mode", key="code_project",
+        help="Plan a multi-file project, generate the files in parallel and download them as a ZIP.",
+    )
+    include_docs, include_types, include_tests = False, False, False
     show_advanced = st.checkbox("Show Advanced Options", key="code_advanced")
     if show_advanced:
         include_docs = st.checkbox("Include Documentation", True, key="code_docs")
@@ -350,35 +564,71 @@ def _render_code_generator_tab():
         include_tests = st.checkbox("Generate Unit Tests", key="code_tests_check")
     code_req = st.text_area("Requirements", height=250, key="code_req")
     
-    if st.button("⚡ Generate", type="primary"):
+    if st.button("⚡ Generate", type="primary", disabled=project_mode and "project_job" in st.session_state):
         client = GeminiClient(st.session_state.get("api_key"))
-        sys_prompt = f"Generate {language} code. Framework: {framework}. Style: {style}."
-        if show_advanced:
-            if include_docs:
-                sys_prompt += " Include docs."
-            if include_types:
-                sys_prompt += " Include types."
-        
-        res = client.generate_content(f"{sys_prompt}\n{code_req}")
-        
-        if "⚠️" in res or "❌" in res:
-            st.markdown(res)
+        if project_mode:
+            _submit_job(
+                "project_job", _project_job, client, code_req, f"{framework} project",
+                language=language, framework=framework, style=style,
+                include_docs=include_docs, include_types=include_types, include_tests=include_tests,
+            )
         else:
-            st.session_state.generated_code = res
-            helpers.add_to_history(st, "Code", st.session_state.generated_code, f"{language} code")
+            res = client.generate_content(prompts.build_code_prompt(
+                code_req, language, framework, style,
+                include_docs=include_docs, include_types=include_types,
+            ), route="code")
             
-            if show_advanced and include_tests:
-                test_res = client.generate_content(f"Generate unit tests for:\n{res}")
-                if "⚠️" not in test_res and "❌" not in test_res:
-                    st.session_state.generated_tests = test_res
-
-    if "generated_code" in st.session_state:
+            if GeminiClient.is_error_response(res):
+                st.markdown(res)
+            else:
+                helpers.put_artifact(st, "generated_code", res)
+                helpers.add_to_history(st, "Code", res, f"{language} code")
+                
+                if include_tests:
+                    test_res = client.generate_content(prompts.build_tests_prompt(res), route="code_tests")
+                    if not GeminiClient.is_error_response(test_res):
+                        helpers.put_artifact(st, "generated_tests", test_res)
+
+    def _on_project_done(job):
+        result = job.result
+        if "error" in result:
+            return result["error"]
+        helpers.put_artifact(st, "project_files", json.dumps(result["files"]))
+        helpers.put_artifact(st, "project_zip", result["zip"])
+        st.session_state.project_name = result["name"]
+        st.session_state.project_errors = result["errors"]
+        listing = "\n\n".join(f"### {path}\n```\n{content}```" for path, content in result["files"].items())
+        helpers.add_to_history(st, "Code", listing, f"{job.label} ({len(result['files'])} files)")
+
+    _render_job_status("project_job", _on_project_done)
+
+    generated_code = helpers.get_artifact(st, "generated_code")
+    if generated_code:
         st.markdown("#### 💻 Generated Code")
-        st.code(st.session_state.generated_code, language=language.lower())
-        st.download_button("📥 Download", st.session_state.generated_code, f"code.{language[:2].lower()}")
-        if "generated_tests" in st.session_state:
+        st.code(generated_code, language=language.lower())
+        st.download_button("📥 Download", generated_code, f"code.{language[:2].lower()}")
+        generated_tests = helpers.get_artifact(st, "generated_tests")
+        if generated_tests:
             with st.expander("🧪 Unit Tests"):
-                st.code(st.session_state.generated_tests, language=language.lower())
+                st.code(generated_tests, language=language.lower())
+
+    project_files = helpers.get_artifact(st, "project_files")
+    if project_files:
+        files = json.loads(project_files)
+        name = st.session_state.get("project_name", "project")
+        st.markdown(f"#### 📦 Generated Project: `{name}` ({len(files)} files)")
+        for path, error in st.session_state.get("project_errors", {}).items():
+            st.warning(f"`{path}` could not be generated: {error}")
+        project_zip = helpers.get_artifact(st, "project_zip", as_text=False)
+        if project_zip:
+            st.download_button("📥 Download ZIP", project_zip, f"{name}.zip", mime="application/zip")
+        for path, content in files.items():
+            with st.expander(f"📄 {path}"):
+                ext = posixpath.splitext(path)[1].lstrip(".").lower()
+                st.code(content, language=_CODE_LANGUAGES.get(ext, ext or None))
+
+_CODE_LANGUAGES = {"py": "python", "js": "javascript", "jsx": "javascript", "ts": "typescript",
+                   "md": "markdown", "yml": "yaml", "sh": "bash", "kt": "kotlin", "rs": "rust"}
 
 def _render_summarizer_tab():
     st.markdown("### 📚 Summarizer")
@@ -393,19 +643,19 @@ def _render_summarizer_tab():
     
     if st.button("🔍 Summarize", type="primary"):
         client = GeminiClient(st.session_state.get("api_key"))
-        sys_prompt = f"Summarize to {compression}% length. Format: {format_type}."
-        res = client.generate_content(f"{sys_prompt}\n{text}")
+        res = client.generate_content(prompts.build_summary_prompt(text, compression, format_type), route="summarize")
         
-        if "⚠️" in res or "❌" in res:
+        if GeminiClient.is_error_response(res):
             st.markdown(res)
         else:
-            st.session_state.summary = res
-            helpers.add_to_history(st, "Summaries", st.session_state.summary, f"{compression}% summary")
+            helpers.put_artifact(st, "summary", res)
+            helpers.add_to_history(st, "Summaries", res, f"{compression}% summary")
 
-    if "summary" in st.session_state:
+    summary = helpers.get_artifact(st, "summary")
+    if summary:
         st.markdown("#### 📄 Summary")
-        st.markdown(st.session_state.summary)
-        st.download_button("📥 Download", st.session_state.summary, "summary.txt")
+        st.markdown(summary)
+        st.download_button("📥 Download", summary, "summary.txt")
 
 def _render_translator_tab():
     st.markdown("### 🌐 Translator (Bangla ↔ English)")
@@ -413,27 +663,44 @@ def _render_translator_tab():
     direction = st.radio("Translation Direction", ["English → Bangla", "Bangla → English"], key="trans_direction", horizontal=True)
     formality = st.select_slider("Formality", ["Casual", "Neutral", "Formal"], value="Neutral", key="trans_formality")
     preserve_format = st.checkbox("Preserve Formatting", True, key="trans_format")
+    long_mode = st.checkbox(
+        "📄 Long Document Mode", key="trans_long",
+        help="Translate paragraph chunks in parallel and show each part as soon as it is ready.",
+    )
     text = st.text_area("Text to Translate", height=300, key="trans_text")
     
     if st.button("🚀 Translate", type="primary"):
         client = GeminiClient(st.session_state.get("api_key"))
-        target_lang = "Bangla" if "Bangla" in direction else "English"
-        sys_prompt = f"Translate to {target_lang}. Formality: {formality}."
-        if preserve_format:
-            sys_prompt += " Preserve original formatting."
-        res = client.generate_content(f"{sys_prompt}\n{text}")
+        live = st.empty()
+        result = {}
+        for result in iter_translation(client, text, direction, formality, preserve_format,
+                                       chunk_chars=CHUNK_CHARS if long_mode else None):
+            if long_mode and "error" not in result and result["done"] < result["segments"]:
+                with live.container():
+                    st.progress(result["done"] / result["segments"], text=f"⏳ {result['done']}/{result['segments']} paragraphs")
+                    st.markdown(result["text"])
+        live.empty()
         
-        if "⚠️" in res or "❌" in res:
-            st.markdown(res)
-        else:
-            st.session_state.translation = res
-            helpers.add_to_history(st, "Translations", st.session_state.translation, direction)
-
-    if "translation" in st.session_state:
+        if "error" in result:
+            st.markdown(result["error"])
+        elif result:
+            helpers.put_artifact(st, "translation", result["text"])
+            st.session_state.translation_reuse = (result["hits"], result["segments"])
+            helpers.add_to_history(st, "Translations", result["text"], direction)
+
+    translation = helpers.get_artifact(st, "translation")
+    if translation:
         st.markdown("---")
         st.markdown("#### 🎯 Translation Result")
-        st.text_area("Result", st.session_state.translation, height=300, key="trans_result_display")
-        st.download_button("📥 Download", st.session_state.translation, "translation.txt")
+        st.text_area("Result", translation, height=300, key="trans_result_display")
+        hits, segments = st.session_state.get("translation_reuse", (0, 0))
+        if segments:
+            memory_rate = get_translation_memory().stats()["hit_rate"]
+            st.caption(
+                f"♻️ {hits}/{segments} paragraphs reused from translation memory "
+                f"(overall hit rate {memory_rate:.0%})"
+            )
+        st.download_button("📥 Download", translation, "translation.txt")
 
 def _render_email_writer_tab():
     st.markdown("### ✉️ Email Writer")
@@ -446,24 +713,25 @@ def _render_email_writer_tab():
     
     if st.button("✉️ Generate", type="primary"):
         client = GeminiClient(st.session_state.get("api_key"))
-        sys_prompt = f"Write an email. Template: {template}. Tone: {tone}. Length: {length}."
-        res = client.generate_content(f"{sys_prompt}\nSubject: {subject}\n\n{body}")
+        res = client.generate_content(prompts.build_email_prompt(body, subject, template, tone, length), route="email")
         
-        if "⚠️" in res or "❌" in res:
+        if GeminiClient.is_error_response(res):
             st.markdown(res)
         else:
-            st.session_state.email = res
-            helpers.add_to_history(st, "Emails", st.session_state.email, template)
+            helpers.put_artifact(st, "email", res)
+            helpers.add_to_history(st, "Emails", res, template)
 
-    if "email" in st.session_state:
+    email = helpers.get_artifact(st, "email")
+    if email:
         st.markdown("---")
         st.markdown("#### 📧 Email Draft")
-        st.text_area("Result", st.session_state.email, height=300, key="email_result_display")
-        st.download_button("📥 Download", st.session_state.email, "email.txt")
+        st.text_area("Result", email, height=300, key="email_result_display")
+        st.download_button("📥 Download", email, "email.txt")
 
 def _render_analyzer_tab():
     st.markdown("### 🔍 Content Analyzer")
     
+    depth, grammar, seo = "Standard", False, False
     show_advanced = st.checkbox("Show Advanced Options", key="analyze_advanced")
     if show_advanced:
         depth = st.select_slider("Analysis Depth", ["Quick", "Standard", "Comprehensive"], key="analyze_depth")
@@ -472,25 +740,67 @@ def _render_analyzer_tab():
     text = st.text_area("Content to Analyze", height=400, key="analyze_text")
     
     if st.button("🔍 Analyze", type="primary"):
+        # Metrics are computed locally and shown at once; only the commentary needs the LLM
+        st.session_state.analysis_metrics = text_metrics.analyze_text(text)
+        st.session_state.pop("analysis", None)
+        _render_text_metrics(st.session_state.analysis_metrics)
+
+        st.markdown("#### 💬 Commentary")
         client = GeminiClient(st.session_state.get("api_key"))
-        sys_prompt = "Analyze readability, sentiment, keywords, word/sentence count."
-        if show_advanced:
-            if grammar:
-                sys_prompt += " Include grammar check."
-            if seo:
-                sys_prompt += " Include SEO suggestions."
-        res = client.generate_content(f"{sys_prompt}\n{text}")
+        chunks = []
+        def stream():
+            # write_stream joins the chunks into a plain str, so errors are caught on the way through
+            for chunk in client.generate_content_stream(
+                prompts.build_analysis_prompt(text, grammar=grammar, seo=seo, depth=depth), route="analyze",
+            ):
+                chunks.append(chunk)
+                yield chunk
+        res = st.write_stream(stream())
         
-        if "⚠️" in res or "❌" in res:
-            st.markdown(res)
-        else:
-            st.session_state.analysis = res
-            helpers.add_to_history(st, "Analysis", st.session_state.analysis, "Content analysis")
-
-    if "analysis" in st.session_state:
-        st.markdown("#### 📊 Analysis Result")
-        st.markdown(st.session_state.analysis)
-        st.download_button("📥 Download", st.session_state.analysis, "analysis.txt")
+        if not any(GeminiClient.is_error_response(chunk) for chunk in chunks):
+            helpers.put_artifact(st, "analysis", res)
+            helpers.add_to_history(st, "Analysis", _analysis_report(), "Content analysis")
+        st.session_state.analysis_shown = True
+
+    if "analysis_metrics" in st.session_state and not st.session_state.pop("analysis_shown", False):
+        _render_text_metrics(st.session_state.analysis_metrics)
+        analysis = helpers.get_artifact(st, "analysis")
+        if analysis:
+            st.markdown("#### 💬 Commentary")
+            st.markdown(analysis)
+    if "analysis_metrics" in st.session_state:
+        st.download_button("📥 Download", _analysis_report(), "analysis.txt")
+
+def _render_text_metrics(metrics):
+    st.markdown("#### 📊 Text Metrics")
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Words", metrics["words"])
+    c2.metric("Sentences", metrics["sentences"])
+    c3.metric("Reading Time", f"{metrics['reading_time_minutes']} min")
+    c4.metric("Readability", metrics["flesch_reading_ease"], metrics["readability"], delta_color="off")
+    st.caption(
+        f"{metrics['language']} · {metrics['unique_words']} unique words · {metrics['paragraphs']} paragraphs · "
+        f"{metrics['characters']} characters · avg {metrics['avg_sentence_length']} words/sentence · "
+        f"grade level {metrics['flesch_kincaid_grade']} (Flesch formulas are calibrated for English)"
+    )
+    k1, k2 = st.columns(2)
+    with k1:
+        if metrics["keywords"]:
+            st.markdown("**Keywords (TF-IDF)**")
+            st.dataframe(metrics["keywords"], use_container_width=True, hide_index=True)
+    with k2:
+        phrases = metrics["bigrams"] + metrics["trigrams"]
+        if phrases:
+            st.markdown("**Common Phrases**")
+            st.dataframe(sorted(phrases, key=lambda p: -p["count"]), use_container_width=True, hide_index=True)
+
+def _analysis_report():
+    """Local metrics plus the LLM commentary as one markdown document."""
+    report = text_metrics.metrics_markdown(st.session_state.analysis_metrics)
+    analysis = helpers.get_artifact(st, "analysis")
+    if analysis:
+        report += "\n## Commentary\n\n" + analysis
+    return report
 
 def _render_quiz_generator_tab():
     st.markdown("### 📝 Quiz Generator")
@@ -498,6 +808,9 @@ def _render_quiz_generator_tab():
     q_type = st.selectbox("Type", ["MCQ", "True/False", "Short Answer", "Mixed", "Fill in the Blank"], key="quiz_type")
     num_q = st.slider("Number of Questions", 5, 30, 10, key="quiz_num")
     difficulty = st.select_slider("Difficulty", ["Easy", "Medium", "Hard"], key="quiz_diff")
+    # Answer key, order and points are applied locally to the structured quiz,
+    # so changing them re-renders the current quiz without a new LLM call
+    include_answers, randomize, points = False, False, 1
     show_advanced = st.checkbox("Show Advanced Options", key="quiz_advanced")
     if show_advanced:
         include_answers = st.checkbox("Include Answer Key", True, key="quiz_answers")
@@ -505,29 +818,106 @@ def _render_quiz_generator_tab():
         points = st.number_input("Points per Question", 1, 10, 1, key="quiz_points")
     topic = st.text_area("Topic/Content", height=250, key="quiz_topic")
     
-    if st.button("🎯 Generate", type="primary"):
+    if st.button("🎯 Generate", type="primary", disabled="quiz_job" in st.session_state):
         client = GeminiClient(st.session_state.get("api_key"))
-        sys_prompt = f"Create {num_q} {q_type} questions. Difficulty: {difficulty}."
-        if show_advanced and include_answers:
-            sys_prompt += " Include answer key."
-        res = client.generate_content(f"{sys_prompt}\n{topic}")
-        
-        if "⚠️" in res or "❌" in res:
-            st.markdown(res)
-        else:
-            st.session_state.quiz = res
-            helpers.add_to_history(st, "Quizzes", st.session_state.quiz, f"{num_q} questions")
-
-    if "quiz" in st.session_state:
+        quiz_prompt = prompts.build_quiz_json_prompt(topic, num_q, q_type, difficulty)
+        _submit_job(
+            "quiz_job", _generation_job, client, quiz_prompt, f"{num_q} questions",
+            route="quiz", generation_config=QUIZ_GENERATION_CONFIG,
+        )
+
+    def _on_quiz_done(job):
+        if GeminiClient.is_error_response(job.result):
+            return job.result
+        try:
+            quiz_data = parse_quiz(job.result)
+        except ValueError:
+            # Keep the raw response rather than losing the generation
+            helpers.put_artifact(st, "quiz", job.result)
+            st.session_state.pop("quiz_data", None)
+            helpers.add_to_history(st, "Quizzes", job.result, job.label)
+            return None
+        helpers.put_artifact(st, "quiz_data", quiz_data.to_json())
+        st.session_state.pop("quiz", None)
+        st.session_state.quiz_seed = datetime.now().timestamp()
+        helpers.add_to_history(st, "Quizzes", render_quiz(quiz_data), job.label)
+
+    _render_job_status("quiz_job", _on_quiz_done)
+
+    quiz_json = helpers.get_artifact(st, "quiz_data")
+    if quiz_json:
+        if randomize and st.button("🔀 Reshuffle", key="quiz_reshuffle"):
+            st.session_state.quiz_seed = datetime.now().timestamp()
+        arranged = parse_quiz(quiz_json).arranged(randomize, st.session_state.get("quiz_seed"))
+        quiz = render_quiz(arranged, points=points, include_answers=include_answers)
+    else:
+        quiz = helpers.get_artifact(st, "quiz")
+    if quiz:
         st.markdown("#### 📋 Quiz")
-        st.markdown(st.session_state.quiz)
+        st.markdown(quiz)
         dl1, dl2, dl3 = st.columns(3)
         with dl1:
-            st.download_button("TXT", st.session_state.quiz, "quiz.txt")
+            st.download_button("TXT", quiz, "quiz.txt")
         with dl2:
-            st.download_button("DOCX", helpers.create_docx(st.session_state.quiz), "quiz.docx")
+            st.download_button("DOCX", helpers.export_document(quiz, "docx"), "quiz.docx")
         with dl3:
-            st.download_button("PDF", helpers.create_pdf(st.session_state.quiz), "quiz.pdf")
+            st.download_button("PDF", helpers.export_document(quiz, "pdf"), "quiz.pdf")
+
+def render_history_panel():
+    """Sidebar with persistent history and favorites.
+    Only the selected page of previews is queried; full content is loaded on demand.
+    """
+    page_size = 10
+    with st.sidebar:
+        st.markdown("### 🕘 History")
+        table = st.radio("Show", ["history", "favorites"], format_func=str.title, horizontal=True, key="history_table")
+        query = st.text_input("Search", placeholder="Full-text search...", key="history_query")
+        features = get_store().features(table, helpers.history_owner(st))
+        if not features:
+            st.caption("Nothing saved yet.")
+            return
+        labels = ["All"] + [f"{name} ({count})" for name, count in features]
+        choice = st.selectbox("Feature", labels, key="history_feature")
+        feature = None if choice == "All" else features[labels.index(choice) - 1][0]
+
+        # Start from the first page whenever the view changes
+        view = (table, choice, query)
+        if st.session_state.get("history_view") != view:
+            st.session_state.history_view = view
+            st.session_state.history_page = 0
+        page = st.session_state.history_page
+        items = helpers.load_history_page(st, table, feature, page, page_size, query)
+        for item in items:
+            with st.expander(f"{item['title']} · {item['created_at']}"):
+                st.caption(item["feature"])
+                thumbnail = helpers.history_thumbnail(item["content_hash"]) if item["feature"] == "Diagrams" else None
+                if thumbnail:
+                    st.image(thumbnail)
+                st.markdown(item["preview"])
+                if st.button("Open", key=f"history_open_{table}_{item['id']}"):
+                    st.session_state.history_open = (table, item["id"])
+
+        prev_col, next_col = st.columns(2)
+        with prev_col:
+            if st.button("◀ Newer", disabled=page == 0, key="history_prev"):
+                st.session_state.history_page = page - 1
+                st.rerun()
+        with next_col:
+            if st.button("Older ▶", disabled=len(items) < page_size, key="history_next"):
+                st.session_state.history_page = page + 1
+                st.rerun()
+
+        if "history_open" in st.session_state:
+            open_table, item_id = st.session_state.history_open
+            item = get_store().get(open_table, helpers.history_owner(st), item_id)
+            if item:
+                st.markdown("---")
+                st.markdown(f"**{item['title']}**")
+                st.text_area("Content", item["content"], height=250, key="history_open_content")
+                st.download_button("📥 Download", item["content"], "history.txt", key="history_open_download")
+            if st.button("Close", key="history_close"):
+                del st.session_state.history_open
+                st.rerun()
 
 def render_tabs():
     """Render the full tab interface.